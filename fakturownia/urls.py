@@ -19,6 +19,7 @@ from django.urls import include, path
 from django.views.decorators.cache import cache_page
 from django.views.decorators.http import require_http_methods
 from django.views.generic.base import RedirectView
+from ksef.views import metrics_view
 from ksiegowosc import pwa_views  # Import widoków PWA
 
 logger = logging.getLogger(__name__)
@@ -134,6 +135,8 @@ urlpatterns = [
     path("health/", health_check, name="health_check"),
     path("ready/", ready_check, name="ready_check"),
     path("live/", live_check, name="live_check"),
+    # Metryki KSeF (Prometheus)
+    path("metrics", metrics_view, name="ksef_metrics"),
     # SEO
     path("robots.txt", robots_txt, name="robots_txt"),
     # Health check apps (jeśli zainstalowane)
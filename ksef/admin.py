@@ -1 +1,62 @@
-from django.contrib import admin
+# ksef/admin.py
+
+from django.contrib import admin, messages
+from django.utils import timezone
+
+from .jobs import offline_queue_stats
+from .models import KsefJob
+
+
+@admin.register(KsefJob)
+class KsefJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "invoice",
+        "nip",
+        "mode",
+        "status",
+        "attempts",
+        "run_after",
+        "deadline",
+        "locked_by",
+        "created_at",
+    )
+    list_filter = ("status", "mode")
+    search_fields = ("invoice__invoice_number", "nip", "last_error")
+    list_select_related = ("invoice",)
+    readonly_fields = (
+        "created_at",
+        "updated_at",
+        "locked_at",
+        "locked_by",
+        "payload_hash",
+        "deadline",
+    )
+    raw_id_fields = ("invoice", "user")
+    actions = ["requeue_jobs"]
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(user=request.user)
+
+    def changelist_view(self, request, extra_context=None):
+        stats = offline_queue_stats(None if request.user.is_superuser else request.user)
+        if stats["depth"]:
+            next_deadline = timezone.localtime(stats["next_deadline"]).strftime("%Y-%m-%d %H:%M")
+            message = (
+                f"Faktury offline czekające na wysyłkę: {stats['depth']} "
+                f"(najbliższy termin: {next_deadline})."
+            )
+            if stats["overdue"]:
+                messages.error(request, f"{message} Po terminie: {stats['overdue']}.")
+            else:
+                messages.info(request, message)
+        return super().changelist_view(request, extra_context=extra_context)
+
+    @admin.action(description="Ponów wysyłkę zaznaczonych zadań")
+    def requeue_jobs(self, request, queryset):
+        count = queryset.exclude(status__in=["done", "running"]).update(
+            status="queued", attempts=0, run_after=timezone.now(), last_error=""
+        )
+        messages.success(request, f"Przywrócono do kolejki {count} zadań.")
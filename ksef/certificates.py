@@ -0,0 +1,183 @@
+# ksef/certificates.py
+
+import base64
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.x509 import load_der_x509_certificate, load_pem_x509_certificate
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TOKEN_ENCRYPTION = "KsefTokenEncryption"
+SYMMETRIC_KEY_ENCRYPTION = "SymmetricKeyEncryption"
+
+BUNDLED_CERTIFICATES_PATH = Path(__file__).resolve().parent / "public-key-certificates.json"
+
+# Jak długo (w sekundach) lista certyfikatów pobrana z API jest uznawana za aktualną
+DEFAULT_CACHE_TTL = 24 * 60 * 60
+# Po jakim czasie ponowić próbę pobrania z API, gdy użyto certyfikatów z pliku
+BUNDLED_RETRY_AFTER = 5 * 60
+
+
+class _CachedKey:
+    def __init__(self, public_key, valid_from, valid_to, expires_at):
+        self.public_key = public_key
+        self.valid_from = valid_from
+        self.valid_to = valid_to
+        self.expires_at = expires_at
+
+    def is_usable(self):
+        now = timezone.now()
+        if self.valid_from and now < self.valid_from:
+            return False
+        if self.valid_to and now >= self.valid_to:
+            return False
+        return time.monotonic() < self.expires_at
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def _load_certificate(cert_data):
+    """Wczytuje certyfikat zapisany jako DER w Base64 (lub PEM) i zwraca klucz publiczny."""
+    cert_str = cert_data["certificate"]
+    if "BEGIN CERTIFICATE" in cert_str:
+        cert_obj = load_pem_x509_certificate(cert_str.encode(), default_backend())
+    else:
+        cert_obj = load_der_x509_certificate(base64.b64decode(cert_str), default_backend())
+    return cert_obj.public_key()
+
+
+class PublicKeyStore:
+    """
+    Współdzielony w procesie magazyn kluczy publicznych KSeF.
+
+    Klucze są przechowywane już wczytane (obiekty `public_key()`), osobno dla
+    każdego adresu API (środowiska) i przeznaczenia. Surowa lista certyfikatów trafia też
+    do cache Django, więc kolejne procesy nie muszą pytać API. Gdy API jest
+    niedostępne, używany jest plik `public-key-certificates.json` z repozytorium.
+    """
+
+    def __init__(self, ttl=None, use_django_cache=None):
+        self.ttl = ttl if ttl is not None else getattr(
+            settings, "KSEF_PUBLIC_KEY_CACHE_TTL", DEFAULT_CACHE_TTL
+        )
+        self.use_django_cache = use_django_cache if use_django_cache is not None else getattr(
+            settings, "KSEF_PUBLIC_KEY_USE_DJANGO_CACHE", True
+        )
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(base_url):
+        return f"ksef_public_key_certificates:{base_url}"
+
+    def get_public_key(self, base_url, usage, session):
+        """Zwraca klucz publiczny KSeF o danym przeznaczeniu dla adresu API."""
+        cached = self._keys.get((base_url, usage))
+        if cached and cached.is_usable():
+            return cached.public_key
+
+        with self._lock:
+            cached = self._keys.get((base_url, usage))
+            if cached and cached.is_usable():
+                return cached.public_key
+
+            certs, ttl = self._fetch_certificates(base_url, session)
+            self._store(base_url, certs, ttl)
+
+            cached = self._keys.get((base_url, usage))
+            if not cached:
+                raise Exception(f"Brak ważnego certyfikatu KSeF o przeznaczeniu '{usage}'.")
+            return cached.public_key
+
+    def _fetch_certificates(self, base_url, session):
+        if self.use_django_cache:
+            try:
+                certs = cache.get(self._cache_key(base_url))
+                if certs:
+                    return certs, self.ttl
+            except Exception as e:
+                logger.warning(f"⚠ Cache certyfikatów KSeF niedostępny: {e}")
+
+        url = f"{base_url}/security/public-key-certificates"
+        try:
+            logger.debug(f"Pobieranie certyfikatów z: {url}")
+            response = session.get(url)
+            response.raise_for_status()
+            certs = response.json()
+            if not certs:
+                raise Exception("API zwróciło pustą listę certyfikatów.")
+        except Exception as e:
+            logger.warning(
+                f"⚠ Nie udało się pobrać certyfikatów KSeF ({e}), "
+                f"używam certyfikatów z pliku {BUNDLED_CERTIFICATES_PATH.name}"
+            )
+            return self._load_bundled(), BUNDLED_RETRY_AFTER
+
+        if self.use_django_cache:
+            try:
+                cache.set(self._cache_key(base_url), certs, self.ttl)
+            except Exception as e:
+                logger.warning(f"⚠ Nie udało się zapisać certyfikatów KSeF w cache: {e}")
+        return certs, self.ttl
+
+    @staticmethod
+    def _load_bundled():
+        try:
+            with open(BUNDLED_CERTIFICATES_PATH, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise Exception(f"Błąd pobierania klucza publicznego: {e}")
+
+    def _store(self, base_url, certs, ttl):
+        """Wczytuje certyfikaty i zapamiętuje najnowszy ważny klucz dla każdego przeznaczenia."""
+        now = timezone.now()
+        expires_at = time.monotonic() + ttl
+        best = {}
+        for cert_data in certs:
+            valid_from = _parse_date(cert_data.get("validFrom"))
+            valid_to = _parse_date(cert_data.get("validTo"))
+            if (valid_from and now < valid_from) or (valid_to and now >= valid_to):
+                continue
+            for usage in cert_data.get("usage", []):
+                current = best.get(usage)
+                if current and (current[1] or now) >= (valid_from or now):
+                    continue
+                best[usage] = (cert_data, valid_from, valid_to)
+
+        for usage, (cert_data, valid_from, valid_to) in best.items():
+            try:
+                public_key = _load_certificate(cert_data)
+            except Exception as e:
+                logger.error(f"❌ Nieprawidłowy certyfikat KSeF ({usage}): {e}")
+                continue
+            self._keys[(base_url, usage)] = _CachedKey(
+                public_key, valid_from, valid_to, expires_at
+            )
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+
+_default_store = PublicKeyStore()
+
+
+def get_public_key_store():
+    """Zwraca współdzielony w procesie magazyn kluczy publicznych KSeF."""
+    return _default_store
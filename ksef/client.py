@@ -2,23 +2,38 @@
 
 import base64
 import hashlib
+import io
 import json
 import logging
 import os
-from datetime import datetime
+import zipfile
+from datetime import datetime, timedelta
 
 import requests
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import hashes, padding as sym_padding
+from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.x509 import load_pem_x509_certificate
 from django.utils import timezone
 
 from ksiegowosc.models import CompanyInfo
 
+from .certificates import SYMMETRIC_KEY_ENCRYPTION, TOKEN_ENCRYPTION, get_public_key_store
+from .encryption import encrypt_payload, encrypt_payloads
+from .metrics import get_metrics
+from .polling import poll
+from .token_crypto import decrypt_token, encrypt_token
+from .transport import UPLOAD_TIMEOUT, get_transport
+
 logger = logging.getLogger(__name__)
 
+# Limit czasu (w sekundach) oczekiwania na zakończenie uwierzytelnienia
+AUTH_STATUS_TIMEOUT = 60
+# Kody statusu oznaczające, że KSeF nadal przetwarza sesję / fakturę
+SESSION_IN_PROGRESS_CODES = (100, 150, 170)
+INVOICE_IN_PROGRESS_CODES = (100, 150)
+
+# Maksymalny rozmiar części paczki w sesji wsadowej (przed szyfrowaniem)
+BATCH_PART_MAX_SIZE = 100 * 1024 * 1024
+
 
 class KsefClient:
     def __init__(self, user):
@@ -35,74 +50,111 @@ class KsefClient:
         if not self.company_info.ksef_token:
             raise Exception("Brak tokena KSeF w danych firmy. Wygeneruj go w Aplikacji Podatnika.")
 
-        env = self.company_info.ksef_environment
-        if env == "test":
-            self.base_url = "https://api-test.ksef.mf.gov.pl/v2"
-        elif env == "demo":
-            self.base_url = "https://api-demo.ksef.mf.gov.pl/v2"
-        else:
-            self.base_url = "https://api.ksef.mf.gov.pl/v2"
-
-        self.session = requests.Session()
+        # Połączenia HTTP są współdzielone przez wszystkich klientów danego środowiska;
+        # nagłówek Authorization jest przechowywany osobno dla każdego klienta
+        self.transport = get_transport(self.company_info.ksef_environment)
+        self.base_url = self.transport.base_url
+        self.session = self.transport.client_session()
         self.nip = self._normalize_nip(self.company_info.tax_id)
         self.token = self.company_info.ksef_token
 
-        # Tokeny JWT z API 2.0
+        # Tokeny JWT z API 2.0 - zapisane w bazie pozwalają pominąć uwierzytelnienie
         self.access_token = None
+        self.access_token_valid_until = None
         self.refresh_token = None
+        self.refresh_token_valid_until = None
+        self._load_stored_tokens()
         self.session_reference = None
-        
+        self.session_last_used = None
+
         # Szyfrowanie - klucz AES i IV generowane przy sesji
         self.aes_key = None
         self.aes_iv = None
 
+    def _load_stored_tokens(self):
+        """Wczytuje zaszyfrowane tokeny zapisane przy poprzednim uwierzytelnieniu."""
+        info = self.company_info
+        self.refresh_token = decrypt_token(info.ksef_refresh_token)
+        self.refresh_token_valid_until = info.ksef_refresh_token_valid_until
+        access_token = decrypt_token(info.ksef_access_token)
+        if access_token:
+            self._set_access_token(access_token, info.ksef_access_token_valid_until)
+
+    def _set_access_token(self, token, valid_until):
+        self.access_token = token
+        self.access_token_valid_until = valid_until
+        self.session.headers.update({'Authorization': f'Bearer {token}'})
+
+    def _store_tokens(self):
+        """Zapisuje tokeny (zaszyfrowane) w danych firmy, by inne procesy mogły ich użyć."""
+        fields = {
+            'ksef_access_token': encrypt_token(self.access_token),
+            'ksef_access_token_valid_until': self.access_token_valid_until,
+            'ksef_refresh_token': encrypt_token(self.refresh_token),
+            'ksef_refresh_token_valid_until': self.refresh_token_valid_until,
+        }
+        CompanyInfo.objects.filter(pk=self.company_info.pk).update(**fields)
+        for name, value in fields.items():
+            setattr(self.company_info, name, value)
+
+    def has_valid_refresh_token(self):
+        """Czy można odnowić accessToken bez pełnego uwierzytelnienia."""
+        if not self.refresh_token:
+            return False
+        if self.refresh_token_valid_until is None:
+            return True
+        return self.refresh_token_valid_until > timezone.now()
+
+    def _refresh_access_token(self):
+        """Odnawia accessToken jednym wywołaniem /auth/token/refresh."""
+        refresh_url = f"{self.base_url}/auth/token/refresh"
+
+        logger.info("Odświeżanie accessToken (auth/token/refresh)")
+        resp = self.session.post(
+            refresh_url, headers={'Authorization': f'Bearer {self.refresh_token}'}
+        )
+        resp.raise_for_status()
+
+        access_token_obj = resp.json()['accessToken']
+        self._set_access_token(
+            access_token_obj['token'],
+            self._parse_valid_until(access_token_obj.get('validUntil')),
+        )
+        self._store_tokens()
+        logger.info("✓ Odświeżono accessToken")
+
+    @staticmethod
+    def _parse_valid_until(value):
+        """Zamienia pole 'validUntil' z API na datetime (lub None)."""
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            logger.warning(f"⚠ Nieprawidłowy format validUntil: {value}")
+            return None
+
     def _normalize_nip(self, nip_str):
         """Usuwa znaki niebędące cyframi z numeru NIP."""
         if not nip_str:
             return ""
         return "".join(filter(str.isdigit, nip_str))
 
-    def _get_public_key(self, usage="KsefTokenEncryption"):
+    def _get_public_key(self, usage=TOKEN_ENCRYPTION):
         """
-        Pobiera certyfikat klucza publicznego z KSeF API 2.0.
-        usage: 'KsefTokenEncryption' lub 'KsefSessionEncryption'
+        Zwraca klucz publiczny KSeF API 2.0 z magazynu certyfikatów.
+        usage: 'KsefTokenEncryption' lub 'SymmetricKeyEncryption'
         """
-        url = f"{self.base_url}/security/public-key-certificates"
-
-        try:
-            logger.debug(f"Pobieranie certyfikatów z: {url}")
-            response = self.session.get(url)
-            response.raise_for_status()
-
-            certs = response.json()
-            if not certs:
-                raise Exception("API zwróciło pustą listę certyfikatów.")
-
-            # Wyszukiwanie certyfikatu o odpowiednim przeznaczeniu
-            cert_data = next(
-                (c for c in certs if usage in c.get("usage", [])),
-                certs[0]
-            )
-
-            cert_pem = cert_data['certificate']
-
-            if "BEGIN CERTIFICATE" not in cert_pem:
-                cert_pem = f"-----BEGIN CERTIFICATE-----\n{cert_pem}\n-----END CERTIFICATE-----"
-
-            cert_obj = load_pem_x509_certificate(cert_pem.encode(), default_backend())
-            return cert_obj.public_key()
-
-        except Exception as e:
-            error_msg = f"Błąd pobierania klucza publicznego: {str(e)}"
-            logger.error(f"❌ {error_msg}")
-            raise Exception(error_msg)
+        return get_public_key_store().get_public_key(
+            self.base_url, usage, self.session
+        )
 
     def _encrypt_token(self, challenge_timestamp):
         """
         Szyfruje token KSeF algorytmem RSA-OAEP (SHA-256).
         """
         try:
-            public_key = self._get_public_key("KsefTokenEncryption")
+            public_key = self._get_public_key(TOKEN_ENCRYPTION)
 
             # Format: token|timestamp_ms
             combined = f"{self.token}|{challenge_timestamp}"
@@ -129,17 +181,20 @@ class KsefClient:
         self.aes_iv = os.urandom(16)
         return self.aes_key, self.aes_iv
 
-    def _encrypt_aes_key(self):
+    def _encrypt_aes_key(self, aes_key=None):
         """
         Szyfruje klucz AES algorytmem RSA-OAEP kluczem publicznym KSeF.
+        Domyślnie szyfruje klucz sesji online (self.aes_key).
         """
-        if not self.aes_key:
-            self._generate_encryption_data()
+        if aes_key is None:
+            if not self.aes_key:
+                self._generate_encryption_data()
+            aes_key = self.aes_key
 
-        public_key = self._get_public_key("KsefSessionEncryption")
+        public_key = self._get_public_key(SYMMETRIC_KEY_ENCRYPTION)
 
         encrypted = public_key.encrypt(
-            self.aes_key,
+            aes_key,
             padding.OAEP(
                 mgf=padding.MGF1(algorithm=hashes.SHA256()),
                 algorithm=hashes.SHA256(),
@@ -148,25 +203,14 @@ class KsefClient:
         )
         return base64.b64encode(encrypted).decode()
 
-    def _encrypt_invoice(self, xml_content):
+    def _encrypt_invoice(self, xml_bytes):
         """
-        Szyfruje fakturę algorytmem AES-256-CBC z PKCS#7 padding.
-        Używa IV wygenerowanego przy otwieraniu sesji.
+        Szyfruje fakturę algorytmem AES-256-CBC z PKCS#7 padding kluczem i IV
+        sesji online. Zwraca `EncryptedPayload` ze skrótami i rozmiarami.
         """
         if not self.aes_key or not self.aes_iv:
             raise Exception("Brak klucza AES/IV. Najpierw otwórz sesję.")
-
-        # PKCS#7 padding
-        padder = sym_padding.PKCS7(128).padder()
-        xml_bytes = xml_content.encode('utf-8')
-        padded_data = padder.update(xml_bytes) + padder.finalize()
-
-        # Szyfrowanie AES-256-CBC
-        cipher = Cipher(algorithms.AES(self.aes_key), modes.CBC(self.aes_iv), backend=default_backend())
-        encryptor = cipher.encryptor()
-        encrypted = encryptor.update(padded_data) + encryptor.finalize()
-
-        return base64.b64encode(encrypted).decode()
+        return encrypt_payload(xml_bytes, self.aes_key, self.aes_iv)
 
     def _authenticate(self):
         """
@@ -176,8 +220,21 @@ class KsefClient:
         3. Czeka na zakończenie uwierzytelnienia (polling statusu)
         4. Wymienia authenticationToken na accessToken (redeem)
         """
-        import time
-        
+        status_url = self._start_authentication()
+
+        # Krok 3: Polling statusu uwierzytelnienia (backoff od ~150 ms zamiast stałej 1 s)
+        logger.info("[3/4] Oczekiwanie na zakończenie uwierzytelnienia...")
+        poll(
+            lambda: self.session.get(status_url),
+            self._check_auth_status,
+            timeout=AUTH_STATUS_TIMEOUT,
+            description="uwierzytelnienia",
+        )
+
+        return self._redeem_tokens()
+
+    def _start_authentication(self):
+        """Kroki 1-2: challenge i wysłanie zaszyfrowanego tokena. Zwraca URL statusu."""
         # Krok 1: Challenge
         challenge_url = f"{self.base_url}/auth/challenge"
         payload = {
@@ -223,36 +280,29 @@ class KsefClient:
             'Authorization': f'Bearer {auth_token}'
         })
 
-        # Krok 3: Polling statusu uwierzytelnienia
-        status_url = f"{self.base_url}/auth/status/{auth_reference}"
-        
-        logger.info("[3/4] Oczekiwanie na zatwierdzenie w aplikacji...")
-        max_attempts = 60
-        for attempt in range(max_attempts):
-            resp_status = self.session.get(status_url)
-            resp_status.raise_for_status()
-            
-            status_data = resp_status.json()
-            status_code = status_data.get('status', {}).get('code')
-            status_desc = status_data.get('status', {}).get('description', '')
-            
-            logger.debug(f"Status uwierzytelnienia: {status_code} - {status_desc}")
-            
-            if status_code == 200:
-                logger.info("✓ Uwierzytelnianie zakończone sukcesem")
-                break
-            elif status_code == 100:
-                # W toku - czekamy
-                time.sleep(1)
-                continue
-            else:
-                # Błąd (np. 400, 415)
-                details = status_data.get('status', {}).get('details', [])
-                raise Exception(f"Uwierzytelnianie nieudane ({status_code}): {status_desc}. {details}")
-        else:
-            raise Exception("Przekroczono czas oczekiwania na uwierzytelnienie")
-
-        # Krok 4: Wymiana authenticationToken na accessToken (redeem)
+        return f"{self.base_url}/auth/{auth_reference}"
+
+    @staticmethod
+    def _check_auth_status(response):
+        """Zwraca dane statusu po zakończeniu uwierzytelnienia, None gdy trwa."""
+        status_data = response.json()
+        status_code = status_data.get('status', {}).get('code')
+        status_desc = status_data.get('status', {}).get('description', '')
+
+        logger.debug(f"Status uwierzytelnienia: {status_code} - {status_desc}")
+
+        if status_code == 200:
+            logger.info("✓ Uwierzytelnianie zakończone sukcesem")
+            return status_data
+        if status_code == 100:
+            # W toku - czekamy
+            return None
+        # Błąd (np. 400, 415)
+        details = status_data.get('status', {}).get('details', [])
+        raise Exception(f"Uwierzytelnianie nieudane ({status_code}): {status_desc}. {details}")
+
+    def _redeem_tokens(self):
+        """Krok 4: wymiana authenticationToken na accessToken i refreshToken."""
         redeem_url = f"{self.base_url}/auth/token/redeem"
 
         logger.info("[4/4] Wymiana tokena na accessToken (auth/token/redeem)")
@@ -262,22 +312,26 @@ class KsefClient:
         redeem_data = resp_redeem.json()
         
         # accessToken jest obiektem z polami 'token' i 'validUntil'
+        # (nagłówek Authorization dostaje sam string JWT)
         access_token_obj = redeem_data['accessToken']
         if isinstance(access_token_obj, dict):
-            self.access_token = access_token_obj['token']
+            self._set_access_token(
+                access_token_obj['token'],
+                self._parse_valid_until(access_token_obj.get('validUntil')),
+            )
         else:
-            self.access_token = access_token_obj
+            self._set_access_token(access_token_obj, None)
             
         refresh_token_obj = redeem_data.get('refreshToken')
         if isinstance(refresh_token_obj, dict):
             self.refresh_token = refresh_token_obj.get('token')
+            self.refresh_token_valid_until = self._parse_valid_until(
+                refresh_token_obj.get('validUntil')
+            )
         else:
             self.refresh_token = refresh_token_obj
-
-        # Aktualizacja nagłówków z prawidłowym accessToken (sam string JWT)
-        self.session.headers.update({
-            'Authorization': f'Bearer {self.access_token}'
-        })
+            self.refresh_token_valid_until = None
+        self._store_tokens()
 
         logger.info("✓ Pomyślnie uzyskano accessToken (API 2.0)")
         
@@ -286,6 +340,44 @@ class KsefClient:
         
         return redeem_data
 
+    def has_valid_access_token(self, margin_seconds=60):
+        """
+        Sprawdza, czy accessToken jest ważny jeszcze przez co najmniej
+        `margin_seconds` sekund. Brak daty ważności traktujemy jak token nieważny.
+        """
+        if not self.access_token or not self.access_token_valid_until:
+            return False
+        return self.access_token_valid_until - timedelta(seconds=margin_seconds) > timezone.now()
+
+    def _try_refresh(self):
+        """Próbuje odnowić accessToken; False oznacza konieczność pełnego uwierzytelnienia."""
+        if not self.has_valid_refresh_token():
+            return False
+        try:
+            with get_metrics().timed("refresh_token"):
+                self._refresh_access_token()
+            return True
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            logger.warning(f"⚠ Odświeżenie accessToken nieudane, pełne uwierzytelnienie: {e}")
+            self.refresh_token = None
+            self.refresh_token_valid_until = None
+            return False
+
+    def ensure_authenticated(self):
+        """
+        Zapewnia ważny accessToken: używa bieżącego, odnawia go refreshTokenem,
+        a pełne uwierzytelnienie wykonuje tylko, gdy odświeżenie się nie powiedzie.
+        """
+        if self.has_valid_access_token():
+            logger.debug("✓ Ponowne użycie ważnego accessToken")
+            return
+        # Sesja online jest powiązana z tokenem - po nowym uwierzytelnieniu otwieramy nową
+        self._reset_session_state()
+        if self._try_refresh():
+            return
+        with get_metrics().timed("authenticate"):
+            self._authenticate()
+
     def _check_permissions(self):
         """Sprawdza i loguje własne uprawnienia w KSeF."""
         try:
@@ -371,49 +463,79 @@ class KsefClient:
 
         session_result = resp_session.json()
         self.session_reference = session_result.get('referenceNumber')
+        self.session_last_used = timezone.now()
 
         logger.info(f"✓ Sesja otwarta. Nr ref: {self.session_reference}")
         return session_result
 
-    def send_invoice(self, xml_content):
+    def has_open_session(self):
+        """Czy klient ma otwartą sesję online (z kluczem AES) gotową do wysyłki."""
+        return bool(self.session_reference and self.aes_key and self.aes_iv)
+
+    def ensure_session(self):
+        """Otwiera sesję online, jeśli nie ma już otwartej sesji do ponownego użycia."""
+        if self.has_open_session():
+            return
+        with get_metrics().timed("open_session"):
+            self._open_session()
+
+    def _reset_session_state(self):
+        """Zapomina lokalny stan sesji online (numer referencyjny i klucz AES)."""
+        self.session_reference = None
+        self.session_last_used = None
+        self.aes_key = None
+        self.aes_iv = None
+
+    def send_invoice(self, xml_content, offline_mode=False):
         """
         Wysyła fakturę do KSeF:
-        1. Uwierzytelnia
-        2. Otwiera sesję
+        1. Uwierzytelnia (tylko gdy accessToken wygasł)
+        2. Otwiera sesję (tylko gdy nie ma otwartej)
         3. Szyfruje i wysyła fakturę
-        """
-        # 1. Pełne uwierzytelnienie
-        self._authenticate()
-
-        # 2. Otwórz sesję
-        session_data = self._open_session()
-
-        # 3. Zaszyfruj fakturę (używa IV z sesji)
-        encrypted_invoice = self._encrypt_invoice(xml_content)
 
-        # Oblicz hashe w Base64 (nie hex!)
-        xml_bytes = xml_content.encode('utf-8')
-        invoice_hash = base64.b64encode(hashlib.sha256(xml_bytes).digest()).decode()
-        invoice_size = len(xml_bytes)
+        Dzięki temu wiele faktur może zostać wysłanych w ramach jednego
+        uwierzytelnienia i jednej sesji online. `offline_mode=True` oznacza
+        fakturę wystawioną wcześniej w trybie offline.
+        """
+        self.ensure_authenticated()
+        self.ensure_session()
 
-        encrypted_bytes = base64.b64decode(encrypted_invoice)
-        encrypted_hash = base64.b64encode(hashlib.sha256(encrypted_bytes).digest()).decode()
-        encrypted_size = len(encrypted_bytes)
+        try:
+            return self._send_invoice_in_session(xml_content, offline_mode)
+        except requests.exceptions.HTTPError as e:
+            if e.response is None or e.response.status_code not in (401, 404):
+                raise
+            # Token lub sesja straciły ważność po stronie KSeF - jedna ponowna próba
+            logger.warning(
+                f"⚠ Sesja {self.session_reference} odrzucona ({e.response.status_code}), "
+                f"ponowne uwierzytelnienie i otwarcie sesji"
+            )
+            self.access_token = None
+            self.ensure_authenticated()
+            self.ensure_session()
+            return self._send_invoice_in_session(xml_content, offline_mode)
+
+    def _send_invoice_in_session(self, xml_content, offline_mode=False):
+        """Szyfruje i wysyła fakturę w ramach już otwartej sesji online."""
+        # Szyfrowanie, skróty i rozmiary w jednym przebiegu (używa IV z sesji)
+        if isinstance(xml_content, str):
+            xml_content = xml_content.encode('utf-8')
+        encrypted = self._encrypt_invoice(xml_content)
 
         # 4. Wyślij fakturę
         invoice_url = f"{self.base_url}/sessions/online/{self.session_reference}/invoices"
 
         invoice_payload = {
-            "invoiceHash": invoice_hash,
-            "invoiceSize": invoice_size,
-            "encryptedInvoiceHash": encrypted_hash,
-            "encryptedInvoiceSize": encrypted_size,
-            "encryptedInvoiceContent": encrypted_invoice,
-            "offlineMode": False
+            "invoiceHash": encrypted.hash,
+            "invoiceSize": encrypted.size,
+            "encryptedInvoiceHash": encrypted.encrypted_hash,
+            "encryptedInvoiceSize": encrypted.encrypted_size,
+            "encryptedInvoiceContent": encrypted.content_base64,
+            "offlineMode": offline_mode
         }
 
         logger.info("Wysyłanie zaszyfrowanej faktury...")
-        logger.debug(f"Invoice hash: {invoice_hash[:16]}..., size: {invoice_size}")
+        logger.debug(f"Invoice hash: {encrypted.hash[:16]}..., size: {encrypted.size}")
         
         resp_invoice = self.session.post(invoice_url, json=invoice_payload)
         
@@ -424,6 +546,7 @@ class KsefClient:
 
         invoice_result = resp_invoice.json()
         invoice_reference = invoice_result.get('referenceNumber')
+        self.session_last_used = timezone.now()
 
         logger.info(f"✓ Faktura wysłana. Nr ref: {invoice_reference}")
 
@@ -432,6 +555,204 @@ class KsefClient:
             "session_reference": self.session_reference
         }
 
+    def send_batch(self, invoices):
+        """
+        Wysyła wiele faktur w jednej sesji wsadowej KSeF:
+        1. Buduje paczkę ZIP z plików XML faktur
+        2. Dzieli paczkę na części, szyfruje je AES-256-CBC
+        3. Otwiera sesję wsadową i przesyła części pod wskazane adresy
+        4. Zamyka sesję, co uruchamia przetwarzanie paczki
+
+        Zwraca numer sesji oraz nazwę pliku i hash każdej faktury w paczce -
+        numery KSeF są nadawane dopiero po przetworzeniu sesji.
+        """
+        from .xml_generator import generate_invoices_xml
+
+        self.ensure_authenticated()
+
+        # 1. Paczka ZIP
+        invoices = list(invoices)
+        invoice_numbers = {invoice.pk: invoice.invoice_number for invoice in invoices}
+        entries = []
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for invoice_id, xml_bytes, invoice_hash in generate_invoices_xml(invoices):
+                file_name = f"faktura_{invoice_id}.xml"
+                archive.writestr(file_name, xml_bytes)
+                entries.append({
+                    "invoice_id": invoice_id,
+                    "invoice_number": invoice_numbers[invoice_id],
+                    "file_name": file_name,
+                    "invoice_hash": invoice_hash,
+                })
+        if not entries:
+            raise Exception("Brak faktur do wysłania w sesji wsadowej.")
+
+        zip_bytes = zip_buffer.getvalue()
+        zip_buffer.close()
+
+        # 2. Podział na części i szyfrowanie (klucz niezależny od sesji online)
+        batch_key = os.urandom(32)
+        batch_iv = os.urandom(16)
+        # Części szyfrowane są równolegle; skróty powstają przy szyfrowaniu
+        zip_view = memoryview(zip_bytes)
+        encrypted_parts = encrypt_payloads(
+            (
+                zip_view[offset:offset + BATCH_PART_MAX_SIZE]
+                for offset in range(0, len(zip_bytes), BATCH_PART_MAX_SIZE)
+            ),
+            batch_key,
+            batch_iv,
+        )
+        parts = list(enumerate(encrypted_parts, 1))
+
+        # 3. Otwarcie sesji wsadowej
+        batch_payload = {
+            "formCode": {
+                "systemCode": "FA (3)",
+                "schemaVersion": "1-0E",
+                "value": "FA"
+            },
+            "batchFile": {
+                "fileSize": len(zip_bytes),
+                "fileHash": base64.b64encode(hashlib.sha256(zip_bytes).digest()).decode(),
+                "fileParts": [
+                    {
+                        "ordinalNumber": ordinal,
+                        "fileSize": encrypted_part.encrypted_size,
+                        "fileHash": encrypted_part.encrypted_hash,
+                    }
+                    for ordinal, encrypted_part in parts
+                ],
+            },
+            "encryption": {
+                "encryptedSymmetricKey": self._encrypt_aes_key(batch_key),
+                "initializationVector": base64.b64encode(batch_iv).decode()
+            },
+            "offlineMode": False
+        }
+
+        logger.info(
+            f"Otwieranie sesji wsadowej: {len(entries)} faktur, "
+            f"{len(zip_bytes)} B, części: {len(parts)}"
+        )
+        resp_batch = self.session.post(f"{self.base_url}/sessions/batch", json=batch_payload)
+        if resp_batch.status_code not in (200, 201):
+            logger.error(f"❌ Błąd otwarcia sesji wsadowej: {resp_batch.status_code} - {resp_batch.text}")
+        resp_batch.raise_for_status()
+
+        batch_result = resp_batch.json()
+        batch_reference = batch_result.get('referenceNumber')
+        upload_requests = {
+            r['ordinalNumber']: r for r in batch_result.get('partUploadRequests', [])
+        }
+
+        # 4. Wysyłka części - adresy są podpisane, bez nagłówka Authorization
+        for ordinal, encrypted_part in parts:
+            upload = upload_requests.get(ordinal)
+            if not upload:
+                raise Exception(f"KSeF nie zwrócił adresu dla części {ordinal} paczki.")
+            logger.info(f"Wysyłanie części {ordinal}/{len(parts)} sesji {batch_reference}")
+            resp_part = self.transport.request(
+                upload.get('method', 'PUT'),
+                upload['url'],
+                data=encrypted_part.content,
+                headers=upload.get('headers') or {},
+                timeout=UPLOAD_TIMEOUT,
+            )
+            resp_part.raise_for_status()
+
+        # 5. Zamknięcie sesji rozpoczyna przetwarzanie paczki
+        resp_close = self.session.post(f"{self.base_url}/sessions/batch/{batch_reference}/close")
+        resp_close.raise_for_status()
+
+        logger.info(f"✓ Paczka wysłana. Nr ref sesji wsadowej: {batch_reference}")
+
+        return {
+            "session_reference": batch_reference,
+            "invoices": entries,
+        }
+
+    def get_session_status(self, session_reference):
+        """Zwraca bieżący status sesji (online lub wsadowej)."""
+        resp = self.session.get(f"{self.base_url}/sessions/{session_reference}")
+        resp.raise_for_status()
+        return resp.json()
+
+    def get_invoice_status(self, session_reference, invoice_reference):
+        """Zwraca status faktury wysłanej w sesji (z numerem KSeF, gdy został nadany)."""
+        resp = self.session.get(
+            f"{self.base_url}/sessions/{session_reference}/invoices/{invoice_reference}"
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    def list_session_invoices(self, session_reference, page_size=1000):
+        """Zwraca statusy wszystkich faktur sesji (stronicowanie przez x-continuation-token)."""
+        url = f"{self.base_url}/sessions/{session_reference}/invoices"
+        continuation_token = None
+        invoices = []
+        while True:
+            headers = {'x-continuation-token': continuation_token} if continuation_token else {}
+            resp = self.session.get(url, params={'pageSize': page_size}, headers=headers)
+            resp.raise_for_status()
+            data = resp.json()
+            invoices.extend(data.get('invoices', []))
+            continuation_token = data.get('continuationToken')
+            if not continuation_token:
+                return invoices
+
+    def download_session_upo(self, session_reference, session_status=None):
+        """
+        Pobiera zbiorcze UPO sesji (wszystkie strony). Zwraca listę dokumentów XML
+        w bajtach albo pustą listę, gdy UPO nie jest jeszcze dostępne.
+        """
+        if session_status is None:
+            session_status = self.get_session_status(session_reference)
+        pages = (session_status.get('upo') or {}).get('pages') or []
+
+        documents = []
+        for page in pages:
+            if page.get('downloadUrl'):
+                # Adres jest podpisany - bez nagłówka Authorization
+                resp = self.transport.request('GET', page['downloadUrl'])
+            else:
+                resp = self.session.get(
+                    f"{self.base_url}/sessions/{session_reference}/upo/{page['referenceNumber']}"
+                )
+            resp.raise_for_status()
+            documents.append(resp.content)
+        return documents
+
+    def query_invoice_metadata(self, filters, page_offset=0, page_size=250, sort_order='Asc'):
+        """
+        Jedna strona metadanych faktur (POST /invoices/query/metadata).
+        Zwraca słownik z polami 'invoices', 'hasMore', 'isTruncated'
+        i 'permanentStorageHwmDate'.
+        """
+        self.ensure_authenticated()
+        resp = self.session.post(
+            f"{self.base_url}/invoices/query/metadata",
+            params={'pageOffset': page_offset, 'pageSize': page_size, 'sortOrder': sort_order},
+            json=filters,
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    def download_invoice(self, ksef_number):
+        """
+        Pobiera XML faktury po numerze KSeF. Zwraca odpowiedź strumieniową -
+        treść czyta się z `response.raw`, a po użyciu trzeba ją zamknąć.
+        """
+        self.ensure_authenticated()
+        resp = self.session.get(f"{self.base_url}/invoices/ksef/{ksef_number}", stream=True)
+        if not resp.ok:
+            # Treść błędu jest krótka - wczytujemy ją, by była dostępna w wyjątku
+            resp.content
+            resp.raise_for_status()
+        resp.raw.decode_content = True
+        return resp
+
     def close_session(self):
         """Zamyka sesję interaktywną."""
         if not self.session_reference:
@@ -441,8 +762,11 @@ class KsefClient:
         close_url = f"{self.base_url}/sessions/online/{self.session_reference}/close"
 
         logger.info(f"Zamykanie sesji: {self.session_reference}")
-        resp = self.session.post(close_url)
-        resp.raise_for_status()
+        try:
+            resp = self.session.post(close_url)
+            resp.raise_for_status()
+        finally:
+            self._reset_session_state()
 
         logger.info("✓ Sesja zamknięta")
-        return resp.json()
+        return resp.json() if resp.content else None
@@ -0,0 +1,169 @@
+# ksef/dispatcher.py
+
+import logging
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .jobs import (
+    DEFAULT_PER_NIP_CONCURRENCY,
+    claim_jobs,
+    process_jobs,
+    release_stale_jobs,
+    requeue_jobs,
+)
+from .models import KsefJob
+from .rate_limit import KeyedRateLimiter
+from .session_pool import get_session_pool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THREADS = 4
+# Wysyłki na sekundę dla jednego NIP-u (faktura online lub cała paczka wsadowa)
+DEFAULT_NIP_RATE = 2
+DEFAULT_NIP_BURST = 5
+# Co ile sekund przywracać do kolejki porzucone zadania i zamykać bezczynne sesje KSeF
+MAINTENANCE_INTERVAL = 60
+
+
+class KsefDispatcher:
+    """
+    Wysyła faktury z kolejki KSeF wielu firm równolegle w puli wątków.
+
+    Każdy wątek pobiera po jednej jednostce pracy (`claim_jobs`). Dla każdego
+    NIP-u obowiązuje limit równoległych wysyłek i kubełek żetonów
+    (`KSEF_NIP_RATE_LIMIT` wysyłek/s, chwilowo do `KSEF_NIP_RATE_BURST`);
+    NIP bez wolnych żetonów jest pomijany, więc wolna lub ograniczana firma
+    nie zajmuje wątków potrzebnych pozostałym. Łączny limit zapytań do
+    środowiska KSeF pilnuje transport HTTP (`KSEF_ENVIRONMENT_RATE_LIMIT`).
+    Limity dotyczą jednego procesu.
+    """
+
+    def __init__(self, threads=None, per_nip_limit=None, poll_interval=2.0,
+                 nip_rate=None, nip_burst=None):
+        self.threads = threads or getattr(settings, "KSEF_WORKER_THREADS", DEFAULT_THREADS)
+        if per_nip_limit is None:
+            per_nip_limit = getattr(
+                settings, "KSEF_PER_NIP_CONCURRENCY", DEFAULT_PER_NIP_CONCURRENCY
+            )
+        self.per_nip_limit = per_nip_limit
+        self.poll_interval = poll_interval
+
+        if nip_rate is None:
+            nip_rate = getattr(settings, "KSEF_NIP_RATE_LIMIT", DEFAULT_NIP_RATE)
+        if nip_burst is None:
+            nip_burst = getattr(settings, "KSEF_NIP_RATE_BURST", DEFAULT_NIP_BURST)
+        self.rate_limiter = KeyedRateLimiter(nip_rate, nip_burst) if nip_rate else None
+
+        self.stop_event = threading.Event()
+        self.processed = 0
+        self.errors = 0
+        self._counter_lock = threading.Lock()
+
+    def run(self, once=False):
+        """
+        Uruchamia wątki i czeka na ich zakończenie. Z `once=True` kończy pracę,
+        gdy w kolejce nie ma już zadań gotowych do wysłania. W trakcie pracy
+        co `MAINTENANCE_INTERVAL` s przywraca do kolejki porzucone zadania
+        i zamyka bezczynne sesje KSeF - poza wątkami wysyłającymi faktury.
+        """
+        worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._maintenance()
+        last_maintenance = time.monotonic()
+        threads = [
+            threading.Thread(
+                target=self._run, args=(f"{worker_prefix}:{i}", once), daemon=True
+            )
+            for i in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=1)
+                if time.monotonic() - last_maintenance >= MAINTENANCE_INTERVAL:
+                    self._maintenance()
+                    last_maintenance = time.monotonic()
+        except KeyboardInterrupt:
+            self.stop()
+            for thread in threads:
+                thread.join()
+            raise
+        finally:
+            get_session_pool().close_all()
+
+        return {"processed": self.processed, "errors": self.errors}
+
+    def stop(self):
+        """Prosi wątki o zakończenie pracy po bieżącej wysyłce."""
+        self.stop_event.set()
+
+    def _run(self, worker_id, once):
+        while not self.stop_event.is_set():
+            close_old_connections()
+            idle = True
+            jobs = []
+            try:
+                jobs = claim_jobs(
+                    worker_id,
+                    per_nip_limit=self.per_nip_limit,
+                    rate_limiter=self.rate_limiter,
+                )
+                if jobs:
+                    idle = False
+                    process_jobs(jobs)
+                    with self._counter_lock:
+                        self.processed += len(jobs)
+            except Exception as e:
+                with self._counter_lock:
+                    self.errors += 1
+                logger.error(f"❌ Błąd workera {worker_id}: {e}")
+                # Przejęte zadania wracają do kolejki - inaczej blokowałyby NIP do czasu uznania za porzucone
+                try:
+                    requeue_jobs(jobs, e)
+                except Exception as requeue_error:
+                    logger.error(
+                        f"❌ Nie udało się zwrócić zadań do kolejki ({worker_id}): {requeue_error}"
+                    )
+            finally:
+                close_old_connections()
+
+            if not idle:
+                continue
+            if once:
+                if not self._rate_limited_work_pending():
+                    return
+                # Zadania czekają tylko na żetony limitu - krótka przerwa
+                self.stop_event.wait(0.1)
+                continue
+            self.stop_event.wait(self.poll_interval)
+
+    def _maintenance(self):
+        try:
+            release_stale_jobs()
+        except Exception as e:
+            logger.error(f"❌ Błąd przywracania porzuconych zadań KSeF: {e}")
+        finally:
+            close_old_connections()
+        try:
+            get_session_pool().close_idle()
+        except Exception as e:
+            logger.error(f"❌ Błąd zamykania bezczynnych sesji KSeF: {e}")
+
+    def _rate_limited_work_pending(self):
+        """Czy zadania czekają tylko na żetony limitu (wtedy `once` nie powinno kończyć)."""
+        if self.rate_limiter is None:
+            return False
+        exhausted = self.rate_limiter.exhausted_keys()
+        if not exhausted:
+            return False
+        return KsefJob.objects.filter(
+            status="queued", run_after__lte=timezone.now(), nip__in=exhausted
+        ).exists()
@@ -0,0 +1,87 @@
+# ksef/encryption.py
+
+import base64
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import padding as sym_padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+# Rozmiar porcji danych przy szyfrowaniu strumieniowym
+CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_WORKERS = 4
+
+
+class EncryptedPayload(NamedTuple):
+    """Zaszyfrowany dokument wraz ze skrótami i rozmiarami wymaganymi przez KSeF."""
+
+    content: bytes
+    hash: str
+    size: int
+    encrypted_hash: str
+    encrypted_size: int
+
+    @property
+    def content_base64(self):
+        return base64.b64encode(self.content).decode()
+
+
+def _b64_digest(hasher):
+    return base64.b64encode(hasher.digest()).decode()
+
+
+def encrypt_payload(data, aes_key, aes_iv):
+    """
+    Szyfruje bajty AES-256-CBC z PKCS#7 i w tym samym przebiegu liczy SHA-256
+    (Base64) oraz rozmiar danych przed i po zaszyfrowaniu.
+    """
+    plain_hasher = hashlib.sha256()
+    encrypted_hasher = hashlib.sha256()
+    padder = sym_padding.PKCS7(128).padder()
+    encryptor = Cipher(
+        algorithms.AES(aes_key), modes.CBC(aes_iv), backend=default_backend()
+    ).encryptor()
+
+    view = memoryview(data)
+    encrypted_parts = []
+    for offset in range(0, len(view), CHUNK_SIZE):
+        chunk = view[offset:offset + CHUNK_SIZE]
+        plain_hasher.update(chunk)
+        encrypted = encryptor.update(padder.update(chunk))
+        encrypted_hasher.update(encrypted)
+        encrypted_parts.append(encrypted)
+
+    encrypted = encryptor.update(padder.finalize()) + encryptor.finalize()
+    encrypted_hasher.update(encrypted)
+    encrypted_parts.append(encrypted)
+
+    content = b"".join(encrypted_parts)
+    return EncryptedPayload(
+        content=content,
+        hash=_b64_digest(plain_hasher),
+        size=len(data),
+        encrypted_hash=_b64_digest(encrypted_hasher),
+        encrypted_size=len(content),
+    )
+
+
+def encrypt_payloads(payloads, aes_key, aes_iv, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Szyfruje wiele dokumentów równolegle w puli wątków (biblioteka
+    `cryptography` zwalnia GIL). Wyniki zwracane są w kolejności wejścia.
+    """
+    payloads = list(payloads)
+    if max_workers <= 1 or len(payloads) <= 1:
+        return [encrypt_payload(data, aes_key, aes_iv) for data in payloads]
+
+    # Każdy wątek dostaje ciągły fragment listy - mniej narzutu niż zadanie na dokument
+    slice_size = -(-len(payloads) // max_workers)
+    slices = [payloads[i:i + slice_size] for i in range(0, len(payloads), slice_size)]
+
+    def encrypt_slice(items):
+        return [encrypt_payload(data, aes_key, aes_iv) for data in items]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return [result for results in executor.map(encrypt_slice, slices) for result in results]
@@ -0,0 +1,362 @@
+# ksef/jobs.py
+
+import logging
+import uuid
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .models import KsefJob
+from .services import InvoiceSentError, send_invoice_to_ksef, send_invoices_batch_to_ksef
+
+logger = logging.getLogger(__name__)
+
+# Ile równoległych wysyłek może mieć jeden NIP
+DEFAULT_PER_NIP_CONCURRENCY = 1
+# Po ilu sekundach zadanie "running" bez postępu uznajemy za porzucone
+DEFAULT_STALE_TIMEOUT = 15 * 60
+# Faktury offline trzeba przesłać do KSeF najpóźniej następnego dnia roboczego
+DEFAULT_OFFLINE_DEADLINE_DAYS = 1
+# Maksymalna przerwa między próbami wysyłki faktury offline (w sekundach)
+OFFLINE_MAX_RETRY_DELAY = 5 * 60
+
+
+def _normalize_nip(nip_str):
+    return "".join(filter(str.isdigit, nip_str or ""))
+
+
+def offline_deadline(issued_at=None, business_days=None):
+    """
+    Termin przesłania faktury wystawionej offline: koniec n-tego dnia roboczego
+    (pon.-pt.) po dniu wystawienia. Święta nie są uwzględniane.
+    """
+    if business_days is None:
+        business_days = getattr(
+            settings, "KSEF_OFFLINE_DEADLINE_DAYS", DEFAULT_OFFLINE_DEADLINE_DAYS
+        )
+    day = timezone.localdate(issued_at or timezone.now())
+    while business_days > 0:
+        day += timedelta(days=1)
+        if day.weekday() < 5:
+            business_days -= 1
+    return timezone.make_aware(datetime.combine(day, datetime.max.time()))
+
+
+def enqueue_invoices(invoices, batch_threshold=None, offline=None):
+    """
+    Dodaje faktury do kolejki KSeF i oznacza je jako "pending".
+    Powyżej progu `KSEF_BATCH_THRESHOLD` faktury jednej firmy trafiają
+    do wspólnej paczki wysyłanej w sesji wsadowej.
+
+    W trybie offline (`offline=True` lub ustawienie `KSEF_OFFLINE_MODE`) XML
+    faktury i jego skrót są zapisywane od razu, a worker prześle je później
+    z `offlineMode: true` - użytkownik nie czeka na dostępność KSeF.
+    """
+    from ksiegowosc.models import Invoice
+
+    if offline is None:
+        offline = getattr(settings, "KSEF_OFFLINE_MODE", False)
+    if offline:
+        return _enqueue_offline(invoices)
+
+    if batch_threshold is None:
+        batch_threshold = getattr(settings, "KSEF_BATCH_THRESHOLD", 20)
+
+    invoices = list(invoices.select_related("user__companyinfo"))
+    by_user = {}
+    for invoice in invoices:
+        by_user.setdefault(invoice.user_id, []).append(invoice)
+
+    jobs = []
+    for user_invoices in by_user.values():
+        company = getattr(user_invoices[0].user, "companyinfo", None)
+        nip = _normalize_nip(company.tax_id if company else "")
+        batch_id = uuid.uuid4() if len(user_invoices) > batch_threshold else None
+        for invoice in user_invoices:
+            jobs.append(
+                KsefJob(
+                    user_id=invoice.user_id,
+                    invoice=invoice,
+                    nip=nip,
+                    mode="batch" if batch_id else "online",
+                    batch_id=batch_id,
+                )
+            )
+
+    with transaction.atomic():
+        KsefJob.objects.bulk_create(jobs)
+        Invoice.objects.filter(pk__in=[i.pk for i in invoices]).update(
+            ksef_status="pending",
+            ksef_processing_description="W kolejce do wysyłki do KSeF.",
+        )
+    return jobs
+
+
+def _enqueue_offline(invoices):
+    """Zapisuje XML i skrót faktur w zadaniach offline z terminem wysyłki."""
+    from ksiegowosc.models import Invoice
+
+    from .xml_generator import generate_invoices_xml
+
+    invoices = {
+        invoice.pk: invoice
+        for invoice in invoices.select_related("user__companyinfo")
+    }
+    deadline = offline_deadline()
+    jobs = []
+    for pk, xml_bytes, digest in generate_invoices_xml(
+        Invoice.objects.filter(pk__in=list(invoices))
+    ):
+        invoice = invoices[pk]
+        company = getattr(invoice.user, "companyinfo", None)
+        jobs.append(
+            KsefJob(
+                user_id=invoice.user_id,
+                invoice=invoice,
+                nip=_normalize_nip(company.tax_id if company else ""),
+                mode="offline",
+                payload=xml_bytes,
+                payload_hash=digest,
+                deadline=deadline,
+            )
+        )
+
+    local_deadline = timezone.localtime(deadline).strftime("%Y-%m-%d")
+    with transaction.atomic():
+        KsefJob.objects.bulk_create(jobs)
+        Invoice.objects.filter(pk__in=list(invoices)).update(
+            ksef_status="pending",
+            ksef_processing_description=(
+                f"Wystawiono w trybie offline. Termin przesłania do KSeF: {local_deadline}."
+            ),
+        )
+    return jobs
+
+
+def offline_queue_stats(user=None):
+    """Liczba faktur offline czekających na wysyłkę, w tym po terminie, i najbliższy termin."""
+    qs = KsefJob.objects.filter(mode="offline", status__in=["queued", "running"])
+    if user is not None:
+        qs = qs.filter(user=user)
+    return qs.aggregate(
+        depth=Count("id"),
+        overdue=Count("id", filter=Q(deadline__lt=timezone.now())),
+        next_deadline=Min("deadline"),
+    )
+
+
+def release_stale_jobs(timeout=DEFAULT_STALE_TIMEOUT):
+    """Przywraca do kolejki zadania porzucone przez przerwanego workera."""
+    threshold = timezone.now() - timedelta(seconds=timeout)
+    count = KsefJob.objects.filter(status="running", locked_at__lt=threshold).update(
+        status="queued", locked_at=None, locked_by=""
+    )
+    if count:
+        logger.warning(f"⚠ Przywrócono do kolejki {count} porzuconych zadań KSeF")
+    return count
+
+
+def _sent_during_claim(job, state):
+    """Czy faktura zadania trafiła do KSeF już po jego przejęciu przez workera."""
+    if state is None:
+        return False
+    if state["ksef_status"] == "success":
+        return True
+    sent_at = state["ksef_sent_at"]
+    return bool(job.locked_at and sent_at and sent_at >= job.locked_at)
+
+
+def requeue_jobs(jobs, error):
+    """
+    Rozlicza zadania przejęte przez workera, którego przetwarzanie przerwał
+    nieoczekiwany błąd, żeby nie blokowały limitu równoległych wysyłek NIP-u.
+    Faktura wysłana już w tym przejęciu (KSeF ją przyjął, a błąd wystąpił
+    później - `InvoiceSentError` albo zapisany czas wysyłki) nie jest wysyłana
+    drugi raz - zadanie kończy się jako wykonane.
+    Pozostałe wracają do kolejki z opóźnieniem jak przy nieudanej wysyłce,
+    a po `max_attempts` próbach są oznaczane jako nieudane.
+    """
+    from ksiegowosc.models import Invoice
+
+    if not jobs:
+        return 0
+    error_message = str(error)
+    sent = isinstance(error, InvoiceSentError)
+    sent_state = {
+        row["pk"]: row
+        for row in Invoice.objects.filter(pk__in=[job.invoice_id for job in jobs]).values(
+            "pk", "ksef_status", "ksef_sent_at"
+        )
+    }
+
+    now = timezone.now()
+    done, failed, retry = [], [], {}
+    for job in jobs:
+        if sent or _sent_during_claim(job, sent_state.get(job.invoice_id)):
+            done.append(job.pk)
+        elif job.attempts + 1 >= job.max_attempts:
+            failed.append(job)
+        else:
+            retry.setdefault(job.attempts + 1, []).append(job.pk)
+
+    running = KsefJob.objects.filter(status="running")
+    count = 0
+    if done:
+        count += running.filter(pk__in=done).update(
+            status="done", attempts=F("attempts") + 1, last_error=error_message, locked_at=None
+        )
+    for attempts, job_ids in retry.items():
+        count += running.filter(pk__in=job_ids).update(
+            status="queued",
+            attempts=attempts,
+            last_error=error_message,
+            run_after=now + timedelta(seconds=_retry_delay(attempts)),
+            locked_at=None,
+            locked_by="",
+        )
+    for job in failed:
+        count += running.filter(pk=job.pk).update(
+            status="failed", attempts=job.attempts + 1, last_error=error_message, locked_at=None
+        )
+    if failed:
+        Invoice.objects.filter(pk__in=[job.invoice_id for job in failed]).update(
+            ksef_status="error", ksef_processing_description=error_message[:500]
+        )
+    return count
+
+
+def _running_units_per_nip():
+    """Liczba trwających wysyłek na NIP (paczka wsadowa liczy się jako jedna)."""
+    rows = (
+        KsefJob.objects.filter(status="running")
+        .values("nip")
+        .annotate(
+            online=Count("id", filter=Q(batch_id__isnull=True)),
+            batches=Count("batch_id", distinct=True),
+        )
+    )
+    return {row["nip"]: row["online"] + row["batches"] for row in rows}
+
+
+def claim_jobs(worker_id, per_nip_limit=DEFAULT_PER_NIP_CONCURRENCY, scan_size=50,
+               rate_limiter=None):
+    """
+    Pobiera do przetworzenia jedną jednostkę pracy: pojedyncze zadanie online
+    albo wszystkie zadania jednej paczki wsadowej. NIP-y, które osiągnęły limit
+    równoległych wysyłek lub wyczerpały żetony w `rate_limiter`
+    (`KeyedRateLimiter` według NIP-u), są pomijane już w zapytaniu, więc nie
+    blokują zadań innych firm. Przejęcie zadania jest warunkowym UPDATE,
+    więc wiele procesów workera może bezpiecznie działać jednocześnie.
+    """
+    now = timezone.now()
+    running = _running_units_per_nip()
+    blocked = {nip for nip, count in running.items() if count >= per_nip_limit}
+    if rate_limiter is not None:
+        blocked |= rate_limiter.exhausted_keys()
+    candidates = (
+        KsefJob.objects.filter(status="queued", run_after__lte=now)
+        .exclude(nip__in=blocked)
+        .order_by("run_after", "pk")
+        .values("pk", "nip", "batch_id")[:scan_size]
+    )
+    for candidate in candidates:
+        nip = candidate["nip"]
+        if running.get(nip, 0) >= per_nip_limit:
+            continue
+        if rate_limiter is not None and not rate_limiter.available(nip):
+            continue
+
+        if candidate["batch_id"]:
+            claim_filter = Q(batch_id=candidate["batch_id"])
+        else:
+            claim_filter = Q(pk=candidate["pk"])
+
+        claimed = KsefJob.objects.filter(claim_filter, status="queued").update(
+            status="running", locked_at=now, locked_by=worker_id
+        )
+        if not claimed:
+            # Inny worker był szybszy
+            continue
+
+        jobs = list(
+            KsefJob.objects.filter(claim_filter, status="running", locked_by=worker_id)
+        )
+        # Kontrola wyścigu: inny worker mógł w tym czasie zająć ten sam NIP
+        if _running_units_per_nip().get(nip, 0) > per_nip_limit:
+            KsefJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status="queued", locked_at=None, locked_by=""
+            )
+            running[nip] = per_nip_limit
+            continue
+        if rate_limiter is not None:
+            # Paczka wsadowa to jedna sesja - liczy się jak jedna wysyłka
+            rate_limiter.consume(nip)
+        return jobs
+    return []
+
+
+def _retry_delay(attempts):
+    """Wykładnicze opóźnienie kolejnej próby: 30 s, 60 s, 120 s... (maks. 1 h)."""
+    return min(30 * 2 ** (attempts - 1), 3600)
+
+
+def process_jobs(jobs):
+    """Wysyła faktury z pobranych zadań i zapisuje wynik w kolejce."""
+    from ksiegowosc.models import Invoice
+
+    if not jobs:
+        return
+
+    if jobs[0].batch_id:
+        result = send_invoices_batch_to_ksef([job.invoice_id for job in jobs])
+    elif jobs[0].mode == "offline":
+        job = jobs[0]
+        if job.deadline and job.deadline < timezone.now():
+            logger.error(
+                f"❌ Faktura offline {job.invoice_id} wysyłana po terminie ({job.deadline})"
+            )
+        result = send_invoice_to_ksef(job.invoice_id, xml_content=bytes(job.payload), offline=True)
+    else:
+        result = send_invoice_to_ksef(jobs[0].invoice_id)
+
+    now = timezone.now()
+    job_ids = [job.pk for job in jobs]
+    if result["success"]:
+        KsefJob.objects.filter(pk__in=job_ids).update(
+            status="done", attempts=jobs[0].attempts + 1, last_error="", locked_at=None
+        )
+        return
+
+    attempts = jobs[0].attempts + 1
+    error_message = result["message"]
+    # Faktura offline jest już wystawiona - ponawiamy aż KSeF będzie dostępny
+    offline = jobs[0].mode == "offline"
+    if result.get("retryable") and (offline or attempts < jobs[0].max_attempts):
+        delay = _retry_delay(attempts)
+        if offline:
+            delay = min(delay, OFFLINE_MAX_RETRY_DELAY)
+        logger.warning(
+            f"⚠ Wysyłka do KSeF nieudana (próba {attempts}), ponowienie za {delay} s: {error_message}"
+        )
+        KsefJob.objects.filter(pk__in=job_ids).update(
+            status="queued",
+            attempts=attempts,
+            last_error=error_message,
+            run_after=now + timedelta(seconds=delay),
+            locked_at=None,
+            locked_by="",
+        )
+        Invoice.objects.filter(pk__in=[job.invoice_id for job in jobs]).update(
+            ksef_status="pending",
+            ksef_processing_description=(
+                f"Ponowna próba wysyłki (nr {attempts + 1}). Ostatni błąd: {error_message}"
+            )[:500],
+        )
+        return
+
+    KsefJob.objects.filter(pk__in=job_ids).update(
+        status="failed", attempts=attempts, last_error=error_message, locked_at=None
+    )
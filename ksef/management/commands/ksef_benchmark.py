@@ -0,0 +1,182 @@
+# ksef/management/commands/ksef_benchmark.py
+
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import override_settings
+
+from ksef.mock_server import MockKsefServer
+from ksef.services import send_invoice_to_ksef
+from ksef.session_pool import get_session_pool
+from ksef.transport import transport_stats
+from ksiegowosc.models import CompanyInfo, Contractor, Invoice, InvoiceItem
+
+USERNAME_PREFIX = "ksef_benchmark_"
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(int(round(percent / 100 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Wysyła N faktur przez send_invoice_to_ksef do lokalnego serwera testowego KSeF '
+        'i raportuje opóźnienia p50/p95 oraz liczbę faktur na sekundę'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoices', type=int, default=200, help='Liczba faktur (domyślnie 200)')
+        parser.add_argument(
+            '--companies',
+            type=int,
+            default=4,
+            help='Liczba firm wysyłających równolegle (domyślnie 4)',
+        )
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=20,
+            help='Opóźnienie każdej odpowiedzi serwera w ms (domyślnie 20)',
+        )
+        parser.add_argument(
+            '--error-rate',
+            type=float,
+            default=0.0,
+            help='Odsetek odpowiedzi 503 wstrzykiwanych przez serwer (0-1)',
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Nie usuwaj użytkowników i faktur testowych po zakończeniu',
+        )
+
+    def handle(self, *args, **options):
+        server = MockKsefServer(
+            latency=options['latency'] / 1000, error_rate=options['error_rate']
+        ).start()
+        users = self._create_data(options['invoices'], options['companies'])
+        try:
+            with override_settings(KSEF_BASE_URL=server.base_url):
+                self._run(users, server)
+        finally:
+            get_session_pool().close_all()
+            server.stop()
+            if not options['keep']:
+                self._delete_data(User.objects.filter(pk__in=[user.pk for user in users]))
+
+    @staticmethod
+    def _delete_data(users):
+        # Faktury trzeba usunąć przed kontrahentami (on_delete=PROTECT)
+        Invoice.objects.filter(user__in=users).delete()
+        users.delete()
+
+    def _create_data(self, invoice_count, company_count):
+        self._delete_data(User.objects.filter(username__startswith=USERNAME_PREFIX))
+        users = []
+        for i in range(company_count):
+            user = User.objects.create(username=f"{USERNAME_PREFIX}{i}")
+            CompanyInfo.objects.create(
+                user=user,
+                company_name=f"Firma testowa {i}",
+                tax_id=f"{5260000000 + i}",
+                street="ul. Testowa 1",
+                zip_code="00-001",
+                city="Warszawa",
+                bank_account_number="00000000000000000000000000",
+                ksef_token="benchmark-token",
+                ksef_environment="test",
+            )
+            Contractor.objects.create(
+                user=user, name=f"Kontrahent {i}", tax_id="1111111111",
+                street="ul. Kupiecka 2", zip_code="00-002", city="Kraków",
+            )
+            users.append(user)
+
+        contractors = {c.user_id: c for c in Contractor.objects.filter(user__in=users)}
+        invoices = Invoice.objects.bulk_create(
+            [
+                Invoice(
+                    user=users[n % company_count],
+                    contractor=contractors[users[n % company_count].pk],
+                    invoice_number=f"BENCH/{n + 1}",
+                    total_amount=Decimal("123.00"),
+                )
+                for n in range(invoice_count)
+            ]
+        )
+        InvoiceItem.objects.bulk_create(
+            [
+                InvoiceItem(
+                    user_id=invoice.user_id,
+                    invoice=invoice,
+                    name="Usługa testowa",
+                    quantity=Decimal("1"),
+                    unit_price=Decimal("123.00"),
+                    total_price=Decimal("123.00"),
+                )
+                for invoice in invoices
+            ]
+        )
+        return users
+
+    def _send_all(self, invoice_ids):
+        durations, errors = [], []
+        try:
+            for invoice_id in invoice_ids:
+                start = time.perf_counter()
+                result = send_invoice_to_ksef(invoice_id)
+                durations.append(time.perf_counter() - start)
+                if not result['success']:
+                    errors.append(result['message'])
+        finally:
+            close_old_connections()
+        return durations, errors
+
+    def _run(self, users, server):
+        # Faktury jednej firmy idą sekwencyjnie (jeden klient z puli), firmy - równolegle
+        per_user = [
+            list(Invoice.objects.filter(user=user).order_by('pk').values_list('pk', flat=True))
+            for user in users
+        ]
+        total = sum(len(ids) for ids in per_user)
+        self.stdout.write(
+            f"Wysyłanie {total} faktur ({len(users)} firm równolegle) do {server.base_url}..."
+        )
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(users)) as executor:
+            results = list(executor.map(self._send_all, per_user))
+        elapsed = time.perf_counter() - start
+
+        durations = [d for result in results for d in result[0]]
+        errors = [e for result in results for e in result[1]]
+        ms = [d * 1000 for d in durations]
+
+        self.stdout.write(self.style.SUCCESS(f"Wysłano: {len(durations) - len(errors)}, błędy: {len(errors)}"))
+        self.stdout.write(f"  czas całkowity: {elapsed:.2f} s, {total / elapsed:.1f} faktur/s")
+        if ms:
+            self.stdout.write(
+                f"  opóźnienie: p50 {_percentile(ms, 50):.1f} ms, p95 {_percentile(ms, 95):.1f} ms, "
+                f"max {max(ms):.1f} ms, średnio {statistics.mean(ms):.1f} ms"
+            )
+        self.stdout.write(
+            f"  zapytania do serwera: {server.state.request_count}, "
+            f"wstrzyknięte błędy: {server.state.injected_errors}"
+        )
+        for base_url, stats in transport_stats().items():
+            if base_url == server.base_url:
+                self.stdout.write(
+                    f"  połączenia HTTP: otwarte {stats['connections_opened']}, "
+                    f"ponownie użyte {stats['connections_reused']}"
+                )
+        for message in sorted(set(errors))[:5]:
+            self.stdout.write(self.style.ERROR(f"  ❌ {message}"))
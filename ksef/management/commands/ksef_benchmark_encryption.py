@@ -0,0 +1,54 @@
+# ksef/management/commands/ksef_benchmark_encryption.py
+
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from ksef.encryption import encrypt_payloads
+
+
+class Command(BaseCommand):
+    help = 'Mierzy przepustowość szyfrowania faktur (AES-256-CBC + SHA-256) w MB/s'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            action='append',
+            dest='counts',
+            help='Liczba faktur (można podać wielokrotnie, domyślnie 1000 i 10000)',
+        )
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=8 * 1024,
+            help='Rozmiar jednej faktury w bajtach (domyślnie 8 KiB)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 4,
+            help='Liczba wątków w wariancie równoległym',
+        )
+
+    def handle(self, *args, **options):
+        counts = options['counts'] or [1000, 10000]
+        size = options['size']
+        workers = options['workers']
+        aes_key = os.urandom(32)
+        aes_iv = os.urandom(16)
+
+        for count in counts:
+            payloads = [os.urandom(size) for _ in range(count)]
+            total_mb = count * size / (1024 * 1024)
+            self.stdout.write(f"{count} faktur po {size} B ({total_mb:.1f} MB):")
+
+            for label, max_workers in (("1 wątek", 1), (f"{workers} wątków", workers)):
+                start = time.perf_counter()
+                encrypt_payloads(payloads, aes_key, aes_iv, max_workers=max_workers)
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"  {label:>12}: {elapsed:.3f} s, {total_mb / elapsed:.1f} MB/s, "
+                    f"{count / elapsed:.0f} faktur/s"
+                )
@@ -0,0 +1,46 @@
+# ksef/management/commands/ksef_reconcile.py
+
+from django.core.management.base import BaseCommand
+
+from ksef.reconciliation import (
+    DEFAULT_SESSION_WORKERS,
+    DEFAULT_TENANT_WORKERS,
+    reconcile_ksef_invoices,
+)
+
+
+class Command(BaseCommand):
+    help = 'Uzupełnia numery KSeF, statusy i UPO wysłanych faktur (do uruchamiania z crona)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Ogranicz do użytkownika o podanym ID (można podać wielokrotnie)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=DEFAULT_TENANT_WORKERS,
+            help='Liczba firm uzgadnianych równolegle',
+        )
+        parser.add_argument(
+            '--session-workers',
+            type=int,
+            default=DEFAULT_SESSION_WORKERS,
+            help='Liczba sesji jednej firmy odpytywanych równolegle',
+        )
+
+    def handle(self, *args, **options):
+        result = reconcile_ksef_invoices(
+            user_ids=options['user_ids'],
+            tenant_workers=options['workers'],
+            session_workers=options['session_workers'],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Sprawdzono sesji: {result['sessions']}, zaktualizowano faktur: {result['updated']}"
+            )
+        )
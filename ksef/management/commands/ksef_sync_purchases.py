@@ -0,0 +1,55 @@
+# ksef/management/commands/ksef_sync_purchases.py
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from ksef.purchases import DEFAULT_PAGE_SIZE, sync_purchase_invoices
+from ksef.session_pool import get_session_pool
+
+
+class Command(BaseCommand):
+    help = 'Pobiera z KSeF nowe faktury zakupu (firma jako nabywca) do PurchaseInvoice'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Ogranicz do użytkownika o podanym ID (można podać wielokrotnie)',
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=DEFAULT_PAGE_SIZE,
+            help='Liczba faktur na stronę wyników KSeF (10-250)',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(companyinfo__ksef_token__gt='')
+        if options['user_ids']:
+            users = users.filter(pk__in=options['user_ids'])
+
+        try:
+            for user in users.order_by('pk'):
+                try:
+                    stats = sync_purchase_invoices(user, page_size=options['page_size'])
+                except Exception as e:
+                    self.stderr.write(self.style.ERROR(f"❌ {user.username}: {e}"))
+                    continue
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"{user.username}: pobrano {stats['documents']} faktur, "
+                        f"zapisano {stats['saved']}"
+                    )
+                )
+                if stats['skipped']:
+                    # Znacznik synchronizacji przesunął się za te faktury - trzeba je dodać ręcznie
+                    self.stdout.write(
+                        self.style.WARNING(
+                            f"⚠ {user.username}: pominięto {len(stats['skipped'])} faktur "
+                            f"(brak numeru lub danych sprzedawcy): {', '.join(stats['skipped'])}"
+                        )
+                    )
+        finally:
+            get_session_pool().close_all()
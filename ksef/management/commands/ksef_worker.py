@@ -0,0 +1,76 @@
+# ksef/management/commands/ksef_worker.py
+
+from django.core.management.base import BaseCommand
+
+from ksef.dispatcher import KsefDispatcher
+
+
+class Command(BaseCommand):
+    help = 'Przetwarza kolejkę wysyłek faktur do KSeF wielu firm równolegle (zadania KsefJob)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=None,
+            help='Liczba wątków wysyłających równolegle (domyślnie KSEF_WORKER_THREADS lub 4)',
+        )
+        parser.add_argument(
+            '--per-nip',
+            type=int,
+            default=None,
+            help='Maksymalna liczba równoległych wysyłek dla jednego NIP-u',
+        )
+        parser.add_argument(
+            '--nip-rate',
+            type=float,
+            default=None,
+            help='Limit wysyłek na sekundę dla jednego NIP-u (0 wyłącza limit)',
+        )
+        parser.add_argument(
+            '--nip-burst',
+            type=float,
+            default=None,
+            help='Ile wysyłek jednego NIP-u może pójść naraz ponad limit na sekundę',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Przerwa (w sekundach) gdy kolejka jest pusta',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Przetwórz dostępne zadania i zakończ',
+        )
+
+    def handle(self, *args, **options):
+        dispatcher = KsefDispatcher(
+            threads=options['threads'],
+            per_nip_limit=options['per_nip'],
+            poll_interval=options['poll_interval'],
+            nip_rate=options['nip_rate'],
+            nip_burst=options['nip_burst'],
+        )
+        limiter = dispatcher.rate_limiter
+        rate_info = f", {limiter.rate}/s na NIP" if limiter else ""
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Worker KSeF uruchomiony ({dispatcher.threads} wątków, "
+                f"limit {dispatcher.per_nip_limit} na NIP{rate_info})"
+            )
+        )
+
+        try:
+            result = dispatcher.run(once=options['once'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Zatrzymano workera'))
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Worker KSeF zakończył pracę (zadania: {result['processed']}, "
+                f"błędy workera: {result['errors']})"
+            )
+        )
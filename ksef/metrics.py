@@ -0,0 +1,186 @@
+# ksef/metrics.py
+
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("ksef.http")
+
+# Granice przedziałów histogramu czasu trwania (w sekundach)
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Segmenty ścieżki z cyframi to numery referencyjne / numery KSeF
+_REFERENCE_SEGMENT = re.compile(r"(?<=/)[^/]*\d[^/]*(?=/|$)")
+
+
+def endpoint_label(url, base_url):
+    """
+    Zamienia URL na etykietę punktu końcowego, np. '/sessions/{ref}/invoices'.
+    Adresy spoza API (podpisane adresy do wysyłki części paczki i UPO) to 'storage'.
+    """
+    if not url.startswith(base_url):
+        return "storage"
+    path = url[len(base_url):].split("?", 1)[0] or "/"
+    return _REFERENCE_SEGMENT.sub("{ref}", path)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+
+
+class KsefMetrics:
+    """
+    Liczniki i histogramy wywołań API KSeF przechowywane w pamięci procesu.
+    Dane są udostępniane w formacie Prometheusa przez widok `/metrics`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._durations = {}
+        self._bytes_sent = {}
+        self._bytes_received = {}
+        self._retries = {}
+        self._operations = {}
+
+    def record_call(self, method, endpoint, status, duration, request_bytes=0,
+                    response_bytes=0, retries=0):
+        """Zapisuje jedno wywołanie API i emituje ustrukturyzowany wpis w logu."""
+        call_key = (method, endpoint, str(status))
+        endpoint_key = (method, endpoint)
+        with self._lock:
+            self._calls[call_key] = self._calls.get(call_key, 0) + 1
+            self._durations.setdefault(endpoint_key, _Histogram()).observe(duration)
+            self._bytes_sent[endpoint_key] = self._bytes_sent.get(endpoint_key, 0) + request_bytes
+            self._bytes_received[endpoint_key] = (
+                self._bytes_received.get(endpoint_key, 0) + response_bytes
+            )
+            self._retries[endpoint_key] = self._retries.get(endpoint_key, 0) + retries
+
+        logger.info(
+            f"KSeF {method} {endpoint} -> {status} w {duration * 1000:.1f} ms "
+            f"(wysłano {request_bytes} B, odebrano {response_bytes} B, ponowienia: {retries})",
+            extra={
+                "ksef_method": method,
+                "ksef_endpoint": endpoint,
+                "ksef_status": status,
+                "ksef_duration_ms": round(duration * 1000, 1),
+                "ksef_request_bytes": request_bytes,
+                "ksef_response_bytes": response_bytes,
+                "ksef_retries": retries,
+            },
+        )
+
+    def record_operation(self, operation, duration):
+        """Czas całej operacji złożonej z wielu wywołań (np. uwierzytelnienie)."""
+        with self._lock:
+            self._operations.setdefault(operation, _Histogram()).observe(duration)
+
+    @contextmanager
+    def timed(self, operation):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_operation(operation, time.perf_counter() - start)
+
+    def snapshot(self):
+        """Kopia wszystkich liczników (np. do wyświetlenia w panelu)."""
+        with self._lock:
+            return {
+                "calls": dict(self._calls),
+                "durations": {
+                    key: {"count": h.count, "sum": h.total, "buckets": list(h.buckets)}
+                    for key, h in self._durations.items()
+                },
+                "bytes_sent": dict(self._bytes_sent),
+                "bytes_received": dict(self._bytes_received),
+                "retries": dict(self._retries),
+                "operations": {
+                    key: {"count": h.count, "sum": h.total, "buckets": list(h.buckets)}
+                    for key, h in self._operations.items()
+                },
+            }
+
+    def reset(self):
+        with self._lock:
+            self.__init__()
+
+    def render_prometheus(self):
+        """Tekstowy format ekspozycji Prometheusa."""
+        data = self.snapshot()
+        lines = []
+
+        def labels(**values):
+            inner = ",".join(f'{name}="{_escape(value)}"' for name, value in values.items())
+            return "{" + inner + "}"
+
+        def histogram(name, help_text, series):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for label_values, h in series:
+                for bound, count in zip(DURATION_BUCKETS, h["buckets"]):
+                    lines.append(f"{name}_bucket{labels(**label_values, le=bound)} {count}")
+                lines.append(f"{name}_bucket{labels(**label_values, le='+Inf')} {h['count']}")
+                lines.append(f"{name}_sum{labels(**label_values)} {h['sum']:.6f}")
+                lines.append(f"{name}_count{labels(**label_values)} {h['count']}")
+
+        def counter(name, help_text, series):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for label_values, value in series:
+                lines.append(f"{name}{labels(**label_values)} {value}")
+
+        counter(
+            "ksef_api_requests_total",
+            "Liczba wywołań API KSeF",
+            [
+                ({"method": m, "endpoint": e, "status": s}, v)
+                for (m, e, s), v in sorted(data["calls"].items())
+            ],
+        )
+        histogram(
+            "ksef_api_request_duration_seconds",
+            "Czas wywołań API KSeF",
+            [({"method": m, "endpoint": e}, h) for (m, e), h in sorted(data["durations"].items())],
+        )
+        for name, key, help_text in (
+            ("ksef_api_request_bytes_total", "bytes_sent", "Bajty wysłane do API KSeF"),
+            ("ksef_api_response_bytes_total", "bytes_received", "Bajty odebrane z API KSeF"),
+            ("ksef_api_retries_total", "retries", "Ponowienia wywołań API KSeF"),
+        ):
+            counter(
+                name,
+                help_text,
+                [({"method": m, "endpoint": e}, v) for (m, e), v in sorted(data[key].items())],
+            )
+        histogram(
+            "ksef_operation_duration_seconds",
+            "Czas operacji KSeF (uwierzytelnienie, wysyłka faktury, sesja wsadowa)",
+            [({"operation": op}, h) for op, h in sorted(data["operations"].items())],
+        )
+        return "\n".join(lines) + "\n"
+
+
+_metrics = KsefMetrics()
+
+
+def get_metrics():
+    """Zwraca współdzielony w procesie rejestr metryk KSeF."""
+    return _metrics
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ksef', '0001_initial'),
+        ('ksiegowosc', '0016_invoice_ksef_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KsefJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nip', models.CharField(db_index=True, max_length=20, verbose_name='NIP')),
+                ('mode', models.CharField(choices=[('online', 'Sesja interaktywna'), ('batch', 'Sesja wsadowa')], default='online', max_length=10, verbose_name='Tryb')),
+                ('batch_id', models.UUIDField(blank=True, db_index=True, help_text='Zadania z tym samym ID są wysyłane razem w jednej sesji wsadowej', null=True, verbose_name='ID paczki')),
+                ('status', models.CharField(choices=[('queued', 'W kolejce'), ('running', 'W trakcie wysyłki'), ('done', 'Zakończone'), ('failed', 'Błąd')], default='queued', max_length=10, verbose_name='Status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Liczba prób')),
+                ('max_attempts', models.PositiveIntegerField(default=5, verbose_name='Maks. liczba prób')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Uruchom po')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Pobrane o')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='Pobrane przez')),
+                ('last_error', models.TextField(blank=True, verbose_name='Ostatni błąd')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ksef_jobs', to='ksiegowosc.invoice', verbose_name='Faktura')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Użytkownik')),
+            ],
+            options={
+                'verbose_name': 'Zadanie KSeF',
+                'verbose_name_plural': 'Kolejka KSeF',
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.DeleteModel(
+            name='Invoice',
+        ),
+        migrations.AddIndex(
+            model_name='ksefjob',
+            index=models.Index(fields=['status', 'run_after'], name='ksef_ksefjo_status_fc4ced_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ksef', '0002_ksefjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ksefjob',
+            name='deadline',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='Ustawowy termin przesłania do KSeF faktury wystawionej offline', null=True, verbose_name='Termin wysyłki'),
+        ),
+        migrations.AddField(
+            model_name='ksefjob',
+            name='payload',
+            field=models.BinaryField(blank=True, help_text='Tryb offline: XML zapisany w chwili wystawienia, wysyłany bez zmian', null=True, verbose_name='XML faktury'),
+        ),
+        migrations.AddField(
+            model_name='ksefjob',
+            name='payload_hash',
+            field=models.CharField(blank=True, help_text='Skrót XML faktury wystawionej w trybie offline', max_length=64, verbose_name='Skrót SHA-256 (Base64)'),
+        ),
+        migrations.AlterField(
+            model_name='ksefjob',
+            name='mode',
+            field=models.CharField(choices=[('online', 'Sesja interaktywna'), ('batch', 'Sesja wsadowa'), ('offline', 'Tryb offline')], default='online', max_length=10, verbose_name='Tryb'),
+        ),
+    ]
@@ -0,0 +1,690 @@
+# ksef/mock_server.py
+
+import base64
+import hashlib
+import io
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, padding as sym_padding, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.x509.oid import NameOID
+
+from .certificates import SYMMETRIC_KEY_ENCRYPTION, TOKEN_ENCRYPTION
+
+logger = logging.getLogger(__name__)
+
+_OAEP = padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _iso(value):
+    return value.isoformat().replace("+00:00", "Z")
+
+
+def _parse_iso(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _reference(kind):
+    """Numer referencyjny w formacie zbliżonym do KSeF, np. 20250625-SO-2C3E6C8000-B675CF5D68-07."""
+    token = uuid.uuid4().hex.upper()
+    return f"{_now():%Y%m%d}-{kind}-{token[:10]}-{token[10:20]}-{token[20:22]}"
+
+
+def _sha256_b64(data):
+    return base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+def _aes_decrypt(data, key, iv):
+    decryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).decryptor()
+    padded = decryptor.update(data) + decryptor.finalize()
+    unpadder = sym_padding.PKCS7(128).unpadder()
+    return unpadder.update(padded) + unpadder.finalize()
+
+
+def _self_signed_certificate():
+    """Klucz RSA i certyfikat, którym klient szyfruje token oraz klucz AES."""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "KSeF mock")])
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(private_key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(_now() - timedelta(days=1))
+        .not_valid_after(_now() + timedelta(days=365))
+        .sign(private_key, hashes.SHA256())
+    )
+    return private_key, certificate
+
+
+class _MockState:
+    """Stan serwera: tokeny, sesje i przyjęte faktury."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.challenges = {}
+        self.auth_operations = {}
+        # accessToken / refreshToken -> NIP kontekstu
+        self.access_tokens = {}
+        self.refresh_tokens = {}
+        self.sessions = {}
+        # Faktury, w których firma jest nabywcą (do /invoices/query/metadata)
+        self.received_invoices = []
+        self.request_count = 0
+        self.injected_errors = 0
+
+
+class MockKsefServer:
+    """
+    Lokalny odpowiednik API KSeF 2.0 (zgodny z ksef/openapi.json w zakresie
+    potrzebnym klientowi): uwierzytelnianie tokenem KSeF, sesje online
+    i wsadowe, wysyłka faktur, statusy oraz UPO.
+
+    Serwer odszyfrowuje przesłane faktury i sprawdza skróty, więc wykrywa
+    błędy szyfrowania po stronie klienta. `latency` (s) opóźnia każdą
+    odpowiedź, `error_rate` (0-1) losowo zwraca 503 z Retry-After, a
+    `auth_pending_polls` określa, ile razy status uwierzytelnienia zwróci 100.
+
+        with MockKsefServer(latency=0.02) as server:
+            with override_settings(KSEF_BASE_URL=server.base_url):
+                ...
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0,
+                 auth_pending_polls=1, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.auth_pending_polls = auth_pending_polls
+        self.random = random.Random(seed)
+        self.state = _MockState()
+        self.private_key, self.certificate = _self_signed_certificate()
+
+        handler = type("MockKsefHandler", (_MockKsefHandler,), {"mock": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v2"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"✓ Serwer testowy KSeF nasłuchuje na {self.base_url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def public_key_certificates(self):
+        der = self.certificate.public_bytes(serialization.Encoding.DER)
+        return [
+            {
+                "certificate": base64.b64encode(der).decode(),
+                "validFrom": _iso(self.certificate.not_valid_before_utc),
+                "validTo": _iso(self.certificate.not_valid_after_utc),
+                "usage": [TOKEN_ENCRYPTION, SYMMETRIC_KEY_ENCRYPTION],
+            }
+        ]
+
+    def accepted_invoices(self):
+        """Wszystkie faktury przyjęte przez serwer (do asercji w testach)."""
+        with self.state.lock:
+            return [
+                invoice for session in self.state.sessions.values() for invoice in session["invoices"]
+            ]
+
+    def add_received_invoice(self, buyer_nip, xml_bytes, seller_nip, invoice_number,
+                             issue_date=None, stored_at=None):
+        """Dodaje fakturę zakupu widoczną dla nabywcy `buyer_nip`."""
+        stored_at = stored_at or _now()
+        ksef_number = f"{seller_nip}-{stored_at:%Y%m%d}-{uuid.uuid4().hex[:12].upper()}-{self.random.randint(10, 99)}"
+        with self.state.lock:
+            self.state.received_invoices.append({
+                "buyer_nip": buyer_nip,
+                "xml": xml_bytes,
+                "metadata": {
+                    "ksefNumber": ksef_number,
+                    "invoiceNumber": invoice_number,
+                    "issueDate": (issue_date or stored_at.date()).isoformat(),
+                    "invoicingDate": _iso(stored_at),
+                    "acquisitionDate": _iso(stored_at),
+                    "permanentStorageDate": _iso(stored_at),
+                    "seller": {"nip": seller_nip},
+                    "buyer": {"identifier": {"type": "Nip", "value": buyer_nip}},
+                    "invoiceHash": _sha256_b64(xml_bytes),
+                    "currency": "PLN",
+                },
+            })
+            self.state.received_invoices.sort(key=lambda i: i["metadata"]["permanentStorageDate"])
+        return ksef_number
+
+    def _decrypt_key(self, encryption):
+        key = self.private_key.decrypt(base64.b64decode(encryption["encryptedSymmetricKey"]), _OAEP)
+        return key, base64.b64decode(encryption["initializationVector"])
+
+    def _accept_invoice(self, session, xml_bytes, file_name=None, offline_mode=False):
+        ksef_number = f"{session['nip']}-{_now():%Y%m%d}-{uuid.uuid4().hex[:12].upper()}-{self.random.randint(10, 99)}"
+        invoice = {
+            "ordinalNumber": len(session["invoices"]) + 1,
+            "referenceNumber": _reference("EE"),
+            "invoiceHash": _sha256_b64(xml_bytes),
+            "invoiceFileName": file_name,
+            "offlineMode": offline_mode,
+            "ksefNumber": ksef_number,
+            "invoicingDate": _iso(_now()),
+            "acquisitionDate": _iso(_now()),
+            "status": {"code": 200, "description": "Sukces"},
+        }
+        session["invoices"].append(invoice)
+        return invoice
+
+    def upo_xml(self, session_reference):
+        session = self.state.sessions[session_reference]
+        documents = "".join(
+            f"<Dokument><NipSprzedawcy>{session['nip']}</NipSprzedawcy>"
+            f"<NumerKSeFDokumentu>{invoice['ksefNumber']}</NumerKSeFDokumentu>"
+            f"<SkrotDokumentu>{invoice['invoiceHash']}</SkrotDokumentu></Dokument>"
+            for invoice in session["invoices"]
+        )
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Potwierdzenie xmlns="http://upo.schematy.mf.gov.pl/KSeF/v4-2">'
+            f"<NumerReferencyjnySesji>{session_reference}</NumerReferencyjnySesji>"
+            f"{documents}</Potwierdzenie>"
+        ).encode("utf-8")
+
+
+class _MockKsefHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Nagłówki i treść idą osobnymi zapisami - bez TCP_NODELAY każda odpowiedź
+    # czekałaby ~40 ms na opóźnione potwierdzenie (Nagle + delayed ACK)
+    disable_nagle_algorithm = True
+    mock = None
+
+    # --- infrastruktura ---
+
+    def log_message(self, format, *args):
+        logger.debug("mock KSeF: " + format % args)
+
+    def _send(self, status, body=None, content_type="application/json", headers=None):
+        if body is None:
+            payload = b""
+        elif isinstance(body, bytes):
+            payload = body
+        else:
+            payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        if payload:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status, description):
+        self._send(status, {
+            "exception": {
+                "exceptionDetailList": [{"exceptionCode": status, "description": description}],
+                "referenceNumber": _reference("ER"),
+            }
+        })
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _json(self):
+        body = self._body()
+        return json.loads(body) if body else {}
+
+    def _bearer(self):
+        header = self.headers.get("Authorization", "")
+        return header[7:] if header.startswith("Bearer ") else None
+
+    def _require_access_token(self):
+        if self._bearer() not in self.mock.state.access_tokens:
+            self._error(401, "Brak lub nieprawidłowy accessToken.")
+            return False
+        return True
+
+    def _before_request(self):
+        """Opóźnienie i wstrzykiwanie błędów. Zwraca False, gdy odpowiedź już wysłano."""
+        with self.mock.state.lock:
+            self.mock.state.request_count += 1
+            inject = self.mock.error_rate and self.mock.random.random() < self.mock.error_rate
+            if inject:
+                self.mock.state.injected_errors += 1
+        if self.mock.latency:
+            time.sleep(self.mock.latency)
+        if inject:
+            self._body()
+            self._send(503, {"title": "Service Unavailable"}, headers={"Retry-After": "0"})
+            return False
+        return True
+
+    def _dispatch(self, method):
+        if not self._before_request():
+            return
+        parsed = urlparse(self.path)
+        path = parsed.path
+        if path.startswith("/v2"):
+            path = path[3:]
+        self.query = parse_qs(parsed.query)
+        for pattern, route_method, handler_name in _ROUTES:
+            match = pattern.fullmatch(path)
+            if match and route_method == method:
+                try:
+                    getattr(self, handler_name)(*match.groups())
+                except Exception as e:
+                    logger.exception("mock KSeF: błąd obsługi zapytania")
+                    self._error(500, str(e))
+                return
+        self._error(404, f"Nieznany adres {method} {path}")
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    # --- bezpieczeństwo i uwierzytelnianie ---
+
+    def public_key_certificates(self):
+        self._send(200, self.mock.public_key_certificates())
+
+    def auth_challenge(self):
+        data = self._json()
+        now = _now()
+        challenge = _reference("CR")
+        timestamp_ms = int(now.timestamp() * 1000)
+        with self.mock.state.lock:
+            self.mock.state.challenges[challenge] = {
+                "timestamp_ms": timestamp_ms,
+                "nip": data.get("contextIdentifier", {}).get("value"),
+            }
+        self._send(200, {"challenge": challenge, "timestamp": _iso(now), "timestampMs": timestamp_ms})
+
+    def auth_ksef_token(self):
+        data = self._json()
+        with self.mock.state.lock:
+            challenge = self.mock.state.challenges.pop(data.get("challenge"), None)
+        if challenge is None:
+            return self._error(400, "Nieznany challenge.")
+        try:
+            decrypted = self.mock.private_key.decrypt(
+                base64.b64decode(data["encryptedToken"]), _OAEP
+            ).decode()
+        except Exception:
+            return self._error(400, "Nie udało się odszyfrować tokena.")
+        token, _, timestamp = decrypted.rpartition("|")
+        if not token or timestamp != str(challenge["timestamp_ms"]):
+            return self._error(400, "Nieprawidłowy format zaszyfrowanego tokena.")
+
+        reference = _reference("AU")
+        auth_token = uuid.uuid4().hex
+        with self.mock.state.lock:
+            self.mock.state.auth_operations[reference] = {
+                "auth_token": auth_token,
+                "nip": data.get("contextIdentifier", {}).get("value"),
+                "polls": 0,
+                "redeemed": False,
+            }
+        self._send(202, {
+            "referenceNumber": reference,
+            "authenticationToken": {"token": auth_token, "validUntil": _iso(_now() + timedelta(minutes=15))},
+        })
+
+    def _auth_operation(self):
+        token = self._bearer()
+        with self.mock.state.lock:
+            for reference, operation in self.mock.state.auth_operations.items():
+                if operation["auth_token"] == token:
+                    return reference, operation
+        return None, None
+
+    def auth_status(self, reference):
+        with self.mock.state.lock:
+            operation = self.mock.state.auth_operations.get(reference)
+            if operation is None or operation["auth_token"] != self._bearer():
+                operation = None
+            else:
+                operation["polls"] += 1
+                pending = operation["polls"] <= self.mock.auth_pending_polls
+        if operation is None:
+            return self._error(401, "Nieprawidłowy authenticationToken.")
+        status = {"code": 100, "description": "Uwierzytelnianie w toku"} if pending else {
+            "code": 200, "description": "Uwierzytelnianie zakończone sukcesem"
+        }
+        self._send(200, {
+            "startDate": _iso(_now()),
+            "authenticationMethod": "Token",
+            "status": status,
+        })
+
+    def _issue_tokens(self, nip):
+        access_token = uuid.uuid4().hex
+        refresh_token = uuid.uuid4().hex
+        with self.mock.state.lock:
+            self.mock.state.access_tokens[access_token] = nip
+            self.mock.state.refresh_tokens[refresh_token] = nip
+        return {
+            "accessToken": {"token": access_token, "validUntil": _iso(_now() + timedelta(minutes=15))},
+            "refreshToken": {"token": refresh_token, "validUntil": _iso(_now() + timedelta(days=7))},
+        }
+
+    def auth_redeem(self):
+        reference, operation = self._auth_operation()
+        if operation is None or operation["polls"] <= self.mock.auth_pending_polls or operation["redeemed"]:
+            return self._error(400, "Uwierzytelnianie niezakończone lub token już wykorzystany.")
+        operation["redeemed"] = True
+        self._send(200, self._issue_tokens(operation["nip"]))
+
+    def auth_refresh(self):
+        nip = self.mock.state.refresh_tokens.get(self._bearer())
+        if nip is None:
+            return self._error(401, "Brak lub nieprawidłowy refreshToken.")
+        access_token = uuid.uuid4().hex
+        with self.mock.state.lock:
+            self.mock.state.access_tokens[access_token] = nip
+        self._send(200, {
+            "accessToken": {"token": access_token, "validUntil": _iso(_now() + timedelta(minutes=15))},
+        })
+
+    def permissions(self):
+        if not self._require_access_token():
+            return
+        self._json()
+        self._send(200, {"permissions": [{"permissionScope": "InvoiceWrite"}], "hasMore": False})
+
+    # --- sesje ---
+
+    def _new_session(self, kind, data, **extra):
+        reference = _reference(kind)
+        key, iv = self.mock._decrypt_key(data["encryption"])
+        session = {
+            "kind": kind,
+            "nip": self.mock.state.access_tokens.get(self._bearer()) or "0000000000",
+            "key": key,
+            "iv": iv,
+            "open": True,
+            "invoices": [],
+            "created": _now(),
+            "upo_reference": _reference("UP"),
+            **extra,
+        }
+        with self.mock.state.lock:
+            self.mock.state.sessions[reference] = session
+        return reference, session
+
+    def _session(self, reference):
+        with self.mock.state.lock:
+            session = self.mock.state.sessions.get(reference)
+        if session is None:
+            self._error(404, f"Sesja {reference} nie istnieje.")
+        return session
+
+    def open_online(self):
+        if not self._require_access_token():
+            return
+        data = self._json()
+        try:
+            reference, _ = self._new_session("SO", data)
+        except Exception:
+            return self._error(400, "Nie udało się odszyfrować klucza symetrycznego.")
+        self._send(201, {"referenceNumber": reference, "validUntil": _iso(_now() + timedelta(hours=12))})
+
+    def send_online_invoice(self, reference):
+        if not self._require_access_token():
+            return
+        data = self._json()
+        session = self._session(reference)
+        if session is None:
+            return
+        if not session["open"]:
+            return self._error(400, "Sesja jest zamknięta.")
+
+        encrypted = base64.b64decode(data["encryptedInvoiceContent"])
+        if _sha256_b64(encrypted) != data["encryptedInvoiceHash"] or len(encrypted) != data["encryptedInvoiceSize"]:
+            return self._error(400, "Skrót lub rozmiar zaszyfrowanej faktury się nie zgadza.")
+        try:
+            xml_bytes = _aes_decrypt(encrypted, session["key"], session["iv"])
+        except Exception:
+            return self._error(400, "Nie udało się odszyfrować faktury.")
+        if _sha256_b64(xml_bytes) != data["invoiceHash"] or len(xml_bytes) != data["invoiceSize"]:
+            return self._error(400, "Skrót lub rozmiar faktury się nie zgadza.")
+
+        with self.mock.state.lock:
+            invoice = self.mock._accept_invoice(
+                session, xml_bytes, offline_mode=bool(data.get("offlineMode"))
+            )
+        self._send(202, {"referenceNumber": invoice["referenceNumber"]})
+
+    def close_online(self, reference):
+        if not self._require_access_token():
+            return
+        session = self._session(reference)
+        if session is None:
+            return
+        session["open"] = False
+        self._send(204)
+
+    def open_batch(self):
+        if not self._require_access_token():
+            return
+        data = self._json()
+        parts = data["batchFile"]["fileParts"]
+        try:
+            reference, session = self._new_session(
+                "SB", data, parts={}, expected_parts=parts, file_hash=data["batchFile"]["fileHash"]
+            )
+        except Exception:
+            return self._error(400, "Nie udało się odszyfrować klucza symetrycznego.")
+        host, port = self.server.server_address[:2]
+        self._send(201, {
+            "referenceNumber": reference,
+            "partUploadRequests": [
+                {
+                    "ordinalNumber": part["ordinalNumber"],
+                    "method": "PUT",
+                    "url": f"http://{host}:{port}/storage/{reference}/{part['ordinalNumber']}",
+                    "headers": {"x-ms-blob-type": "BlockBlob"},
+                }
+                for part in parts
+            ],
+        })
+
+    def upload_part(self, reference, ordinal):
+        session = self._session(reference)
+        if session is None:
+            return
+        session["parts"][int(ordinal)] = self._body()
+        self._send(201)
+
+    def close_batch(self, reference):
+        if not self._require_access_token():
+            return
+        session = self._session(reference)
+        if session is None:
+            return
+        session["open"] = False
+
+        encrypted_zip = b""
+        for part in sorted(session["expected_parts"], key=lambda p: p["ordinalNumber"]):
+            data = session["parts"].get(part["ordinalNumber"])
+            if data is None or _sha256_b64(data) != part["fileHash"]:
+                session["status"] = {"code": 405, "description": "Błąd weryfikacji poprawności dostarczonych elementów paczki"}
+                return self._send(204)
+            encrypted_zip += _aes_decrypt(data, session["key"], session["iv"])
+        if _sha256_b64(encrypted_zip) != session["file_hash"]:
+            session["status"] = {"code": 405, "description": "Błąd weryfikacji poprawności dostarczonych elementów paczki"}
+            return self._send(204)
+
+        with zipfile.ZipFile(io.BytesIO(encrypted_zip)) as archive:
+            with self.mock.state.lock:
+                for name in archive.namelist():
+                    self.mock._accept_invoice(session, archive.read(name), file_name=name)
+        self._send(204)
+
+    # --- statusy i UPO ---
+
+    def session_status(self, reference):
+        session = self._session(reference)
+        if session is None or not self._require_access_token():
+            return
+        if "status" in session:
+            status = session["status"]
+        elif session["open"]:
+            status = {"code": 100, "description": "Sesja otwarta"}
+        else:
+            status = {"code": 200, "description": "Sesja przetworzona pomyślnie"}
+
+        body = {
+            "status": status,
+            "dateCreated": _iso(session["created"]),
+            "dateUpdated": _iso(_now()),
+            "invoiceCount": len(session["invoices"]),
+            "successfulInvoiceCount": len(session["invoices"]),
+            "failedInvoiceCount": 0,
+        }
+        if status["code"] == 200:
+            host, port = self.server.server_address[:2]
+            body["upo"] = {"pages": [{
+                "referenceNumber": session["upo_reference"],
+                "downloadUrl": f"http://{host}:{port}/storage/upo/{reference}",
+                "downloadUrlExpirationDate": _iso(_now() + timedelta(hours=1)),
+            }]}
+        self._send(200, body)
+
+    def session_invoices(self, reference):
+        session = self._session(reference)
+        if session is None or not self._require_access_token():
+            return
+        page_size = int(self.query.get("pageSize", ["10"])[0])
+        offset = int(self.headers.get("x-continuation-token") or 0)
+        invoices = session["invoices"][offset:offset + page_size]
+        next_offset = offset + page_size
+        self._send(200, {
+            "continuationToken": str(next_offset) if next_offset < len(session["invoices"]) else None,
+            "invoices": invoices,
+        })
+
+    def session_invoice(self, reference, invoice_reference):
+        session = self._session(reference)
+        if session is None or not self._require_access_token():
+            return
+        for invoice in session["invoices"]:
+            if invoice["referenceNumber"] == invoice_reference:
+                return self._send(200, invoice)
+        self._error(404, f"Faktura {invoice_reference} nie istnieje.")
+
+    def session_upo(self, reference, upo_reference=None):
+        session = self._session(reference)
+        if session is None:
+            return
+        if upo_reference is not None and not self._require_access_token():
+            return
+        xml_bytes = self.mock.upo_xml(reference)
+        self._send(200, xml_bytes, content_type="application/xml", headers={
+            "x-ms-meta-hash": _sha256_b64(xml_bytes),
+        })
+
+    # --- pobieranie faktur ---
+
+    def query_metadata(self):
+        if not self._require_access_token():
+            return
+        nip = self.mock.state.access_tokens.get(self._bearer())
+        filters = self._json()
+        if filters.get("subjectType") != "Subject2":
+            return self._error(400, "Serwer testowy obsługuje tylko subjectType=Subject2.")
+        date_range = filters["dateRange"]
+        date_from = _parse_iso(date_range["from"])
+        date_to = _parse_iso(date_range["to"]) if date_range.get("to") else _now()
+        page_size = int(self.query.get("pageSize", ["10"])[0])
+        page_offset = int(self.query.get("pageOffset", ["0"])[0])
+
+        with self.mock.state.lock:
+            matching = [
+                invoice["metadata"]
+                for invoice in self.mock.state.received_invoices
+                if invoice["buyer_nip"] == nip
+                and date_from <= _parse_iso(invoice["metadata"]["permanentStorageDate"]) <= date_to
+            ]
+        start = page_offset * page_size
+        self._send(200, {
+            "hasMore": start + page_size < len(matching),
+            "isTruncated": False,
+            "permanentStorageHwmDate": _iso(min(date_to, _now())),
+            "invoices": matching[start:start + page_size],
+        })
+
+    def invoice_by_ksef_number(self, ksef_number):
+        if not self._require_access_token():
+            return
+        nip = self.mock.state.access_tokens.get(self._bearer())
+        with self.mock.state.lock:
+            for invoice in self.mock.state.received_invoices:
+                if invoice["metadata"]["ksefNumber"] == ksef_number and invoice["buyer_nip"] == nip:
+                    return self._send(200, invoice["xml"], content_type="application/xml")
+        self._error(404, f"Faktura {ksef_number} nie istnieje.")
+
+
+_REF = r"([A-Za-z0-9-]+)"
+_ROUTES = [
+    (re.compile(pattern), method, handler)
+    for pattern, method, handler in [
+        (r"/security/public-key-certificates", "GET", "public_key_certificates"),
+        (r"/auth/challenge", "POST", "auth_challenge"),
+        (r"/auth/ksef-token", "POST", "auth_ksef_token"),
+        (r"/auth/token/redeem", "POST", "auth_redeem"),
+        (r"/auth/token/refresh", "POST", "auth_refresh"),
+        (rf"/auth/{_REF}", "GET", "auth_status"),
+        (r"/permissions/query/personal/grants", "POST", "permissions"),
+        (r"/sessions/online", "POST", "open_online"),
+        (rf"/sessions/online/{_REF}/invoices", "POST", "send_online_invoice"),
+        (rf"/sessions/online/{_REF}/close", "POST", "close_online"),
+        (r"/sessions/batch", "POST", "open_batch"),
+        (rf"/sessions/batch/{_REF}/close", "POST", "close_batch"),
+        (rf"/sessions/{_REF}", "GET", "session_status"),
+        (rf"/sessions/{_REF}/invoices", "GET", "session_invoices"),
+        (rf"/sessions/{_REF}/invoices/{_REF}", "GET", "session_invoice"),
+        (rf"/sessions/{_REF}/upo/{_REF}", "GET", "session_upo"),
+        (rf"/storage/upo/{_REF}", "GET", "session_upo"),
+        (rf"/storage/{_REF}/(\d+)", "PUT", "upload_part"),
+        (r"/invoices/query/metadata", "POST", "query_metadata"),
+        (rf"/invoices/ksef/{_REF}", "GET", "invoice_by_ksef_number"),
+    ]
+]
@@ -0,0 +1,82 @@
+# ksef/models.py
+
+from django.contrib.auth.models import User
+from django.db import models
+from django.utils import timezone
+
+
+class KsefJob(models.Model):
+    """
+    Zadanie wysyłki faktury do KSeF w kolejce przechowywanej w bazie danych.
+    Zadania przetwarza polecenie `manage.py ksef_worker`.
+    """
+
+    STATUS_CHOICES = [
+        ("queued", "W kolejce"),
+        ("running", "W trakcie wysyłki"),
+        ("done", "Zakończone"),
+        ("failed", "Błąd"),
+    ]
+    MODE_CHOICES = [
+        ("online", "Sesja interaktywna"),
+        ("batch", "Sesja wsadowa"),
+        ("offline", "Tryb offline"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Użytkownik")
+    invoice = models.ForeignKey(
+        "ksiegowosc.Invoice",
+        on_delete=models.CASCADE,
+        related_name="ksef_jobs",
+        verbose_name="Faktura",
+    )
+    nip = models.CharField(max_length=20, db_index=True, verbose_name="NIP")
+    mode = models.CharField(
+        max_length=10, choices=MODE_CHOICES, default="online", verbose_name="Tryb"
+    )
+    batch_id = models.UUIDField(
+        blank=True,
+        null=True,
+        db_index=True,
+        verbose_name="ID paczki",
+        help_text="Zadania z tym samym ID są wysyłane razem w jednej sesji wsadowej",
+    )
+    payload = models.BinaryField(
+        blank=True,
+        null=True,
+        verbose_name="XML faktury",
+        help_text="Tryb offline: XML zapisany w chwili wystawienia, wysyłany bez zmian",
+    )
+    payload_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name="Skrót SHA-256 (Base64)",
+        help_text="Skrót XML faktury wystawionej w trybie offline",
+    )
+    deadline = models.DateTimeField(
+        blank=True,
+        null=True,
+        db_index=True,
+        verbose_name="Termin wysyłki",
+        help_text="Ustawowy termin przesłania do KSeF faktury wystawionej offline",
+    )
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default="queued", verbose_name="Status"
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Liczba prób")
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name="Maks. liczba prób")
+    run_after = models.DateTimeField(default=timezone.now, verbose_name="Uruchom po")
+    locked_at = models.DateTimeField(blank=True, null=True, verbose_name="Pobrane o")
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="Pobrane przez")
+    last_error = models.TextField(blank=True, verbose_name="Ostatni błąd")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Zadanie KSeF"
+        verbose_name_plural = "Kolejka KSeF"
+        ordering = ["created_at"]
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+    def __str__(self):
+        return f"KSeF {self.get_mode_display()} - faktura {self.invoice_id} ({self.status})"
@@ -0,0 +1,54 @@
+# ksef/polling.py
+
+import random
+import time
+
+# Pierwsze zapytanie o status powtarzamy szybko - KSeF zwykle odpowiada w ułamku sekundy
+DEFAULT_INITIAL_DELAY = 0.15
+DEFAULT_MAX_DELAY = 5.0
+DEFAULT_FACTOR = 2.0
+DEFAULT_JITTER = 0.2
+
+
+class PollingTimeout(Exception):
+    """Operacja w KSeF nie zakończyła się w zadanym czasie."""
+
+
+def backoff_delays(
+    initial=DEFAULT_INITIAL_DELAY,
+    max_delay=DEFAULT_MAX_DELAY,
+    factor=DEFAULT_FACTOR,
+    jitter=DEFAULT_JITTER,
+):
+    """
+    Nieskończony ciąg opóźnień rosnących wykładniczo (0.15 s, 0.3 s, 0.6 s...),
+    ograniczonych do `max_delay`, z losowym rozrzutem +/- `jitter`.
+    """
+    delay = initial
+    while True:
+        yield delay * random.uniform(1 - jitter, 1 + jitter)
+        delay = min(delay * factor, max_delay)
+
+
+def poll(request, check, timeout=60, description="operacji", **backoff):
+    """
+    Powtarza `request()` aż `check(response)` zwróci wartość różną od None.
+
+    `request` zwraca obiekt `requests.Response`. Odpowiedzi 429/503 ponawia
+    już transport HTTP (z uwzględnieniem Retry-After), więc tutaj są
+    zgłaszane jako błąd, a czekamy tylko na zakończenie operacji w KSeF.
+    `check` może rzucić wyjątek, aby przerwać oczekiwanie (np. status błędu).
+    """
+    delays = backoff_delays(**backoff)
+    deadline = time.monotonic() + timeout
+    while True:
+        response = request()
+        response.raise_for_status()
+        result = check(response)
+        if result is not None:
+            return result
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise PollingTimeout(f"Przekroczono czas oczekiwania na zakończenie {description}")
+        time.sleep(min(next(delays), remaining))
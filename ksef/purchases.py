@@ -0,0 +1,393 @@
+# ksef/purchases.py
+
+import logging
+import re
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from lxml import etree
+
+from ksiegowosc.models import CompanyInfo, Contractor, PurchaseInvoice, PurchaseInvoiceItem
+from ksiegowosc.rollups import month_of, refresh_rollups
+
+from .reconciliation import _localname
+
+logger = logging.getLogger(__name__)
+
+# KSeF pozwala pytać o najwyżej 3 miesiące naraz
+QUERY_WINDOW = timedelta(days=90)
+DEFAULT_PAGE_SIZE = 100
+# Zakres pierwszej synchronizacji, gdy firma nie ma jeszcze znacznika
+DEFAULT_INITIAL_DAYS = 90
+
+PAYMENT_METHODS = {"1": "cash", "2": "card", "6": "transfer"}
+# Pola zapisywane przy ponownym pobraniu tej samej faktury (kategoria, płatność
+# i opis pozostają takie, jak ustawił je użytkownik)
+UPSERT_FIELDS = [
+    "issue_date",
+    "receipt_date",
+    "service_date",
+    "payment_due_date",
+    "net_amount",
+    "vat_amount",
+    "total_amount",
+    "ksef_number",
+    "updated_at",
+]
+
+_ZIP_CITY = re.compile(r"^\s*(\d{2}-\d{3})\s+(.+)$")
+_CENT = Decimal("0.01")
+
+
+def _decimal(value, default="0"):
+    try:
+        return Decimal((value or default).strip())
+    except InvalidOperation:
+        return Decimal(default)
+
+
+def _date(value):
+    return date.fromisoformat(value.strip()[:10]) if value else None
+
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00")) if value else None
+
+
+def _vat_rate(value):
+    """Stawka z P_12 FA(3) w postaci używanej przez `VAT_RATES`."""
+    value = (value or "").strip().lower()
+    if value in ("23", "22"):
+        return "23"
+    if value in ("8", "7"):
+        return "8"
+    if value == "5":
+        return "5"
+    if value.startswith("0"):
+        return "0"
+    if value == "zw":
+        return "zw"
+    return "np"
+
+
+def _children(element):
+    return {_localname(child): (child.text or "").strip() for child in element}
+
+
+def _party(element):
+    """Dane sprzedawcy z elementu Podmiot1 (NIP, nazwa i adres)."""
+    party = {"nip": "", "name": "", "street": "", "zip_code": "", "city": ""}
+    for child in element.iter():
+        name = _localname(child)
+        text = (child.text or "").strip()
+        if name == "NIP":
+            party["nip"] = "".join(filter(str.isdigit, text))
+        elif name == "Nazwa":
+            party["name"] = text
+        elif name in ("AdresL1", "Ulica"):
+            party["street"] = text
+        elif name == "AdresL2":
+            match = _ZIP_CITY.match(text)
+            if match:
+                party["zip_code"], party["city"] = match.groups()
+            else:
+                party["city"] = text
+        elif name == "KodPocztowy":
+            party["zip_code"] = text
+        elif name == "Miejscowosc":
+            party["city"] = text
+    return party
+
+
+def parse_fa_invoice(source):
+    """
+    Czyta fakturę FA(3) strumieniowo (`lxml.etree.iterparse`) z pliku lub
+    strumienia i zwraca słownik z nagłówkiem, danymi sprzedawcy i pozycjami.
+    Przetworzone gałęzie drzewa są zwalniane na bieżąco.
+    """
+    invoice = {"seller": None, "items": [], "net": Decimal("0"), "vat": Decimal("0")}
+    header = {}
+    # Dokument pochodzi z sieci - bez rozwijania encji i pobierania zasobów zewnętrznych
+    for _event, element in etree.iterparse(
+        source, events=("end",), resolve_entities=False, no_network=True
+    ):
+        name = _localname(element)
+        parent = element.getparent()
+        parent_name = _localname(parent) if parent is not None else None
+
+        if name == "Podmiot1":
+            invoice["seller"] = _party(element)
+            element.clear()
+        elif name == "FaWiersz":
+            invoice["items"].append(_children(element))
+            element.clear()
+        elif name == "Termin" and parent_name == "TerminPlatnosci":
+            header["due_date"] = (element.text or "").strip()
+        elif name == "FormaPlatnosci":
+            header["payment_form"] = (element.text or "").strip()
+        elif parent_name == "Fa":
+            text = (element.text or "").strip()
+            header[name] = text
+            # Sumy netto (P_13_x) i VAT (P_14_x) dla stawek - bez przeliczeń walutowych (…W)
+            if name.startswith("P_13_"):
+                invoice["net"] += _decimal(text)
+            elif name.startswith("P_14_") and not name.endswith("W"):
+                invoice["vat"] += _decimal(text)
+
+    invoice["number"] = header.get("P_2", "")
+    invoice["issue_date"] = _date(header.get("P_1"))
+    invoice["service_date"] = _date(header.get("P_6")) or invoice["issue_date"]
+    invoice["total"] = _decimal(header.get("P_15"), default=str(invoice["net"] + invoice["vat"]))
+    invoice["due_date"] = _date(header.get("due_date"))
+    invoice["payment_method"] = PAYMENT_METHODS.get(header.get("payment_form"), "transfer")
+    return invoice
+
+
+def _item_values(row):
+    quantity = _decimal(row.get("P_8B"), default="1")
+    unit_price = _decimal(row.get("P_9A"))
+    net_value = _decimal(row.get("P_11"), default=str(quantity * unit_price)).quantize(_CENT)
+    vat_rate = _vat_rate(row.get("P_12"))
+    if vat_rate in ("zw", "np"):
+        vat_value = Decimal("0.00")
+    else:
+        vat_value = (net_value * Decimal(vat_rate) / 100).quantize(_CENT)
+    return {
+        "name": (row.get("P_7") or "Pozycja faktury")[:255],
+        "unit": (row.get("P_8A") or "szt.")[:10],
+        "quantity": quantity,
+        "unit_price_net": unit_price.quantize(_CENT),
+        "vat_rate": vat_rate,
+        "net_value": net_value,
+        "vat_value": vat_value,
+        "gross_value": net_value + vat_value,
+    }
+
+
+def _supplier_key(seller):
+    """
+    Klucz dostawcy: NIP albo - dla sprzedawcy bez polskiego NIP-u
+    (np. zagranicznego) - nazwa. None, gdy brak obu.
+    """
+    if seller is None:
+        return None
+    if seller["nip"]:
+        return ("nip", seller["nip"])
+    if seller["name"]:
+        return ("name", seller["name"][:255])
+    return None
+
+
+def _find_suppliers(user, keys):
+    nips = {value for kind, value in keys if kind == "nip"}
+    names = {value for kind, value in keys if kind == "name"}
+    found = {}
+    contractors = Contractor.objects.filter(
+        Q(tax_id__gt="") | Q(name__in=names), user=user
+    ).order_by("pk")
+    for contractor in contractors:
+        nip = "".join(filter(str.isdigit, contractor.tax_id or ""))
+        if nip:
+            if nip in nips:
+                found.setdefault(("nip", nip), contractor)
+        elif contractor.name in names:
+            found.setdefault(("name", contractor.name), contractor)
+    return found
+
+
+def _suppliers(user, sellers):
+    """
+    Kontrahenci-dostawcy według `_supplier_key`; brakujący są zakładani
+    zbiorczo (sprzedawca bez NIP-u - jako kontrahent bez NIP-u).
+    NIP kontrahenta wpisany ręcznie bywa z kreskami lub spacjami
+    ("526-000-00-00"), więc porównujemy same cyfry po obu stronach.
+    """
+    sellers = {_supplier_key(seller): seller for seller in sellers}
+    sellers.pop(None, None)
+    existing = _find_suppliers(user, sellers)
+    missing = [
+        Contractor(
+            user=user,
+            tax_id=seller["nip"] or None,
+            name=(seller["name"] or seller["nip"])[:255],
+            street=seller["street"][:255],
+            zip_code=seller["zip_code"][:10],
+            city=seller["city"][:100],
+        )
+        for key, seller in sellers.items()
+        if key not in existing
+    ]
+    if missing:
+        Contractor.objects.bulk_create(missing, ignore_conflicts=True)
+        existing.update(_find_suppliers(user, [key for key in sellers if key not in existing]))
+    return existing
+
+
+def _save_page(user, documents, skipped):
+    """
+    Zapisuje (upsert) faktury zakupu i ich pozycje z jednej strony wyników.
+    Numery KSeF dokumentów, których nie da się zapisać (brak numeru faktury
+    lub danych sprzedawcy), trafiają do listy `skipped`.
+    """
+    suppliers = _suppliers(user, [doc["seller"] for _, doc in documents])
+
+    invoices = {}
+    for metadata, doc in documents:
+        supplier = suppliers.get(_supplier_key(doc["seller"]))
+        number = (doc["number"] or metadata.get("invoiceNumber") or "")[:50]
+        if supplier is None or not number:
+            ksef_number = metadata.get("ksefNumber")
+            logger.warning(
+                f"⚠ Pominięto fakturę {ksef_number} - brak numeru lub danych sprzedawcy"
+            )
+            skipped.append(ksef_number)
+            continue
+        issue_date = doc["issue_date"] or _date(metadata.get("issueDate"))
+        acquired = _parse_datetime(metadata.get("acquisitionDate"))
+        # Ta sama faktura pobrana dwa razy na stronie - zostaje ostatnia wersja
+        invoices[(number, supplier.pk)] = (
+            PurchaseInvoice(
+                user=user,
+                invoice_number=number,
+                supplier=supplier,
+                issue_date=issue_date,
+                receipt_date=timezone.localdate(acquired) if acquired else issue_date,
+                service_date=doc["service_date"] or issue_date,
+                payment_due_date=doc["due_date"] or issue_date + timedelta(days=14),
+                net_amount=doc["net"].quantize(_CENT),
+                vat_amount=doc["vat"].quantize(_CENT),
+                total_amount=doc["total"].quantize(_CENT),
+                category="other",
+                payment_method=doc["payment_method"],
+                ksef_number=metadata.get("ksefNumber"),
+            ),
+            doc["items"],
+        )
+
+    if not invoices:
+        return 0
+
+    # Upsert pomija sygnały - koszty w podsumowaniach przeliczamy dla miesięcy
+    # nowych dat i dat, które faktury miały wcześniej
+    months = {month_of(invoice.issue_date) for invoice, _ in invoices.values()}
+    months.update(
+        month_of(issue_date)
+        for issue_date in PurchaseInvoice.objects.filter(
+            user=user, invoice_number__in={number for number, _ in invoices}
+        ).values_list("issue_date", flat=True)
+    )
+    with transaction.atomic():
+        PurchaseInvoice.objects.bulk_create(
+            [invoice for invoice, _ in invoices.values()],
+            update_conflicts=True,
+            unique_fields=["user", "invoice_number", "supplier"],
+            update_fields=UPSERT_FIELDS,
+        )
+        saved = {
+            (invoice.invoice_number, invoice.supplier_id): invoice.pk
+            for invoice in PurchaseInvoice.objects.filter(
+                user=user, invoice_number__in={number for number, _ in invoices}
+            ).only("pk", "invoice_number", "supplier_id")
+        }
+        invoice_ids = [saved[key] for key in invoices]
+        # Pozycje są zastępowane w całości - korekta w KSeF to nowy dokument
+        PurchaseInvoiceItem.objects.filter(invoice_id__in=invoice_ids).delete()
+        PurchaseInvoiceItem.objects.bulk_create(
+            [
+                PurchaseInvoiceItem(user=user, invoice_id=saved[key], **_item_values(row))
+                for key, (_, rows) in invoices.items()
+                for row in rows
+            ]
+        )
+    refresh_rollups(user.pk, months)
+    return len(invoices)
+
+
+def sync_purchase_invoices(user, page_size=DEFAULT_PAGE_SIZE, client=None):
+    """
+    Pobiera z KSeF faktury zakupu (firma jako nabywca) od ostatniego znacznika
+    `CompanyInfo.ksef_purchases_synced_until` i zapisuje je jako PurchaseInvoice.
+
+    Metadane są pobierane stronami według daty trwałego zapisu (rosnąco),
+    dokumenty XML są parsowane strumieniowo, a każda strona zapisywana
+    zbiorczo w jednej transakcji, po której przesuwany jest znacznik - w
+    pamięci jest najwyżej jedna strona faktur. Przerwana synchronizacja
+    wznowi się od ostatniej zapisanej strony.
+    """
+    from .session_pool import get_session_pool
+
+    company = CompanyInfo.objects.get(user=user)
+    since = company.ksef_purchases_synced_until
+    if since is None:
+        days = getattr(settings, "KSEF_PURCHASE_SYNC_INITIAL_DAYS", DEFAULT_INITIAL_DAYS)
+        since = timezone.now() - timedelta(days=days)
+
+    stats = {"documents": 0, "saved": 0, "pages": 0, "skipped": []}
+    if client is None:
+        with get_session_pool().client_for(user) as pooled_client:
+            return _sync(pooled_client, company, since, page_size, stats)
+    return _sync(client, company, since, page_size, stats)
+
+
+def _sync(client, company, since, page_size, stats):
+    until = timezone.now()
+    while since < until:
+        window_end = min(since + QUERY_WINDOW, until)
+        filters = {
+            "subjectType": "Subject2",
+            "dateRange": {
+                "dateType": "PermanentStorage",
+                "from": since.isoformat(),
+                "to": window_end.isoformat(),
+                "restrictToPermanentStorageHwmDate": True,
+            },
+        }
+        page_offset = 0
+        while True:
+            page = client.query_invoice_metadata(filters, page_offset, page_size)
+            documents = []
+            for metadata in page.get("invoices", []):
+                response = client.download_invoice(metadata["ksefNumber"])
+                try:
+                    documents.append((metadata, parse_fa_invoice(response.raw)))
+                finally:
+                    response.close()
+
+            stats["pages"] += 1
+            stats["documents"] += len(documents)
+            stats["saved"] += _save_page(company.user, documents, stats["skipped"])
+            if documents:
+                since = _parse_datetime(documents[-1][0]["permanentStorageDate"])
+                _store_high_water_mark(company, since)
+
+            if not page.get("hasMore"):
+                break
+            if page.get("isTruncated"):
+                # Limit 10 000 wyników - nowe zapytanie od daty ostatniego rekordu
+                filters["dateRange"]["from"] = since.isoformat()
+                page_offset = 0
+            else:
+                page_offset += 1
+
+        # Okno przetworzone - dane poniżej permanentStorageHwmDate są kompletne
+        hwm = _parse_datetime(page.get("permanentStorageHwmDate")) or window_end
+        if hwm > since:
+            since = hwm
+            _store_high_water_mark(company, since)
+        if hwm < window_end:
+            break
+
+    logger.info(
+        f"✓ Synchronizacja zakupów firmy {company.user_id}: {stats['documents']} dokumentów, "
+        f"zapisano {stats['saved']}, pominięto {len(stats['skipped'])}, znacznik {since.isoformat()}"
+    )
+    return stats
+
+
+def _store_high_water_mark(company, value):
+    company.ksef_purchases_synced_until = value
+    CompanyInfo.objects.filter(pk=company.pk).update(ksef_purchases_synced_until=value)
@@ -0,0 +1,87 @@
+# ksef/rate_limit.py
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Kubełek żetonów: `rate` żetonów na sekundę, najwyżej `capacity` naraz
+    (dopuszczalny chwilowy "wybuch" zapytań).
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self):
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def try_acquire(self, tokens=1):
+        """Pobiera żetony, jeśli są dostępne - nie czeka."""
+        with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def consume(self, tokens=1):
+        """Pobiera żetony bezwarunkowo (saldo może spaść poniżej zera)."""
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+
+    def acquire(self, tokens=1, timeout=None):
+        """Czeka na żetony najwyżej `timeout` sekund. Zwraca False po przekroczeniu limitu."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class KeyedRateLimiter:
+    """Osobny kubełek żetonów dla każdego klucza (np. NIP-u)."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.setdefault(key, TokenBucket(self.rate, self.capacity))
+        return bucket
+
+    def available(self, key, tokens=1):
+        return self.bucket(key).available() >= tokens
+
+    def consume(self, key, tokens=1):
+        self.bucket(key).consume(tokens)
+
+    def exhausted_keys(self, tokens=1):
+        """Klucze, które w tej chwili nie mają wolnych żetonów."""
+        return {key for key, bucket in list(self._buckets.items()) if bucket.available() < tokens}
@@ -0,0 +1,238 @@
+# ksef/reconciliation.py
+
+import copy
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models import Q
+from lxml import etree
+
+from .client import INVOICE_IN_PROGRESS_CODES, SESSION_IN_PROGRESS_CODES
+from .session_pool import get_session_pool
+
+logger = logging.getLogger(__name__)
+
+# Liczba firm uzgadnianych równolegle i sesji jednej firmy pobieranych równolegle
+DEFAULT_TENANT_WORKERS = 4
+DEFAULT_SESSION_WORKERS = 4
+
+
+def _localname(element):
+    # Komentarze i instrukcje przetwarzania nie mają nazwy znacznika
+    return etree.QName(element).localname if isinstance(element.tag, str) else None
+
+
+def split_upo(upo_xml):
+    """
+    Dzieli zbiorcze UPO sesji na dokumenty dla poszczególnych faktur.
+
+    Każdy wynikowy dokument zawiera nagłówek UPO i tylko jeden element
+    <Dokument>. Podpis dotyczy całego UPO, więc fragment służy do podglądu -
+    oryginał można zawsze pobrać ponownie z KSeF. Zwraca słownik
+    {numer KSeF: bajty XML}.
+    """
+    root = etree.fromstring(upo_xml)
+    documents = [child for child in root if _localname(child) == "Dokument"]
+    result = {}
+    for document in documents:
+        ksef_number = next(
+            (
+                child.text
+                for child in document
+                if _localname(child) == "NumerKSeFDokumentu"
+            ),
+            None,
+        )
+        if not ksef_number:
+            continue
+        single = copy.deepcopy(root)
+        # Dokument wstawiamy w miejscu pierwszego elementu <Dokument>
+        position = root.index(documents[0])
+        for other in [child for child in single if _localname(child) == "Dokument"]:
+            single.remove(other)
+        single.insert(position, copy.deepcopy(document))
+        result[ksef_number.strip()] = etree.tostring(
+            single, encoding="utf-8", xml_declaration=True
+        )
+    return result
+
+
+def _pending_invoices(user_ids=None):
+    """Faktury czekające na numer KSeF albo na UPO (wysłane, z numerem sesji)."""
+    from ksiegowosc.models import Invoice
+
+    qs = Invoice.objects.exclude(ksef_session_id__isnull=True).exclude(ksef_session_id="")
+    qs = qs.filter(
+        Q(ksef_status="pending") | Q(ksef_status="success", ksef_upo__isnull=True)
+    ).exclude(ksef_jobs__status__in=["queued", "running"])
+    if user_ids:
+        qs = qs.filter(user_id__in=user_ids)
+    return qs.only(
+        "pk",
+        "user_id",
+        "invoice_number",
+        "ksef_status",
+        "ksef_session_id",
+        "ksef_reference_number",
+        "ksef_number",
+        "ksef_processing_description",
+        "ksef_upo",
+    )
+
+
+def _fetch_session(client, session_reference):
+    """Pobiera status sesji, statusy jej faktur i (po zakończeniu) zbiorcze UPO."""
+    session_status = client.get_session_status(session_reference)
+    invoice_statuses = client.list_session_invoices(session_reference)
+
+    upo = {}
+    session_code = session_status.get("status", {}).get("code")
+    if session_code not in SESSION_IN_PROGRESS_CODES:
+        for document in client.download_session_upo(session_reference, session_status):
+            upo.update(split_upo(document))
+    return session_reference, session_status, invoice_statuses, upo
+
+
+def _fetch_tenant(user, sessions, session_workers):
+    """Pobiera dane wszystkich sesji jednej firmy - jeden klient, wiele zapytań GET."""
+    results = []
+    try:
+        with get_session_pool().client_for(user) as client:
+            client.ensure_authenticated()
+            with ThreadPoolExecutor(max_workers=session_workers) as executor:
+                futures = [
+                    executor.submit(_fetch_session, client, ref) for ref in sessions
+                ]
+                for future in futures:
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        logger.warning(f"⚠ Nie udało się pobrać statusu sesji KSeF: {e}")
+    finally:
+        # Połączenie z bazą otwarte w wątku roboczym (dane firmy) nie zamknie się samo
+        connections.close_all()
+    return results
+
+
+def _apply_session(invoices, session_status, invoice_statuses, upo):
+    """Nanosi wynik sesji na faktury. Zwraca listę zmienionych faktur."""
+    by_reference = {s.get("referenceNumber"): s for s in invoice_statuses}
+    by_file_name = {s.get("invoiceFileName"): s for s in invoice_statuses if s.get("invoiceFileName")}
+    session_code = session_status.get("status", {}).get("code")
+    session_done = session_code not in SESSION_IN_PROGRESS_CODES
+
+    changed = []
+    for invoice in invoices:
+        status = by_reference.get(invoice.ksef_reference_number) or by_file_name.get(
+            f"faktura_{invoice.pk}.xml"
+        )
+        before = (
+            invoice.ksef_status,
+            invoice.ksef_number,
+            invoice.ksef_reference_number,
+            invoice.ksef_processing_description,
+        )
+
+        if status is None:
+            if session_done and invoice.ksef_status == "pending":
+                # Sesja zakończona, a faktury w niej nie ma (np. paczka odrzucona w całości)
+                description = session_status.get("status", {}).get("description", "")
+                invoice.ksef_status = "error"
+                invoice.ksef_processing_description = (
+                    f"Sesja zakończona ({session_code}) bez tej faktury: {description}"
+                )[:500]
+        else:
+            code = status.get("status", {}).get("code")
+            description = status.get("status", {}).get("description", "")
+            invoice.ksef_reference_number = status.get("referenceNumber") or invoice.ksef_reference_number
+            if code == 200 and status.get("ksefNumber"):
+                invoice.ksef_status = "success"
+                invoice.ksef_number = status["ksefNumber"]
+                invoice.ksef_processing_description = f"Nadano numer KSeF: {invoice.ksef_number}"
+            elif code not in INVOICE_IN_PROGRESS_CODES:
+                details = "; ".join(status.get("status", {}).get("details") or [])
+                invoice.ksef_status = "error"
+                invoice.ksef_processing_description = (
+                    f"Faktura odrzucona ({code}): {description}. {details}"
+                ).strip()[:500]
+
+        upo_changed = False
+        if invoice.ksef_number and invoice.ksef_number in upo:
+            invoice.ksef_upo = upo[invoice.ksef_number]
+            upo_changed = True
+
+        after = (
+            invoice.ksef_status,
+            invoice.ksef_number,
+            invoice.ksef_reference_number,
+            invoice.ksef_processing_description,
+        )
+        if before != after or upo_changed:
+            changed.append(invoice)
+    return changed
+
+
+def reconcile_ksef_invoices(
+    user_ids=None,
+    tenant_workers=DEFAULT_TENANT_WORKERS,
+    session_workers=DEFAULT_SESSION_WORKERS,
+):
+    """
+    Uzgadnia wysłane faktury ze statusem w KSeF: uzupełnia `ksef_number`,
+    status i UPO. Sesje różnych firm odpytywane są równolegle, a zbiorcze UPO
+    sesji pobierane jest raz i dzielone na faktury.
+
+    Przetwarzane są tylko faktury bez numeru KSeF lub bez UPO, więc funkcję
+    można bezpiecznie uruchamiać cyklicznie - przerwane uzgadnianie zostanie
+    dokończone przy następnym uruchomieniu.
+    """
+    from ksiegowosc.models import Invoice
+
+    invoices = list(_pending_invoices(user_ids))
+    if not invoices:
+        return {"sessions": 0, "updated": 0}
+
+    # {user_id: {session_ref: [faktury]}}
+    grouped = {}
+    for invoice in invoices:
+        grouped.setdefault(invoice.user_id, {}).setdefault(invoice.ksef_session_id, []).append(
+            invoice
+        )
+    users = User.objects.in_bulk(list(grouped))
+
+    fetched = []
+    with ThreadPoolExecutor(max_workers=tenant_workers) as executor:
+        futures = {
+            executor.submit(_fetch_tenant, users[user_id], list(sessions), session_workers): user_id
+            for user_id, sessions in grouped.items()
+        }
+        for future, user_id in futures.items():
+            try:
+                fetched.extend((user_id, result) for result in future.result())
+            except Exception as e:
+                logger.error(f"❌ Błąd uzgadniania KSeF dla użytkownika {user_id}: {e}")
+
+    changed = []
+    for user_id, (session_reference, session_status, invoice_statuses, upo) in fetched:
+        changed.extend(
+            _apply_session(
+                grouped[user_id][session_reference], session_status, invoice_statuses, upo
+            )
+        )
+
+    if changed:
+        Invoice.objects.bulk_update(
+            changed,
+            [
+                "ksef_status",
+                "ksef_number",
+                "ksef_reference_number",
+                "ksef_processing_description",
+                "ksef_upo",
+            ],
+            batch_size=500,
+        )
+    logger.info(f"✓ Uzgodniono {len(fetched)} sesji KSeF, zaktualizowano {len(changed)} faktur")
+    return {"sessions": len(fetched), "updated": len(changed)}
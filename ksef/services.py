@@ -1,24 +1,45 @@
 # ksef/services.py
 
 import logging
+import time
 
 import requests
 from django.utils import timezone
 
-from .client import KsefClient
+from .metrics import get_metrics
+from .session_pool import get_session_pool
 from .xml_generator import generate_invoice_xml
 
 logger = logging.getLogger(__name__)
 
 
-def send_invoice_to_ksef(invoice_id: int):
+class InvoiceSentError(Exception):
+    """KSeF przyjął fakturę (lub paczkę), ale nie udało się zapisać wyniku wysyłki."""
+
+
+def _is_retryable(exc):
+    """Błędy przejściowe (sieć, przeciążenie, 5xx) warto ponowić później."""
+    if isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None:
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return False
+
+
+def send_invoice_to_ksef(invoice_id: int, xml_content=None, offline=False):
     """
     Orkiestrator procesu wysyłki faktury do KSeF z obsługą szczegółowych błędów API.
+    Faktura wystawiona w trybie offline jest wysyłana z zapisanym wcześniej XML
+    (`xml_content`), bo jej skrót musi się zgadzać z przekazanym nabywcy.
     """
     from ksiegowosc.models import Invoice
 
     try:
-        invoice = Invoice.objects.get(pk=invoice_id)
+        invoice = (
+            Invoice.objects.select_related("contractor", "user__companyinfo")
+            .prefetch_related("items")
+            .get(pk=invoice_id)
+        )
     except Invoice.DoesNotExist:
         return {"success": False, "message": "Faktura nie istnieje."}
 
@@ -26,25 +47,13 @@ def send_invoice_to_ksef(invoice_id: int):
     if invoice.ksef_status == "success" and invoice.ksef_number:
         return {"success": False, "message": "Ta faktura została już wysłana do KSeF."}
 
+    start = time.perf_counter()
     try:
-        client = KsefClient(user=invoice.user)
-        xml_content = generate_invoice_xml(invoice)
-        result = client.send_invoice(xml_content)
-
-        invoice.ksef_reference_number = result.get("invoice_reference")
-        invoice.ksef_session_id = result.get("session_reference")
-        invoice.ksef_status = "success"
-        invoice.ksef_sent_at = timezone.now()
-        invoice.ksef_processing_description = (
-            "Wysłano pomyślnie. Dokument przyjęty do przetwarzania."
-        )
-        invoice.save()
-
-        return {
-            "success": True,
-            "message": f"Wysłano pomyślnie. Nr Ref: {invoice.ksef_reference_number}",
-        }
-
+        if xml_content is None:
+            xml_content = generate_invoice_xml(invoice)
+        # Klient z puli ponownie używa accessToken i otwartej sesji online
+        with get_session_pool().client_for(invoice.user) as client:
+            result = client.send_invoice(xml_content, offline_mode=offline)
     except requests.exceptions.HTTPError as e:
         # Próba wyciągnięcia szczegółów błędu z odpowiedzi API KSeF
         try:
@@ -63,13 +72,139 @@ def send_invoice_to_ksef(invoice_id: int):
 
         invoice.ksef_status = "error"
         invoice.ksef_processing_description = error_message[:500]
-        invoice.save()
-        return {"success": False, "message": error_message}
+        invoice.save(update_fields=["ksef_status", "ksef_processing_description"])
+        return {"success": False, "message": error_message, "retryable": _is_retryable(e)}
 
     except Exception as e:
         error_message = str(e)
         logger.error(f"Błąd systemowy KSeF: {error_message}")
         invoice.ksef_status = "error"
         invoice.ksef_processing_description = error_message[:500]
-        invoice.save()
-        return {"success": False, "message": error_message}
+        invoice.save(update_fields=["ksef_status", "ksef_processing_description"])
+        return {"success": False, "message": error_message, "retryable": _is_retryable(e)}
+
+    duration = time.perf_counter() - start
+    get_metrics().record_operation("send_invoice", duration)
+    invoice.ksef_send_duration_ms = round(duration * 1000)
+
+    invoice.ksef_reference_number = result.get("invoice_reference")
+    invoice.ksef_session_id = result.get("session_reference")
+    # Numer KSeF i UPO uzupełni uzgadnianie (manage.py ksef_reconcile)
+    invoice.ksef_status = "pending"
+    invoice.ksef_sent_at = timezone.now()
+    invoice.ksef_processing_description = (
+        "Dokument przyjęty do przetwarzania. Oczekuje na numer KSeF."
+    )
+    try:
+        invoice.save(
+            update_fields=[
+                "ksef_send_duration_ms",
+                "ksef_reference_number",
+                "ksef_session_id",
+                "ksef_status",
+                "ksef_sent_at",
+                "ksef_processing_description",
+            ]
+        )
+    except Exception as e:
+        # Faktura jest już w KSeF - nie wolno jej traktować jak nieudanej wysyłki
+        logger.error(
+            f"❌ Nie zapisano wyniku wysyłki faktury {invoice.pk} "
+            f"(Nr Ref: {invoice.ksef_reference_number}): {e}"
+        )
+        raise InvoiceSentError(
+            f"Faktura przyjęta przez KSeF (Nr Ref: {invoice.ksef_reference_number}), "
+            f"ale nie zapisano wyniku: {e}"
+        ) from e
+
+    return {
+        "success": True,
+        "message": f"Przyjęto do przetwarzania. Nr Ref: {invoice.ksef_reference_number}",
+    }
+
+
+def send_invoices_batch_to_ksef(invoice_ids):
+    """
+    Wysyła wiele faktur jednego użytkownika w sesji wsadowej KSeF.
+    Faktury dostają status "pending" - numery KSeF pojawią się po przetworzeniu sesji.
+    """
+    from ksiegowosc.models import Invoice
+
+    invoices = list(
+        Invoice.objects.filter(pk__in=invoice_ids)
+        .select_related("contractor", "user__companyinfo")
+        .prefetch_related("items")
+        .order_by("pk")
+    )
+    if not invoices:
+        return {"success": False, "message": "Brak faktur do wysłania."}
+
+    users = {invoice.user_id for invoice in invoices}
+    if len(users) > 1:
+        return {
+            "success": False,
+            "message": "Sesja wsadowa może zawierać faktury tylko jednej firmy.",
+        }
+
+    start = time.perf_counter()
+    try:
+        with get_session_pool().client_for(invoices[0].user) as client:
+            result = client.send_batch(invoices)
+    except requests.exceptions.HTTPError as e:
+        error_message = f"Błąd HTTP {e.response.status_code}: {e.response.text or str(e)}"
+        Invoice.objects.filter(pk__in=[i.pk for i in invoices]).update(
+            ksef_status="error", ksef_processing_description=error_message[:500]
+        )
+        return {"success": False, "message": error_message, "retryable": _is_retryable(e)}
+    except Exception as e:
+        error_message = str(e)
+        logger.error(f"Błąd systemowy KSeF (sesja wsadowa): {error_message}")
+        Invoice.objects.filter(pk__in=[i.pk for i in invoices]).update(
+            ksef_status="error", ksef_processing_description=error_message[:500]
+        )
+        return {"success": False, "message": error_message, "retryable": _is_retryable(e)}
+
+    duration = time.perf_counter() - start
+    get_metrics().record_operation("send_batch", duration)
+    per_invoice_ms = round(duration * 1000 / len(invoices))
+
+    now = timezone.now()
+    session_reference = result["session_reference"]
+    for invoice in invoices:
+        invoice.ksef_session_id = session_reference
+        invoice.ksef_status = "pending"
+        invoice.ksef_sent_at = now
+        invoice.ksef_send_duration_ms = per_invoice_ms
+        invoice.ksef_processing_description = (
+            "Wysłano w sesji wsadowej. Oczekuje na przetworzenie paczki."
+        )
+    try:
+        Invoice.objects.bulk_update(
+            invoices,
+            [
+                "ksef_session_id",
+                "ksef_status",
+                "ksef_sent_at",
+                "ksef_send_duration_ms",
+                "ksef_processing_description",
+            ],
+        )
+    except Exception as e:
+        logger.error(
+            f"❌ Nie zapisano wyniku sesji wsadowej {session_reference} "
+            f"({len(invoices)} faktur): {e}"
+        )
+        raise InvoiceSentError(
+            f"Paczka przyjęta przez KSeF (Nr Ref sesji: {session_reference}), "
+            f"ale nie zapisano wyniku: {e}"
+        ) from e
+
+    return {
+        "success": True,
+        "message": (
+            f"Wysłano {len(invoices)} faktur w sesji wsadowej. "
+            f"Nr Ref sesji: {session_reference}"
+        ),
+        "session_reference": session_reference,
+        "invoices": result["invoices"],
+    }
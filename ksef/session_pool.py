@@ -0,0 +1,142 @@
+# ksef/session_pool.py
+
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from ksiegowosc.models import CompanyInfo
+
+from .client import KsefClient
+
+logger = logging.getLogger(__name__)
+
+# Po tylu sekundach bezczynności sesja online jest zamykana
+DEFAULT_IDLE_TIMEOUT = 300
+
+
+class _PoolEntry:
+    def __init__(self, client, fingerprint):
+        self.client = client
+        self.fingerprint = fingerprint
+        self.lock = threading.Lock()
+        self.last_used = timezone.now()
+
+
+class KsefSessionPool:
+    """
+    Pula klientów KSeF (po jednym na firmę) współdzielona w obrębie procesu.
+
+    Każdy klient przechowuje accessToken do czasu 'validUntil' oraz jedną
+    otwartą sesję online (wraz z kluczem AES/IV), przez którą można wysłać
+    wiele faktur. Sesje nieużywane dłużej niż `idle_timeout` są zamykane.
+    """
+
+    def __init__(self, idle_timeout=None):
+        if idle_timeout is None:
+            idle_timeout = getattr(
+                settings, "KSEF_SESSION_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT
+            )
+        self.idle_timeout = idle_timeout
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _fingerprint(user):
+        """
+        Zmiana tokena, NIP-u lub środowiska unieważnia klienta z puli. Odczyt
+        samych tych pól jest tańszy niż budowa klienta (odszyfrowanie tokenów).
+        """
+        return (
+            CompanyInfo.objects.filter(user=user)
+            .values_list("ksef_token", "ksef_environment", "tax_id")
+            .first()
+        )
+
+    def _get_entry(self, user):
+        fingerprint = self._fingerprint(user)
+        with self._lock:
+            entry = self._entries.get(user.pk)
+        if fingerprint is not None and entry is not None and entry.fingerprint == fingerprint:
+            return entry
+
+        # Brak klienta lub zmienione dane firmy (bez danych firmy KsefClient zgłosi błąd)
+        client = KsefClient(user=user)
+        with self._lock:
+            entry = self._entries.get(user.pk)
+            if entry is not None and entry.fingerprint == fingerprint:
+                # Inny wątek zdążył utworzyć klienta
+                return entry
+            stale = entry
+            entry = _PoolEntry(client, fingerprint)
+            self._entries[user.pk] = entry
+
+        if stale is not None:
+            logger.info(f"Dane KSeF firmy {user.pk} uległy zmianie - nowy klient")
+            self._close_entry(stale)
+        return entry
+
+    @contextmanager
+    def client_for(self, user):
+        """
+        Wypożycza klienta KSeF dla użytkownika. Jeden klient jest używany
+        w danej chwili tylko przez jeden wątek. Bezczynne sesje zamyka
+        `close_idle`, wywoływane okresowo przez dispatcher.
+        """
+        entry = self._get_entry(user)
+        with entry.lock:
+            try:
+                yield entry.client
+            finally:
+                entry.last_used = timezone.now()
+
+    def _close_entry(self, entry):
+        with entry.lock:
+            if not entry.client.has_open_session():
+                return
+            try:
+                entry.client.close_session()
+            except Exception as e:
+                logger.warning(f"⚠ Nie udało się zamknąć sesji KSeF: {e}")
+
+    def close_idle(self, max_idle=None):
+        """Zamyka sesje online nieużywane dłużej niż `max_idle` sekund."""
+        if max_idle is None:
+            max_idle = self.idle_timeout
+        threshold = timezone.now() - timedelta(seconds=max_idle)
+
+        with self._lock:
+            idle = [
+                (user_id, entry)
+                for user_id, entry in self._entries.items()
+                if entry.last_used < threshold and not entry.lock.locked()
+            ]
+
+        closed = 0
+        for user_id, entry in idle:
+            if entry.client.has_open_session():
+                logger.info(f"Zamykanie bezczynnej sesji KSeF firmy {user_id}")
+                self._close_entry(entry)
+                closed += 1
+        return closed
+
+    def close_all(self):
+        """Zamyka wszystkie otwarte sesje i czyści pulę."""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._close_entry(entry)
+
+
+_pool = KsefSessionPool()
+atexit.register(_pool.close_all)
+
+
+def get_session_pool():
+    """Zwraca współdzieloną w procesie pulę sesji KSeF."""
+    return _pool
@@ -0,0 +1,67 @@
+# ksef/tests/base.py
+
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+
+from ksef.certificates import get_public_key_store
+from ksef.mock_server import MockKsefServer
+from ksef.session_pool import get_session_pool
+from ksiegowosc.models import CompanyInfo, Contractor, Invoice, InvoiceItem
+
+NIP = "5260000000"
+
+
+class MockKsefTestCase(TransactionTestCase):
+    """
+    Testy z lokalnym serwerem KSeF (`MockKsefServer`). Wysyłki działają
+    w wątkach z własnymi połączeniami z bazą, dlatego TransactionTestCase.
+    """
+
+    def setUp(self):
+        self.server = MockKsefServer(auth_pending_polls=0).start()
+        self.addCleanup(self.server.stop)
+        settings_override = override_settings(KSEF_BASE_URL=self.server.base_url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Pula klientów i klucze publiczne są wspólne w procesie - każdy test ma nowy serwer
+        self.addCleanup(get_session_pool().close_all)
+        get_public_key_store().clear()
+        cache.clear()
+
+        self.user = self.create_company("firma", NIP)
+        self.contractor = Contractor.objects.create(
+            user=self.user, name="Kontrahent", tax_id="1111111111",
+            street="ul. Kupiecka 2", zip_code="00-002", city="Kraków",
+        )
+
+    @staticmethod
+    def create_company(username, tax_id):
+        user = User.objects.create(username=username)
+        CompanyInfo.objects.create(
+            user=user,
+            company_name=f"Firma {username}",
+            tax_id=tax_id,
+            street="ul. Testowa 1",
+            zip_code="00-001",
+            city="Warszawa",
+            bank_account_number="00000000000000000000000000",
+            ksef_token="test-token",
+            ksef_environment="test",
+        )
+        return user
+
+    def create_invoices(self, count):
+        invoices = []
+        for n in range(count):
+            invoice = Invoice.objects.create(
+                user=self.user, contractor=self.contractor, invoice_number=f"FV/{n + 1}"
+            )
+            InvoiceItem.objects.create(
+                user=self.user, invoice=invoice, name="Usługa",
+                quantity=Decimal("1"), unit_price=Decimal("100.00"),
+            )
+            invoices.append(invoice)
+        return Invoice.objects.filter(pk__in=[invoice.pk for invoice in invoices]).order_by("pk")
@@ -0,0 +1,69 @@
+# ksef/tests/test_client.py
+
+from datetime import timedelta
+
+from django.utils import timezone
+
+from ksef.client import KsefClient
+from ksef.token_crypto import decrypt_token, encrypt_token
+from ksiegowosc.models import CompanyInfo
+
+from .base import MockKsefTestCase
+
+
+class KsefAuthenticationTests(MockKsefTestCase):
+    def authenticate(self):
+        client = KsefClient(self.user)
+        client.ensure_authenticated()
+        return client
+
+    def expire_access_token(self):
+        CompanyInfo.objects.filter(user=self.user).update(
+            ksef_access_token_valid_until=timezone.now() - timedelta(minutes=1)
+        )
+
+    def test_full_authentication_stores_encrypted_tokens(self):
+        client = self.authenticate()
+
+        company = CompanyInfo.objects.get(user=self.user)
+        self.assertEqual(len(self.server.state.auth_operations), 1)
+        self.assertIn(client.access_token, self.server.state.access_tokens)
+        self.assertNotEqual(company.ksef_access_token, client.access_token)
+        self.assertEqual(decrypt_token(company.ksef_access_token), client.access_token)
+        self.assertEqual(decrypt_token(company.ksef_refresh_token), client.refresh_token)
+
+    def test_valid_stored_access_token_is_reused(self):
+        first = self.authenticate()
+        requests_before = self.server.state.request_count
+
+        second = self.authenticate()
+
+        self.assertEqual(second.access_token, first.access_token)
+        self.assertEqual(self.server.state.request_count, requests_before)
+
+    def test_expired_access_token_is_refreshed(self):
+        first = self.authenticate()
+        self.expire_access_token()
+
+        second = self.authenticate()
+
+        self.assertEqual(len(self.server.state.auth_operations), 1)
+        self.assertNotEqual(second.access_token, first.access_token)
+        self.assertIn(second.access_token, self.server.state.access_tokens)
+        company = CompanyInfo.objects.get(user=self.user)
+        self.assertEqual(decrypt_token(company.ksef_access_token), second.access_token)
+
+    def test_rejected_refresh_token_falls_back_to_full_authentication(self):
+        self.authenticate()
+        self.expire_access_token()
+        CompanyInfo.objects.filter(user=self.user).update(
+            ksef_refresh_token=encrypt_token("odwolany-token")
+        )
+
+        client = self.authenticate()
+
+        self.assertEqual(len(self.server.state.auth_operations), 2)
+        self.assertIn(client.access_token, self.server.state.access_tokens)
+        self.assertIn(client.refresh_token, self.server.state.refresh_tokens)
+        company = CompanyInfo.objects.get(user=self.user)
+        self.assertEqual(decrypt_token(company.ksef_refresh_token), client.refresh_token)
@@ -0,0 +1,111 @@
+# ksef/tests/test_dispatcher.py
+
+from datetime import timedelta
+
+from django.utils import timezone
+
+from ksef.dispatcher import KsefDispatcher
+from ksef.jobs import claim_jobs, enqueue_invoices, requeue_jobs
+from ksef.models import KsefJob
+from ksef.services import InvoiceSentError
+from ksiegowosc.models import Invoice
+
+from .base import MockKsefTestCase
+
+
+class KsefDispatcherTests(MockKsefTestCase):
+    def run_dispatcher(self):
+        return KsefDispatcher(threads=1, nip_rate=0).run(once=True)
+
+    def test_online_invoices_are_sent_one_by_one(self):
+        invoices = self.create_invoices(2)
+        jobs = enqueue_invoices(invoices, batch_threshold=5)
+        self.assertEqual({job.mode for job in jobs}, {"online"})
+
+        self.assertEqual(self.run_dispatcher(), {"processed": 2, "errors": 0})
+
+        self.assertEqual(set(KsefJob.objects.values_list("status", flat=True)), {"done"})
+        accepted = self.server.accepted_invoices()
+        self.assertEqual(len(accepted), 2)
+        self.assertFalse(any(invoice["offlineMode"] for invoice in accepted))
+        references = {invoice["referenceNumber"] for invoice in accepted}
+        for invoice in invoices:
+            self.assertEqual(invoice.ksef_status, "pending")
+            self.assertIn(invoice.ksef_reference_number, references)
+            self.assertIsNotNone(invoice.ksef_sent_at)
+        # Jeden klient z puli - obie faktury w tej samej sesji online
+        self.assertEqual(len({invoice.ksef_session_id for invoice in invoices}), 1)
+
+    def test_invoices_above_threshold_go_in_one_batch_session(self):
+        invoices = self.create_invoices(3)
+        jobs = enqueue_invoices(invoices, batch_threshold=2)
+        self.assertEqual(len({job.batch_id for job in jobs}), 1)
+
+        self.assertEqual(self.run_dispatcher(), {"processed": 3, "errors": 0})
+
+        self.assertEqual(set(KsefJob.objects.values_list("status", flat=True)), {"done"})
+        session_ids = set(invoices.values_list("ksef_session_id", flat=True))
+        self.assertEqual(len(session_ids), 1)
+        session = self.server.state.sessions[session_ids.pop()]
+        self.assertEqual(session["kind"], "SB")
+        self.assertEqual(
+            sorted(invoice["invoiceFileName"] for invoice in session["invoices"]),
+            sorted(f"faktura_{invoice.pk}.xml" for invoice in invoices),
+        )
+
+    def test_offline_invoice_is_sent_with_stored_xml(self):
+        invoices = self.create_invoices(1)
+        [job] = enqueue_invoices(invoices, offline=True)
+        self.assertEqual(job.mode, "offline")
+        self.assertIsNotNone(job.deadline)
+        self.assertIn("trybie offline", invoices[0].ksef_processing_description)
+
+        self.assertEqual(self.run_dispatcher(), {"processed": 1, "errors": 0})
+
+        [accepted] = self.server.accepted_invoices()
+        self.assertTrue(accepted["offlineMode"])
+        self.assertEqual(accepted["invoiceHash"], job.payload_hash)
+        self.assertEqual(KsefJob.objects.get(pk=job.pk).status, "done")
+        self.assertEqual(invoices[0].ksef_status, "pending")
+
+
+class RequeueJobsTests(MockKsefTestCase):
+    def claim(self, **job_fields):
+        enqueue_invoices(self.create_invoices(1), batch_threshold=5)
+        KsefJob.objects.update(**job_fields)
+        return claim_jobs("worker")
+
+    def test_unsent_job_is_queued_again_with_delay(self):
+        jobs = self.claim()
+
+        self.assertEqual(requeue_jobs(jobs, RuntimeError("przerwane połączenie")), 1)
+
+        job = KsefJob.objects.get()
+        self.assertEqual((job.status, job.attempts), ("queued", 1))
+        self.assertEqual(job.last_error, "przerwane połączenie")
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=20))
+
+    def test_job_fails_after_max_attempts(self):
+        jobs = self.claim(attempts=4, max_attempts=5)
+
+        requeue_jobs(jobs, RuntimeError("przerwane połączenie"))
+
+        job = KsefJob.objects.get()
+        self.assertEqual((job.status, job.attempts), ("failed", 5))
+        self.assertEqual(job.invoice.ksef_status, "error")
+
+    def test_job_sent_during_claim_is_not_sent_again(self):
+        jobs = self.claim()
+        Invoice.objects.update(ksef_sent_at=timezone.now())
+
+        requeue_jobs(jobs, RuntimeError("błąd po wysyłce"))
+
+        job = KsefJob.objects.get()
+        self.assertEqual((job.status, job.attempts), ("done", 1))
+
+    def test_invoice_sent_error_finishes_job(self):
+        jobs = self.claim()
+
+        requeue_jobs(jobs, InvoiceSentError("nie zapisano wyniku"))
+
+        self.assertEqual(KsefJob.objects.get().status, "done")
@@ -0,0 +1,111 @@
+# ksef/tests/test_purchases.py
+
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from ksef.purchases import parse_fa_invoice, sync_purchase_invoices
+from ksiegowosc.models import CompanyInfo, Contractor, PurchaseInvoice
+
+from .base import NIP, MockKsefTestCase
+
+
+def fa_invoice(number, seller_nip="", seller_name="Dostawca sp. z o.o.", doctype=""):
+    """Minimalna faktura FA(3) z jedną pozycją 100 zł + 23% VAT."""
+    nip = f"<NIP>{seller_nip}</NIP>" if seller_nip else ""
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?>{doctype}'
+        '<Faktura xmlns="http://crd.gov.pl/wzor/2025/06/25/13775/">'
+        f"<Podmiot1><DaneIdentyfikacyjne>{nip}<Nazwa>{seller_name}</Nazwa></DaneIdentyfikacyjne>"
+        "<Adres><AdresL1>ul. Hurtowa 5</AdresL1><AdresL2>00-950 Warszawa</AdresL2></Adres></Podmiot1>"
+        f"<Fa><P_1>2025-03-10</P_1><P_2>{number}</P_2>"
+        "<P_13_1>100.00</P_13_1><P_14_1>23.00</P_14_1><P_15>123.00</P_15>"
+        "<FaWiersz><NrWierszaFa>1</NrWierszaFa><P_7>Papier &amp; tusz</P_7><P_8A>szt.</P_8A>"
+        "<P_8B>2</P_8B><P_9A>50.00</P_9A><P_11>100.00</P_11><P_12>23</P_12></FaWiersz>"
+        "<Platnosc><TerminPlatnosci><Termin>2025-03-24</Termin></TerminPlatnosci>"
+        "<FormaPlatnosci>6</FormaPlatnosci></Platnosc></Fa></Faktura>"
+    ).encode("utf-8")
+
+
+class ParseFaInvoiceTests(SimpleTestCase):
+    def test_header_seller_and_items(self):
+        invoice = parse_fa_invoice(BytesIO(fa_invoice("FZ/1", seller_nip="7770001111")))
+
+        self.assertEqual(invoice["number"], "FZ/1")
+        self.assertEqual(invoice["issue_date"], date(2025, 3, 10))
+        self.assertEqual(invoice["due_date"], date(2025, 3, 24))
+        self.assertEqual((invoice["net"], invoice["vat"], invoice["total"]),
+                         (Decimal("100.00"), Decimal("23.00"), Decimal("123.00")))
+        self.assertEqual(invoice["seller"]["nip"], "7770001111")
+        self.assertEqual((invoice["seller"]["zip_code"], invoice["seller"]["city"]), ("00-950", "Warszawa"))
+        self.assertEqual(invoice["items"][0]["P_7"], "Papier & tusz")
+
+    def test_entities_are_not_expanded(self):
+        doctype = '<!DOCTYPE Faktura [<!ENTITY plik SYSTEM "file:///etc/passwd">]>'
+        invoice = parse_fa_invoice(
+            BytesIO(fa_invoice("FZ/1", seller_name="&plik;", doctype=doctype))
+        )
+
+        self.assertNotIn("root:", invoice["seller"]["name"])
+
+
+class PurchaseSyncTests(MockKsefTestCase):
+    def receive(self, number, seller_nip="7770001111", **kwargs):
+        return self.server.add_received_invoice(
+            NIP, fa_invoice(number, seller_nip=seller_nip, **kwargs), seller_nip or "0000000000", number
+        )
+
+    def test_invoices_are_saved_page_by_page(self):
+        # Ręcznie wpisany NIP z kreskami - ten sam dostawca
+        supplier = Contractor.objects.create(user=self.user, name="Dostawca", tax_id="777-000-11-11")
+        ksef_numbers = [self.receive(f"FZ/{n}") for n in range(1, 4)]
+        # Znacznik sprzed doby - wszystkie faktury w jednym oknie zapytań
+        CompanyInfo.objects.filter(user=self.user).update(
+            ksef_purchases_synced_until=timezone.now() - timedelta(days=1)
+        )
+
+        stats = sync_purchase_invoices(self.user, page_size=2)
+
+        self.assertEqual(stats, {"documents": 3, "saved": 3, "pages": 2, "skipped": []})
+        purchases = PurchaseInvoice.objects.filter(user=self.user).order_by("invoice_number")
+        self.assertEqual(list(purchases.values_list("ksef_number", flat=True)), ksef_numbers)
+        purchase = purchases[0]
+        self.assertEqual(purchase.supplier, supplier)
+        self.assertEqual((purchase.net_amount, purchase.vat_amount, purchase.total_amount),
+                         (Decimal("100.00"), Decimal("23.00"), Decimal("123.00")))
+        self.assertEqual(purchase.payment_method, "transfer")
+        item = purchase.items.get()
+        self.assertEqual((item.quantity, item.vat_rate, item.gross_value),
+                         (Decimal("2"), "23", Decimal("123.00")))
+        self.assertIsNotNone(CompanyInfo.objects.get(user=self.user).ksef_purchases_synced_until)
+
+        # Kolejna synchronizacja zaczyna od znacznika - nic nowego do pobrania
+        stats = sync_purchase_invoices(self.user, page_size=2)
+        self.assertEqual((stats["documents"], stats["saved"]), (0, 0))
+        self.assertEqual(PurchaseInvoice.objects.count(), 3)
+
+    def test_seller_without_nip_is_kept_by_name(self):
+        self.receive("INV-1", seller_nip="", seller_name="Foreign GmbH")
+        self.receive("INV-2", seller_nip="", seller_name="Foreign GmbH")
+
+        stats = sync_purchase_invoices(self.user)
+
+        self.assertEqual((stats["saved"], stats["skipped"]), (2, []))
+        supplier = Contractor.objects.get(user=self.user, name="Foreign GmbH")
+        self.assertIsNone(supplier.tax_id)
+        self.assertEqual(supplier.purchaseinvoice_set.count(), 2)
+
+    def test_documents_without_number_or_seller_are_reported(self):
+        saved = self.receive("FZ/1")
+        no_number = self.receive("")
+        no_seller = self.receive("FZ/2", seller_nip="", seller_name="")
+
+        stats = sync_purchase_invoices(self.user)
+
+        self.assertEqual(stats["documents"], 3)
+        self.assertEqual(stats["saved"], 1)
+        self.assertEqual(sorted(stats["skipped"]), sorted([no_number, no_seller]))
+        self.assertEqual(PurchaseInvoice.objects.get().ksef_number, saved)
@@ -0,0 +1,78 @@
+# ksef/tests/test_reconciliation.py
+
+from lxml import etree
+
+from ksef.dispatcher import KsefDispatcher
+from ksef.jobs import enqueue_invoices
+from ksef.reconciliation import reconcile_ksef_invoices, split_upo
+
+from .base import MockKsefTestCase
+
+
+def _ksef_numbers(upo_xml):
+    root = etree.fromstring(bytes(upo_xml))
+    return [element.text for element in root.iter("{*}NumerKSeFDokumentu")]
+
+
+class KsefReconciliationTests(MockKsefTestCase):
+    def send(self, count, batch_threshold=5):
+        invoices = self.create_invoices(count)
+        enqueue_invoices(invoices, batch_threshold=batch_threshold)
+        # Po zakończeniu dispatcher zamyka sesje - KSeF wystawia UPO
+        KsefDispatcher(threads=1, nip_rate=0).run(once=True)
+        return invoices
+
+    def test_online_invoices_get_ksef_number_and_own_upo(self):
+        invoices = self.send(2)
+
+        self.assertEqual(reconcile_ksef_invoices(), {"sessions": 1, "updated": 2})
+
+        by_reference = {i["referenceNumber"]: i for i in self.server.accepted_invoices()}
+        for invoice in invoices:
+            accepted = by_reference[invoice.ksef_reference_number]
+            self.assertEqual(invoice.ksef_status, "success")
+            self.assertEqual(invoice.ksef_number, accepted["ksefNumber"])
+            self.assertEqual(_ksef_numbers(invoice.ksef_upo), [invoice.ksef_number])
+        # Uzgodnione faktury nie są odpytywane ponownie
+        self.assertEqual(reconcile_ksef_invoices(), {"sessions": 0, "updated": 0})
+
+    def test_batch_invoices_are_matched_by_file_name(self):
+        invoices = self.send(3, batch_threshold=2)
+
+        self.assertEqual(reconcile_ksef_invoices(), {"sessions": 1, "updated": 3})
+
+        numbers = {i["invoiceFileName"]: i["ksefNumber"] for i in self.server.accepted_invoices()}
+        for invoice in invoices:
+            self.assertEqual(invoice.ksef_status, "success")
+            self.assertEqual(invoice.ksef_number, numbers[f"faktura_{invoice.pk}.xml"])
+            self.assertIsNotNone(invoice.ksef_upo)
+
+    def test_rejected_invoice_is_marked_as_error(self):
+        [invoice] = self.send(1)
+        [accepted] = self.server.accepted_invoices()
+        accepted["status"] = {
+            "code": 450,
+            "description": "Błąd weryfikacji semantyki dokumentu faktury",
+            "details": ["Nieprawidłowy NIP nabywcy"],
+        }
+
+        reconcile_ksef_invoices()
+
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.ksef_status, "error")
+        self.assertIn("Faktura odrzucona (450)", invoice.ksef_processing_description)
+        self.assertIn("Nieprawidłowy NIP nabywcy", invoice.ksef_processing_description)
+        self.assertIsNone(invoice.ksef_number)
+
+    def test_split_upo_keeps_header_and_one_document(self):
+        invoice = self.send(2).first()
+        session_upo = self.server.upo_xml(invoice.ksef_session_id)
+        ksef_numbers = [i["ksefNumber"] for i in self.server.accepted_invoices()]
+
+        documents = split_upo(session_upo)
+
+        self.assertEqual(sorted(documents), sorted(ksef_numbers))
+        for ksef_number, document in documents.items():
+            root = etree.fromstring(document)
+            self.assertEqual(root.findtext("{*}NumerReferencyjnySesji"), invoice.ksef_session_id)
+            self.assertEqual(_ksef_numbers(document), [ksef_number])
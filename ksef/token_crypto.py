@@ -0,0 +1,45 @@
+# ksef/token_crypto.py
+
+import base64
+import hashlib
+import logging
+
+from cryptography.fernet import Fernet, InvalidToken
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_fernet = None
+_fernet_secret = None
+
+
+def _get_fernet():
+    """
+    Szyfr Fernet z kluczem wyprowadzonym z `KSEF_TOKEN_ENCRYPTION_KEY`
+    (a gdy go brak - z `SECRET_KEY`).
+    """
+    global _fernet, _fernet_secret
+    secret = getattr(settings, "KSEF_TOKEN_ENCRYPTION_KEY", None) or settings.SECRET_KEY
+    if _fernet is None or _fernet_secret != secret:
+        key = base64.urlsafe_b64encode(hashlib.sha256(secret.encode("utf-8")).digest())
+        _fernet = Fernet(key)
+        _fernet_secret = secret
+    return _fernet
+
+
+def encrypt_token(value):
+    """Szyfruje token przed zapisem w bazie danych."""
+    if not value:
+        return ""
+    return _get_fernet().encrypt(value.encode("utf-8")).decode("ascii")
+
+
+def decrypt_token(value):
+    """Odszyfrowuje token z bazy; zwraca None, gdy nie da się go odczytać (np. po zmianie klucza)."""
+    if not value:
+        return None
+    try:
+        return _get_fernet().decrypt(value.encode("ascii")).decode("utf-8")
+    except (InvalidToken, ValueError):
+        logger.warning("⚠ Nie udało się odszyfrować zapisanego tokena KSeF - zostanie pominięty")
+        return None
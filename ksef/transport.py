@@ -0,0 +1,222 @@
+# ksef/transport.py
+
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metrics import endpoint_label, get_metrics
+from .rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+BASE_URLS = {
+    "test": "https://api-test.ksef.mf.gov.pl/v2",
+    "demo": "https://api-demo.ksef.mf.gov.pl/v2",
+    "production": "https://api.ksef.mf.gov.pl/v2",
+}
+
+# (connect, read) w sekundach
+DEFAULT_TIMEOUT = (5, 60)
+# Wysyłka części paczki (do 100 MB) potrzebuje dłuższego limitu odczytu
+UPLOAD_TIMEOUT = (5, 600)
+DEFAULT_POOL_SIZE = 20
+DEFAULT_RETRIES = 3
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Łączny limit zapytań do jednego środowiska KSeF (na proces), w zapytaniach na sekundę
+DEFAULT_ENVIRONMENT_RATE = 50
+DEFAULT_ENVIRONMENT_BURST = 100
+
+
+def get_base_url(environment):
+    """
+    Adres API KSeF dla środowiska. Ustawienie `KSEF_BASE_URL` (np. adres
+    lokalnego serwera testowego) nadpisuje adresy wszystkich środowisk.
+    """
+    override = getattr(settings, "KSEF_BASE_URL", None)
+    if override:
+        return override.rstrip("/")
+    return BASE_URLS.get(environment, BASE_URLS["production"])
+
+
+def _body_size(body):
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode("utf-8"))
+    try:
+        return len(body)
+    except TypeError:
+        return 0
+
+
+def _response_size(response, stream):
+    """Rozmiar odpowiedzi; dla odpowiedzi strumieniowych z nagłówka Content-Length."""
+    if stream:
+        return int(response.headers.get("Content-Length") or 0)
+    return len(response.content)
+
+
+def _retry_count(response):
+    """Liczba ponowień wykonanych przez urllib3 przed otrzymaniem odpowiedzi."""
+    retries = getattr(response.raw, "retries", None)
+    return len(retries.history) if retries is not None else 0
+
+
+class _KsefRetry(Retry):
+    """
+    Ponawia zapytania idempotentne po 429/5xx, a POST tylko po 429 - wtedy
+    KSeF na pewno nie przyjął żądania, więc nie grozi podwójna wysyłka.
+    To jedyna warstwa ponawiania 429/503 - `polling.poll` już ich nie powtarza.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429 and self.total:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class KsefTransport:
+    """
+    Współdzielone w procesie połączenia HTTP do jednego środowiska KSeF.
+
+    Jedna sesja `requests` z pulą połączeń keep-alive jest używana przez
+    wszystkich klientów (firmy) danego środowiska, więc uzgodnienie TLS
+    odbywa się raz na połączenie, a nie przy każdej fakturze.
+    """
+
+    def __init__(self, base_url, pool_size=None, retries=None, timeout=None):
+        self.base_url = base_url
+        self.timeout = timeout or getattr(settings, "KSEF_HTTP_TIMEOUT", DEFAULT_TIMEOUT)
+        pool_size = pool_size or getattr(settings, "KSEF_HTTP_POOL_SIZE", DEFAULT_POOL_SIZE)
+        if retries is None:
+            retries = getattr(settings, "KSEF_HTTP_RETRIES", DEFAULT_RETRIES)
+
+        retry = _KsefRetry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=RETRY_STATUS_CODES,
+            respect_retry_after_header=True,
+            # Po wyczerpaniu prób zwracamy ostatnią odpowiedź - błąd zgłosi raise_for_status()
+            raise_on_status=False,
+        )
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+        rate = getattr(settings, "KSEF_ENVIRONMENT_RATE_LIMIT", DEFAULT_ENVIRONMENT_RATE)
+        burst = getattr(settings, "KSEF_ENVIRONMENT_RATE_BURST", DEFAULT_ENVIRONMENT_BURST)
+        self.rate_limiter = TokenBucket(rate, burst) if rate else None
+
+    def request(self, method, url, timeout=None, **kwargs):
+        """Wykonuje zapytanie i zapisuje jego czas, status i rozmiary w metrykach."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        endpoint = endpoint_label(url, self.base_url)
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, url, timeout=timeout or self.timeout, **kwargs
+            )
+        except requests.exceptions.RequestException as e:
+            get_metrics().record_call(
+                method,
+                endpoint,
+                type(e).__name__,
+                time.perf_counter() - start,
+                request_bytes=_body_size(kwargs.get("data")),
+            )
+            raise
+
+        get_metrics().record_call(
+            method,
+            endpoint,
+            response.status_code,
+            time.perf_counter() - start,
+            request_bytes=_body_size(response.request.body),
+            response_bytes=_response_size(response, kwargs.get("stream", False)),
+            retries=_retry_count(response),
+        )
+        return response
+
+    def client_session(self):
+        """Sesja z własnymi nagłówkami (np. Authorization) dla jednego klienta."""
+        return KsefHttpSession(self)
+
+    def stats(self):
+        """
+        Liczniki połączeń: ile nowych połączeń otwarto, ile zapytań wysłano
+        i ile razy użyto już otwartego połączenia (keep-alive).
+        """
+        connections = requests_count = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            connections += pool.num_connections
+            requests_count += pool.num_requests
+        return {
+            "connections_opened": connections,
+            "requests": requests_count,
+            "connections_reused": max(requests_count - connections, 0),
+        }
+
+    def close(self):
+        self.session.close()
+
+
+class KsefHttpSession:
+    """
+    Lekka nakładka na współdzielony transport z nagłówkami jednego klienta.
+    Ma interfejs zbliżony do `requests.Session` (headers, get, post, put, request).
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.headers = {}
+
+    def request(self, method, url, headers=None, **kwargs):
+        merged_headers = dict(self.headers)
+        if headers:
+            merged_headers.update(headers)
+        return self.transport.request(method, url, headers=merged_headers, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(environment):
+    """Zwraca współdzielony transport HTTP dla środowiska KSeF."""
+    base_url = get_base_url(environment)
+    transport = _transports.get(base_url)
+    if transport is None:
+        with _transports_lock:
+            transport = _transports.get(base_url)
+            if transport is None:
+                transport = KsefTransport(base_url)
+                _transports[base_url] = transport
+                logger.debug(f"Utworzono transport HTTP KSeF dla {base_url}")
+    return transport
+
+
+def transport_stats():
+    """Liczniki połączeń wszystkich transportów, według adresu API."""
+    return {base_url: transport.stats() for base_url, transport in list(_transports.items())}
@@ -1,3 +1,33 @@
-from django.shortcuts import render
+# ksef/views.py
 
-# Create your views here.
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_http_methods
+
+from .metrics import get_metrics
+
+
+def _metrics_authorized(request):
+    """Dostęp mają zalogowani pracownicy lub scraper z tokenem `KSEF_METRICS_TOKEN`."""
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated and user.is_staff:
+        return True
+
+    token = getattr(settings, "KSEF_METRICS_TOKEN", None)
+    header = request.headers.get("Authorization", "")
+    if token and header.startswith("Bearer "):
+        return hmac.compare_digest(header[len("Bearer "):], token)
+    return False
+
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """Metryki wywołań API KSeF w formacie tekstowym Prometheusa."""
+    if not _metrics_authorized(request):
+        return HttpResponse("forbidden", content_type="text/plain", status=403)
+    return HttpResponse(
+        get_metrics().render_prometheus(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -1,20 +1,164 @@
 # kwasiucionek/moja-fakturownia/moja-fakturownia-a0f550ee045da0fa60a613fb7a8884b3052e00a0/ksef/xml_generator.py
 
+import base64
+import hashlib
+import io
+import logging
+import threading
 from datetime import datetime
-from decimal import Decimal
 
+from django.conf import settings
+from lxml import etree
 
-def _xml_escape(text):
-    """Prosta funkcja do escape'owania znaków specjalnych w XML."""
-    if text is None:
-        return ""
-    text = str(text)
-    text = text.replace("&", "&amp;")
-    text = text.replace("<", "&lt;")
-    text = text.replace(">", "&gt;")
-    text = text.replace('"', "&quot;")
-    text = text.replace("'", "&apos;")
-    return text
+logger = logging.getLogger(__name__)
+
+# Liczba faktur pobieranych z bazy w jednej porcji przez generate_invoices_xml
+DEFAULT_CHUNK_SIZE = 500
+
+FA_NAMESPACE = "http://crd.gov.pl/wzor/2023/06/29/12648/"
+
+_schema = None
+_schema_loaded = False
+_schema_lock = threading.Lock()
+
+
+class InvoiceXmlValidationError(Exception):
+    """Wygenerowany XML faktury nie jest zgodny ze schemą FA(3)."""
+
+
+def _q(tag):
+    """Nazwa elementu w przestrzeni nazw FA(3)."""
+    return f"{{{FA_NAMESPACE}}}{tag}"
+
+
+def _text(value):
+    return "" if value is None else str(value)
+
+
+def _write(xf, tag, value, attrib=None):
+    """Zapisuje prosty element z tekstem - lxml sam dba o escape'owanie."""
+    with xf.element(_q(tag), attrib or {}):
+        xf.write(_text(value))
+
+
+def get_fa3_schema():
+    """
+    Zwraca skompilowaną schemę FA(3) (`lxml.etree.XMLSchema`) wczytaną raz na proces.
+    Ścieżkę do pliku XSD wskazuje ustawienie `KSEF_FA3_XSD_PATH`; bez niego walidacja
+    jest pomijana i funkcja zwraca None.
+    """
+    global _schema, _schema_loaded
+    if _schema_loaded:
+        return _schema
+
+    with _schema_lock:
+        if not _schema_loaded:
+            xsd_path = getattr(settings, "KSEF_FA3_XSD_PATH", None)
+            if xsd_path:
+                _schema = etree.XMLSchema(etree.parse(str(xsd_path)))
+                logger.info(f"✓ Wczytano schemę FA(3): {xsd_path}")
+            else:
+                logger.warning("⚠ Brak KSEF_FA3_XSD_PATH - XML faktur nie będzie walidowany")
+            _schema_loaded = True
+    return _schema
+
+
+def validate_invoice_xml(xml_bytes):
+    """Sprawdza XML faktury ze schemą FA(3) (jeśli jest skonfigurowana)."""
+    schema = get_fa3_schema()
+    if schema is None:
+        return
+    document = etree.fromstring(xml_bytes)
+    if not schema.validate(document):
+        errors = "; ".join(
+            f"linia {error.line}: {error.message}" for error in list(schema.error_log)[:5]
+        )
+        raise InvoiceXmlValidationError(f"XML faktury niezgodny ze schemą FA(3): {errors}")
+
+
+def _write_address(xf, owner):
+    with xf.element(_q("Adres")):
+        _write(xf, "KodKraju", "PL")
+        _write(xf, "Ulica", owner.street)
+        _write(xf, "Miejscowosc", owner.city)
+        _write(xf, "KodPocztowy", owner.zip_code)
+
+
+def _write_invoice(xf, invoice):
+    company = invoice.user.companyinfo
+    contractor = invoice.contractor
+
+    with xf.element(_q("Faktura"), nsmap={None: FA_NAMESPACE}):
+        with xf.element(_q("Naglowek")):
+            _write(
+                xf,
+                "KodFormularza",
+                "FA",
+                {"kodSystemowy": "FA (3)", "wersjaSchemy": "1-0"},
+            )
+            _write(xf, "WariantFormularza", 3)
+            _write(xf, "DataWytworzeniaFa", datetime.now().isoformat())
+            _write(xf, "SystemInfo", "Moja Fakturownia")
+
+        with xf.element(_q("Podmiot1")):
+            with xf.element(_q("DaneIdentyfikacyjne")):
+                _write(xf, "NIP", company.tax_id.replace("-", ""))
+                _write(xf, "Nazwa", company.company_name)
+            _write_address(xf, company)
+
+        with xf.element(_q("Podmiot2")):
+            with xf.element(_q("DaneIdentyfikacyjne")):
+                _write(xf, "NIP", contractor.tax_id.replace("-", ""))
+                _write(xf, "Nazwa", contractor.name)
+            _write_address(xf, contractor)
+
+        with xf.element(_q("Fa")):
+            _write(xf, "KodWaluty", "PLN")
+            _write(xf, "P_1", invoice.issue_date.isoformat())
+            _write(xf, "P_2", invoice.invoice_number)
+            _write(xf, "P_6", invoice.sale_date.isoformat())
+
+            # Pozycje zapisywane są do strumienia jedna po drugiej
+            for i, item in enumerate(invoice.items.all(), 1):
+                with xf.element(_q("FaWiersz")):
+                    _write(xf, "NrWierszaFa", i)
+                    _write(xf, "P_7", item.name)
+                    _write(xf, "P_8A", item.unit)
+                    _write(xf, "P_8B", item.quantity)
+                    _write(xf, "P_9A", item.unit_price)
+                    _write(xf, "P_11", item.total_price)
+                    _write(xf, "P_12", "zw")
+
+            _write(xf, "P_13_7", invoice.total_amount)
+            _write(xf, "P_14_7", "0.00")
+            _write(xf, "P_15", invoice.total_amount)
+            with xf.element(_q("Adnotacje")):
+                _write(xf, "P_16", 2)
+                _write(xf, "P_17", 1)
+                _write(xf, "P_18", 1)
+                _write(xf, "P_18A", 2)
+                _write(xf, "P_22", 2)
+                _write(xf, "P_23", 2)
+            _write(xf, "RodzajFaktury", "VAT")
+
+
+def render_invoice_xml(invoice, validate=True) -> bytes:
+    """
+    Generuje XML faktury FA(3) jako bajty UTF-8.
+
+    Dane firmy, kontrahenta i pozycje są brane z `invoice.user.companyinfo`,
+    `invoice.contractor` i `invoice.items.all()` - dla faktur pobranych z
+    `select_related`/`prefetch_related` nie powoduje to dodatkowych zapytań.
+    """
+    buffer = io.BytesIO()
+    with etree.xmlfile(buffer, encoding="utf-8") as xf:
+        xf.write_declaration()
+        _write_invoice(xf, invoice)
+    xml_bytes = buffer.getvalue()
+
+    if validate:
+        validate_invoice_xml(xml_bytes)
+    return xml_bytes
 
 
 def generate_invoice_xml(invoice) -> str:
@@ -22,79 +166,28 @@ def generate_invoice_xml(invoice) -> str:
     Generuje fakturę w formacie XML zgodnym ze schemą FA(3).
     Usunięto adnotację typu ': Invoice', aby uniknąć NameError przy starcie aplikacji.
     """
-    # Import lokalny wewnątrz funkcji, aby przerwać cykl importów
-    from ksiegowosc.models import Invoice
+    return render_invoice_xml(invoice).decode("utf-8")
 
-    company = invoice.user.companyinfo
-    contractor = invoice.contractor
 
-    # --- Budowanie pozycji faktury ---
-    fa_wiersze_xml = ""
-    for i, item in enumerate(invoice.items.all(), 1):
-        fa_wiersze_xml += f"""
-        <FaWiersz>
-            <NrWierszaFa>{i}</NrWierszaFa>
-            <P_7>{_xml_escape(item.name)}</P_7>
-            <P_8A>{_xml_escape(item.unit)}</P_8A>
-            <P_8B>{item.quantity}</P_8B>
-            <P_9A>{item.unit_price}</P_9A>
-            <P_11>{item.total_price}</P_11>
-            <P_12>zw</P_12>
-        </FaWiersz>
-        """
-
-    # --- Główny szablon XML ---
-    xml_content = f"""<?xml version="1.0" encoding="UTF-8"?>
-<Faktura xmlns="http://crd.gov.pl/wzor/2023/06/29/12648/">
-    <Naglowek>
-        <KodFormularza kodSystemowy="FA (3)" wersjaSchemy="1-0">FA</KodFormularza>
-        <WariantFormularza>3</WariantFormularza>
-        <DataWytworzeniaFa>{datetime.now().isoformat()}</DataWytworzeniaFa>
-        <SystemInfo>Moja Fakturownia</SystemInfo>
-    </Naglowek>
-    <Podmiot1>
-        <DaneIdentyfikacyjne>
-            <NIP>{company.tax_id.replace("-", "")}</NIP>
-            <Nazwa>{_xml_escape(company.company_name)}</Nazwa>
-        </DaneIdentyfikacyjne>
-        <Adres>
-            <KodKraju>PL</KodKraju>
-            <Ulica>{_xml_escape(company.street)}</Ulica>
-            <Miejscowosc>{_xml_escape(company.city)}</Miejscowosc>
-            <KodPocztowy>{_xml_escape(company.zip_code)}</KodPocztowy>
-        </Adres>
-    </Podmiot1>
-    <Podmiot2>
-        <DaneIdentyfikacyjne>
-            <NIP>{contractor.tax_id.replace("-", "")}</NIP>
-            <Nazwa>{_xml_escape(contractor.name)}</Nazwa>
-        </DaneIdentyfikacyjne>
-        <Adres>
-            <KodKraju>PL</KodKraju>
-            <Ulica>{_xml_escape(contractor.street)}</Ulica>
-            <Miejscowosc>{_xml_escape(contractor.city)}</Miejscowosc>
-            <KodPocztowy>{_xml_escape(contractor.zip_code)}</KodPocztowy>
-        </Adres>
-    </Podmiot2>
-    <Fa>
-        <KodWaluty>PLN</KodWaluty>
-        <P_1>{invoice.issue_date.isoformat()}</P_1>
-        <P_2>{_xml_escape(invoice.invoice_number)}</P_2>
-        <P_6>{invoice.sale_date.isoformat()}</P_6>
-        {fa_wiersze_xml}
-        <P_13_7>{invoice.total_amount}</P_13_7>
-        <P_14_7>0.00</P_14_7>
-        <P_15>{invoice.total_amount}</P_15>
-        <Adnotacje>
-            <P_16>2</P_16>
-            <P_17>1</P_17>
-            <P_18>1</P_18>
-            <P_18A>2</P_18A>
-            <P_22>2</P_22>
-            <P_23>2</P_23>
-        </Adnotacje>
-        <RodzajFaktury>VAT</RodzajFaktury>
-    </Fa>
-</Faktura>
-"""
-    return xml_content
+def generate_invoices_xml(invoices, validate=True, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Generuje XML FA(3) dla wielu faktur, zwracając leniwie krotki
+    (invoice_id, xml_bytes, sha256), gdzie sha256 to skrót SHA-256 w Base64
+    (format wymagany przez KSeF).
+
+    Dla QuerySetu dane firmy, kontrahenta i pozycje pobierane są zbiorczo
+    (select_related + prefetch_related) w porcjach po `chunk_size` faktur,
+    więc liczba zapytań nie zależy od liczby faktur. Można też przekazać
+    listę faktur pobranych już z prefetchem.
+    """
+    if hasattr(invoices, "select_related"):
+        invoices = (
+            invoices.select_related("contractor", "user__companyinfo")
+            .prefetch_related("items")
+            .iterator(chunk_size=chunk_size)
+        )
+
+    for invoice in invoices:
+        xml_bytes = render_invoice_xml(invoice, validate=validate)
+        digest = base64.b64encode(hashlib.sha256(xml_bytes).digest()).decode()
+        yield invoice.pk, xml_bytes, digest
@@ -1,31 +1,34 @@
 # ksiegowosc/admin.py
 
-import json
-import xml.etree.ElementTree as ET
-from datetime import datetime, timedelta
-from decimal import Decimal, InvalidOperation
+from datetime import datetime
+from decimal import Decimal
 
 from django.contrib import admin, messages
 from django.db import transaction
-from django.db.models import Count, F, Max, Min, Q, Sum
-from django.db.models.functions import TruncMonth
-from django.http import HttpResponse, JsonResponse
+from django.db.models import Q, Sum
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from django.template.loader import render_to_string
 from django.urls import path, reverse
 from django.utils import timezone
 from django.utils.html import format_html
 
-# Import usług KSeF
-from ksef.services import send_invoice_to_ksef
+# Kolejka wysyłki KSeF
+from ksef.jobs import enqueue_invoices
 from weasyprint import HTML
 
+from .dashboard import build_dashboard
+from .import_jobs import enqueue_import, job_progress
+from .jpk import stream_jpk_fa
+from .rollups import overdue_totals, rollup_totals
+from .totals import deferred_totals
 from .models import (
     CompanyInfo,
     Contractor,
     ExpenseCategory,
     Invoice,
     InvoiceItem,
+    JpkImportJob,
     MonthlySettlement,
     Payment,
     PurchaseInvoice,
@@ -34,6 +37,15 @@ from .models import (
     ZUSRates,
 )
 
+
+def _requested_import_job(request):
+    """Import JPK wskazany w parametrze ?job= (tylko własne importy użytkownika)."""
+    job_id = request.GET.get("job")
+    if not job_id or not job_id.isdigit():
+        return None
+    return JpkImportJob.objects.filter(pk=job_id, user=request.user).first()
+
+
 # ==== CUSTOM FILTER DLA STATUSU PŁATNOŚCI ====
 
 
@@ -50,32 +62,19 @@ class PaymentStatusFilter(admin.SimpleListFilter):
         )
 
     def queryset(self, request, queryset):
-        today = timezone.now().date()
-
-        if self.value() == "paid":
-            return (
-                queryset.annotate(paid_sum=Sum("payments__amount"))
-                .filter(paid_sum__gte=F("total_amount"))
-                .distinct()
-            )
-
-        elif self.value() == "partial":
-            return (
-                queryset.annotate(paid_sum=Sum("payments__amount"))
-                .filter(paid_sum__gt=0, paid_sum__lt=F("total_amount"))
-                .distinct()
-            )
+        # Filtrowanie po zapisanych kolumnach (paid_amount, payment_status) z indeksami
+        # (user, payment_status) i (user, payment_date) - bez złączenia z płatnościami
+        if self.value() in ("paid", "partial"):
+            return queryset.filter(payment_status=self.value())
 
         elif self.value() == "overdue":
-            return (
-                queryset.filter(payment_date__lt=today)
-                .annotate(paid_sum=Sum("payments__amount"))
-                .exclude(paid_sum__gte=F("total_amount"))
-                .distinct()
+            return queryset.filter(payment_date__lt=timezone.now().date()).exclude(
+                payment_status="paid"
             )
 
         elif self.value() == "unpaid":
-            return queryset.filter(payments__isnull=True).distinct()
+            # Brak zrealizowanych wpłat - anulowane i zwrócone się nie liczą
+            return queryset.filter(payment_status__in=["unpaid", "overdue"])
 
         return queryset
 
@@ -277,6 +276,13 @@ class PaymentAdmin(admin.ModelAdmin):
             obj.user = request.user
         super().save_model(request, obj, form, change)
 
+    def delete_queryset(self, request, queryset):
+        # Usuwanie zbiorcze pomija Payment.delete() - przeliczamy zapłacone kwoty faktur
+        invoice_ids = set(queryset.values_list("invoice_id", flat=True))
+        super().delete_queryset(request, queryset)
+        for invoice in Invoice.objects.filter(pk__in=invoice_ids):
+            invoice.update_paid_amount()
+
 
 # ==== INLINES ====
 
@@ -471,17 +477,28 @@ class InvoiceAdmin(admin.ModelAdmin):
         selected_ids = selected_ids_str.split(',')
         queryset = Invoice.objects.filter(pk__in=selected_ids, user=request.user).filter(Q(ksef_status="draft") | Q(ksef_status="error"))
 
-        if not queryset.exists():
+        # Wysyłka odbywa się w tle (manage.py ksef_worker) - widok tylko dodaje zadania do kolejki.
+        # Blokada wierszy do końca transakcji: równoległe kliknięcie czeka, a potem widzi
+        # status "pending" i nie dodaje tych samych faktur do kolejki drugi raz.
+        with transaction.atomic():
+            claimed_ids = list(queryset.select_for_update().values_list("pk", flat=True))
+            if claimed_ids:
+                jobs = enqueue_invoices(Invoice.objects.filter(pk__in=claimed_ids))
+
+        if not claimed_ids:
             messages.info(request, "Wybrane faktury zostały już wysłane lub są w trakcie przetwarzania.")
             return redirect("admin:ksiegowosc_invoice_changelist")
 
-        for inv in queryset:
-            res = send_invoice_to_ksef(inv.id)
-            if res['success']:
-                messages.success(request, f"Faktura {inv.invoice_number}: {res['message']}")
-            else:
-                # Ta zmiana pozwoli Ci zobaczyć w alercie np. "Błąd 403: Brak uprawnienia do wystawiania faktur"
-                messages.error(request, f"BŁĄD Faktury {inv.invoice_number}: {res['message']}")
+        batch_count = sum(1 for job in jobs if job.batch_id)
+        if jobs and jobs[0].mode == "offline":
+            messages.success(
+                request,
+                f"Wystawiono {len(jobs)} faktur w trybie offline. Zostaną przesłane do KSeF automatycznie.",
+            )
+        elif batch_count:
+            messages.success(request, f"Dodano {len(jobs)} faktur do kolejki KSeF (sesja wsadowa).")
+        else:
+            messages.success(request, f"Dodano {len(jobs)} faktur do kolejki KSeF.")
 
         return redirect("admin:ksiegowosc_invoice_changelist")
 
@@ -502,36 +519,29 @@ class InvoiceAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
     def save_formset(self, request, form, formset, change):
-        instances = formset.save(commit=False)
-        for instance in instances:
-            if not hasattr(instance, "user") or not instance.user:
-                instance.user = request.user
-            instance.save()
-        formset.save_m2m()
+        # Kwota faktury jest przeliczana raz, po zapisie wszystkich pozycji
+        with deferred_totals():
+            instances = formset.save(commit=False)
+            for obj in formset.deleted_objects:
+                obj.delete()
+            for instance in instances:
+                if not hasattr(instance, "user") or not instance.user:
+                    instance.user = request.user
+                instance.save()
+            formset.save_m2m()
 
     def payments_report_view(self, request):
         today = timezone.now().date()
+        # Sumy z miesięcznych podsumowań - koszt zależy od liczby miesięcy, nie faktur
+        totals = rollup_totals(request.user)
+        overdue = overdue_totals(request.user, today)
         stats = {
-            "total_invoices": Invoice.objects.filter(user=request.user).count(),
-            "paid_invoices": Invoice.objects.filter(user=request.user)
-            .annotate(paid_sum=Sum("payments__amount"))
-            .filter(paid_sum__gte=F("total_amount"))
-            .distinct()
-            .count(),
-            "overdue_invoices": Invoice.objects.filter(
-                user=request.user, payment_date__lt=today
-            )
-            .annotate(paid_sum=Sum("payments__amount"))
-            .exclude(paid_sum__gte=F("total_amount"))
-            .count(),
-            "total_outstanding": Invoice.objects.filter(user=request.user).aggregate(
-                total=Sum("total_amount")
-            )["total"]
-            or 0,
-            "total_paid": Payment.objects.filter(
-                user=request.user, status="completed"
-            ).aggregate(total=Sum("amount"))["total"]
-            or 0,
+            "total_invoices": totals["invoice_count"],
+            "paid_invoices": totals["invoice_count"] - totals["open_count"],
+            "overdue_invoices": overdue["count"],
+            "overdue_amount": overdue["amount"],
+            "total_outstanding": totals["revenue"],
+            "total_paid": totals["paid_amount"],
         }
         stats["outstanding_balance"] = stats["total_outstanding"] - stats["total_paid"]
         recent_payments = (
@@ -541,8 +551,7 @@ class InvoiceAdmin(admin.ModelAdmin):
         )
         overdue_invoices = (
             Invoice.objects.filter(user=request.user, payment_date__lt=today)
-            .annotate(paid_sum=Sum("payments__amount"))
-            .exclude(paid_sum__gte=F("total_amount"))
+            .exclude(payment_status="paid")
             .select_related("contractor")[:10]
         )
         context = {
@@ -558,8 +567,7 @@ class InvoiceAdmin(admin.ModelAdmin):
         today = timezone.now().date()
         overdue_invoices = (
             Invoice.objects.filter(user=request.user, payment_date__lt=today)
-            .annotate(paid_sum=Sum("payments__amount"))
-            .exclude(paid_sum__gte=F("total_amount"))
+            .exclude(payment_status="paid")
             .select_related("contractor")
             .order_by("payment_date")
         )
@@ -595,39 +603,20 @@ class InvoiceAdmin(admin.ModelAdmin):
         )
         if request.method == "POST" and request.FILES.get("xml_file"):
             xml_file = request.FILES["xml_file"]
-            try:
-                if xml_file.size > 50 * 1024 * 1024:
-                    messages.error(request, "Plik za duży (max 50MB)")
-                    return render(
-                        request, "admin/ksiegowosc/invoice/import_jpk.html", context
-                    )
-                if not xml_file.name.lower().endswith(".xml"):
-                    messages.error(request, "Nieprawidłowe rozszerzenie pliku")
-                    return render(
-                        request, "admin/ksiegowosc/invoice/import_jpk.html", context
-                    )
-                with transaction.atomic():
-                    created_invoices, import_warnings = self.parse_jpk_file(
-                        xml_file, request.user
-                    )
-                if created_invoices:
-                    messages.success(
-                        request,
-                        f"Pomyślnie zaimportowano {len(created_invoices)} faktur.",
-                    )
-                    if any(inv.is_correction for inv, _ in created_invoices):
-                        messages.warning(
-                            request,
-                            "IMPORT KOREKTY: Automatycznie powiązano pozycje. Prosimy o weryfikację poprawności w edytorze faktury.",
-                        )
-                else:
-                    messages.info(request, "Nie zaimportowano żadnych nowych faktur.")
-                if import_warnings:
-                    context["import_warnings"] = import_warnings
-            except ValueError as e:
-                messages.error(request, str(e))
-            except Exception as e:
-                messages.error(request, f"Nieoczekiwany błąd: {str(e)}")
+            if xml_file.size > 50 * 1024 * 1024:
+                messages.error(request, "Plik za duży (max 50MB)")
+            elif not xml_file.name.lower().endswith(".xml"):
+                messages.error(request, "Nieprawidłowe rozszerzenie pliku")
+            else:
+                job = enqueue_import(request.user, "fa", xml_file)
+                messages.info(
+                    request,
+                    "Plik został przyjęty. Import trwa w tle - postęp widać poniżej.",
+                )
+                return redirect(
+                    f"{reverse('admin:ksiegowosc_invoice_import_jpk')}?job={job.pk}"
+                )
+        context["import_job"] = _requested_import_job(request)
         return render(request, "admin/ksiegowosc/invoice/import_jpk.html", context)
 
     def export_jpk_view(self, request):
@@ -646,10 +635,6 @@ class InvoiceAdmin(admin.ModelAdmin):
                 request, "Wybrane faktury nie zostały znalezione.", level=messages.ERROR
             )
             return redirect("admin:ksiegowosc_invoice_changelist")
-        response = HttpResponse(content_type="application/xml; charset=utf-8")
-        response["Content-Disposition"] = (
-            f'attachment; filename="jpk_fa_wybrane_{datetime.now().strftime("%Y_%m_%d")}.xml"'
-        )
         try:
             company_info = CompanyInfo.objects.get(user=request.user)
         except CompanyInfo.DoesNotExist:
@@ -659,399 +644,15 @@ class InvoiceAdmin(admin.ModelAdmin):
                 level=messages.ERROR,
             )
             return redirect("admin:ksiegowosc_invoice_changelist")
-        ns = {
-            "tns": "http://jpk.mf.gov.pl/wzor/2022/02/17/02171/",
-            "etd": "http://crd.gov.pl/xml/schematy/dziedzinowe/mf/2022/01/05/eD/DefinicjeTypy/",
-        }
-        ET.register_namespace("tns", ns["tns"])
-        ET.register_namespace("etd", ns["etd"])
-        root = ET.Element(f"{{{ns['tns']}}}JPK")
-        daty = queryset.aggregate(
-            min_date=Min("issue_date"), max_date=Max("issue_date")
-        )
-        data_od = daty["min_date"].strftime("%Y-%m-%d") if daty["min_date"] else ""
-        data_do = daty["max_date"].strftime("%Y-%m-%d") if daty["max_date"] else ""
-        header = ET.SubElement(root, f"{{{ns['tns']}}}Naglowek")
-        ET.SubElement(
-            header,
-            f"{{{ns['tns']}}}KodFormularza",
-            attrib={"kodSystemowy": "JPK_FA (4)", "wersjaSchemy": "1-0"},
-        ).text = "JPK_FA"
-        ET.SubElement(header, f"{{{ns['tns']}}}WariantFormularza").text = "4"
-        ET.SubElement(
-            header, f"{{{ns['tns']}}}DataWytworzeniaJPK"
-        ).text = datetime.now().isoformat()
-        if data_od and data_do:
-            ET.SubElement(header, f"{{{ns['tns']}}}DataOd").text = data_od
-            ET.SubElement(header, f"{{{ns['tns']}}}DataDo").text = data_do
-        ET.SubElement(header, f"{{{ns['tns']}}}NazwaSystemu").text = "Fakturownia App"
-        ET.SubElement(header, f"{{{ns['tns']}}}CelZlozenia").text = "1"
-        ET.SubElement(header, f"{{{ns['tns']}}}KodUrzędu").text = (
-            company_info.kod_urzedu or ""
-        )
-        podmiot = ET.SubElement(root, f"{{{ns['tns']}}}Podmiot1")
-        identyfikator = ET.SubElement(podmiot, f"{{{ns['tns']}}}IdentyfikatorPodmiotu")
-        ET.SubElement(
-            identyfikator, f"{{{ns['tns']}}}NIP"
-        ).text = company_info.tax_id.replace("-", "")
-        ET.SubElement(
-            identyfikator, f"{{{ns['tns']}}}PelnaNazwa"
-        ).text = company_info.company_name
-        adres_podmiotu = ET.SubElement(podmiot, f"{{{ns['tns']}}}AdresPodmiotu")
-        ET.SubElement(adres_podmiotu, f"{{{ns['etd']}}}KodKraju").text = "PL"
-        ET.SubElement(adres_podmiotu, f"{{{ns['etd']}}}Wojewodztwo").text = (
-            company_info.voivodeship or ""
-        )
-        ET.SubElement(adres_podmiotu, f"{{{ns['etd']}}}Ulica").text = (
-            company_info.street or ""
+        response = StreamingHttpResponse(
+            stream_jpk_fa(queryset, company_info),
+            content_type="application/xml; charset=utf-8",
         )
-        ET.SubElement(adres_podmiotu, f"{{{ns['etd']}}}Miejscowosc").text = (
-            company_info.city or ""
-        )
-        ET.SubElement(adres_podmiotu, f"{{{ns['etd']}}}KodPocztowy").text = (
-            company_info.zip_code or ""
+        response["Content-Disposition"] = (
+            f'attachment; filename="jpk_fa_wybrane_{datetime.now().strftime("%Y_%m_%d")}.xml"'
         )
-        for invoice in queryset:
-            faktura = ET.SubElement(
-                root, f"{{{ns['tns']}}}Faktura", attrib={"typ": "G"}
-            )
-            ET.SubElement(faktura, f"{{{ns['tns']}}}KodWaluty").text = "PLN"
-            ET.SubElement(
-                faktura, f"{{{ns['tns']}}}P_1"
-            ).text = invoice.issue_date.strftime("%Y-%m-%d")
-            ET.SubElement(faktura, f"{{{ns['tns']}}}P_2A").text = invoice.invoice_number
-            ET.SubElement(
-                faktura, f"{{{ns['tns']}}}P_3A"
-            ).text = invoice.contractor.name
-            ET.SubElement(
-                faktura, f"{{{ns['tns']}}}P_3B"
-            ).text = f"{invoice.contractor.street}, {invoice.contractor.zip_code} {invoice.contractor.city}"
-            ET.SubElement(
-                faktura, f"{{{ns['tns']}}}P_3C"
-            ).text = company_info.company_name
-            ET.SubElement(
-                faktura, f"{{{ns['tns']}}}P_3D"
-            ).text = company_info.get_full_address()
-            ET.SubElement(
-                faktura, f"{{{ns['tns']}}}P_4B"
-            ).text = company_info.tax_id.replace("-", "")
-            ET.SubElement(
-                faktura, f"{{{ns['tns']}}}P_5B"
-            ).text = invoice.contractor.tax_id.replace("-", "")
-            ET.SubElement(
-                faktura, f"{{{ns['tns']}}}P_6"
-            ).text = invoice.sale_date.strftime("%Y-%m-%d")
-            ET.SubElement(faktura, f"{{{ns['tns']}}}P_13_7").text = str(
-                invoice.total_amount
-            )
-            ET.SubElement(faktura, f"{{{ns['tns']}}}P_15").text = str(
-                invoice.total_amount
-            )
-            if invoice.is_correction:
-                ET.SubElement(faktura, f"{{{ns['tns']}}}RodzajFaktury").text = "KOREKTA"
-                ET.SubElement(
-                    faktura, f"{{{ns['tns']}}}PrzyczynaKorekty"
-                ).text = invoice.correction_reason
-                if invoice.corrected_invoice:
-                    ET.SubElement(
-                        faktura, f"{{{ns['tns']}}}NrFaKorygowanej"
-                    ).text = invoice.corrected_invoice.invoice_number
-            else:
-                ET.SubElement(faktura, f"{{{ns['tns']}}}RodzajFaktury").text = "VAT"
-            for item in invoice.items.all():
-                wiersz = ET.SubElement(root, f"{{{ns['tns']}}}FakturaWiersz")
-                ET.SubElement(
-                    wiersz, f"{{{ns['tns']}}}P_2B"
-                ).text = invoice.invoice_number
-                ET.SubElement(wiersz, f"{{{ns['tns']}}}P_7").text = item.name
-                ET.SubElement(wiersz, f"{{{ns['tns']}}}P_8A").text = str(item.quantity)
-                ET.SubElement(wiersz, f"{{{ns['tns']}}}P_8B").text = item.unit
-                ET.SubElement(wiersz, f"{{{ns['tns']}}}P_9A").text = str(
-                    item.unit_price
-                )
-                ET.SubElement(wiersz, f"{{{ns['tns']}}}P_11").text = str(
-                    item.total_price
-                )
-                ET.SubElement(wiersz, f"{{{ns['tns']}}}P_12").text = "zw"
-        tree = ET.ElementTree(root)
-        ET.indent(tree, space="\t", level=0)
-        tree.write(response, encoding="utf-8", xml_declaration=True)
         return response
 
-    def parse_jpk_file(self, xml_file, user):
-        try:
-            xml_content = xml_file.read()
-            if isinstance(xml_content, bytes):
-                try:
-                    xml_content = xml_content.decode("utf-8")
-                except UnicodeDecodeError:
-                    try:
-                        xml_content = xml_content.decode("windows-1250")
-                    except UnicodeDecodeError:
-                        xml_content = xml_content.decode("iso-8859-2")
-            if "JPK" not in xml_content and "Faktura" not in xml_content:
-                raise ValueError("Plik nie zawiera danych JPK_FA")
-            root = ET.fromstring(xml_content)
-            namespaces = [
-                {"tns": "http://jpk.mf.gov.pl/wzor/2022/02/17/02171/"},
-                {"tns": "http://jpk.mf.gov.pl/wzor/2021/03/09/03091/"},
-                {"tns": "http://jpk.mf.gov.pl/wzor/2020/03/09/03091/"},
-                {"": ""},
-            ]
-            faktury_nodes = []
-            ns = None
-            for test_ns in namespaces:
-                if "tns" in test_ns:
-                    faktury_nodes = root.findall("tns:Faktura", test_ns)
-                else:
-                    faktury_nodes = root.findall(".//Faktura")
-                if faktury_nodes:
-                    ns = test_ns
-                    break
-            if not faktury_nodes:
-                raise ValueError("Nie znaleziono elementów 'Faktura' w pliku JPK")
-            all_invoice_items = self.collect_all_invoice_items(root, ns)
-            return self.process_faktury_nodes(
-                faktury_nodes, ns, user, all_invoice_items
-            )
-        except ET.ParseError as e:
-            raise ValueError(f"Błąd parsowania XML: {str(e)}")
-
-    def collect_all_invoice_items(self, root, ns):
-        all_items = {}
-
-        def get_text(node, paths):
-            if not isinstance(paths, list):
-                paths = [paths]
-            for path in paths:
-                if "tns" in ns and ns["tns"]:
-                    found_node = node.find(f"tns:{path}", ns)
-                else:
-                    found_node = node.find(path)
-                if found_node is not None and found_node.text:
-                    return found_node.text.strip()
-            return None
-
-        if "tns" in ns and ns["tns"]:
-            item_nodes = root.findall("tns:FakturaWiersz", ns)
-        else:
-            item_nodes = root.findall(".//FakturaWiersz")
-        for item_node in item_nodes:
-            invoice_number = get_text(item_node, ["P_2B", "2B"])
-            if invoice_number:
-                if invoice_number not in all_items:
-                    all_items[invoice_number] = []
-                item_data = {
-                    "name": get_text(item_node, ["P_7", "7"]) or "Usługa",
-                    "unit": get_text(item_node, ["P_8A", "8A"]) or "szt.",
-                    "quantity": get_text(item_node, ["P_8B", "8B"]) or "1.00",
-                    "unit_price": get_text(item_node, ["P_9B", "9B"]) or "0.00",
-                    "total_price": get_text(item_node, ["P_11A", "11A"]) or "0.00",
-                }
-                all_items[invoice_number].append(item_data)
-        return all_items
-
-    def process_faktury_nodes(self, faktury_nodes, ns, user, all_invoice_items):
-        def get_text(node, paths):
-            if not isinstance(paths, list):
-                paths = [paths]
-            for path in paths:
-                if "tns" in ns and ns["tns"]:
-                    found_node = node.find(f"tns:{path}", ns)
-                else:
-                    found_node = node.find(path)
-                if found_node is not None and found_node.text:
-                    return found_node.text.strip()
-            return None
-
-        def parse_date(date_str):
-            if not date_str:
-                return datetime.now().date()
-            try:
-                return datetime.strptime(date_str, "%Y-%m-%d").date()
-            except ValueError:
-                try:
-                    return datetime.strptime(date_str, "%d-%m-%Y").date()
-                except ValueError:
-                    return datetime.now().date()
-
-        def parse_decimal(value_str):
-            if not value_str:
-                return Decimal("0.00")
-            try:
-                return Decimal(value_str.replace(",", ".").replace(" ", ""))
-            except (InvalidOperation, ValueError):
-                return Decimal("0.00")
-
-        created_invoices = []
-        import_warnings = []
-        temp_invoice_counter = 0
-        for faktura_node in faktury_nodes:
-            try:
-                invoice_number = get_text(faktura_node, ["P_2A", "2A", "NrFaktury"])
-                buyer_nip = get_text(faktura_node, ["P_5B", "5B", "NIP"])
-                buyer_name = get_text(faktura_node, ["P_3A", "3A", "Nazwa"])
-                issue_date_str = get_text(faktura_node, ["P_1", "1", "DataWystawienia"])
-                sale_date_str = get_text(faktura_node, ["P_6", "6", "DataSprzedazy"])
-                total_amount_str = get_text(faktura_node, ["P_15", "WartoscBrutto"])
-                notes_from_jpk = ""
-                if not invoice_number:
-                    temp_invoice_counter += 1
-                    invoice_number = f"TEMP_JPK_{timezone.now().strftime('%Y%m%d%H%M%S')}_{temp_invoice_counter}"
-                    notes_from_jpk = "Numer faktury został wygenerowany automatycznie podczas importu JPK."
-                    import_warnings.append(
-                        f"Faktura bez numeru: nadano tymczasowy numer '{invoice_number}'."
-                    )
-                if Invoice.objects.filter(
-                    invoice_number=invoice_number, user=user
-                ).exists():
-                    import_warnings.append(
-                        f"Pominięto: Faktura o numerze '{invoice_number}' już istnieje w systemie."
-                    )
-                    continue
-                if buyer_nip:
-                    contractor, created = Contractor.objects.get_or_create(
-                        tax_id=buyer_nip,
-                        user=user,
-                        defaults={"name": buyer_name or "Brak nazwy w JPK"},
-                    )
-                else:
-                    if not buyer_name:
-                        import_warnings.append(
-                            f"Pominięto fakturę (prawdopodobnie '{invoice_number}'): brak NIP i nazwy kontrahenta."
-                        )
-                        continue
-                    contractor, created = Contractor.objects.get_or_create(
-                        name=buyer_name, tax_id=None, user=user
-                    )
-                    if created:
-                        import_warnings.append(
-                            f"Utworzono nowego kontrahenta '{buyer_name}' bez numeru NIP."
-                        )
-                issue_date = parse_date(issue_date_str)
-                sale_date = parse_date(sale_date_str) if sale_date_str else issue_date
-                total_amount = parse_decimal(total_amount_str)
-                is_correction = False
-                correction_reason = None
-                corrected_invoice = None
-                original_items = []
-                rodzaj_node = faktura_node.find(
-                    "tns:RodzajFaktury" if "tns" in ns else "RodzajFaktury", ns
-                )
-                if (
-                    rodzaj_node is not None
-                    and "KOREKTA" in (rodzaj_node.text or "").upper()
-                ):
-                    is_correction = True
-                    correction_reason = (
-                        get_text(
-                            faktura_node, ["PrzyczynaKorekty", "tns:PrzyczynaKorekty"]
-                        )
-                        or "Korekta faktury"
-                    )
-                    corrected_invoice_number = get_text(
-                        faktura_node, ["NrFaKorygowanej", "tns:NrFaKorygowanej"]
-                    )
-                    if corrected_invoice_number:
-                        try:
-                            corrected_invoice = Invoice.objects.get(
-                                invoice_number=corrected_invoice_number, user=user
-                            )
-                            original_items = list(
-                                corrected_invoice.items.all().order_by("pk")
-                            )
-                        except Invoice.DoesNotExist:
-                            correction_reason += f" (Faktura korygowana {corrected_invoice_number} nie istnieje w systemie)"
-                            import_warnings.append(
-                                f"Korekta '{invoice_number}': nie znaleziono w bazie faktury korygowanej {corrected_invoice_number}."
-                            )
-                invoice = Invoice.objects.create(
-                    user=user,
-                    invoice_number=invoice_number,
-                    issue_date=issue_date,
-                    sale_date=sale_date,
-                    contractor=contractor,
-                    total_amount=total_amount,
-                    is_correction=is_correction,
-                    correction_reason=correction_reason,
-                    corrected_invoice=corrected_invoice,
-                    payment_method="przelew",
-                    notes=notes_from_jpk,
-                )
-                correction_items_data = all_invoice_items.get(invoice_number, [])
-                items_created = self.create_invoice_items_from_collected_data(
-                    invoice,
-                    user,
-                    correction_items_data,
-                    original_items if is_correction else [],
-                )
-                if items_created == 0 and total_amount > 0:
-                    InvoiceItem.objects.create(
-                        user=user,
-                        invoice=invoice,
-                        name="Usługi (import z JPK)",
-                        quantity=Decimal("1.00"),
-                        unit="szt.",
-                        unit_price=total_amount,
-                        total_price=total_amount,
-                    )
-                    items_created = 1
-                if invoice.total_amount != total_amount:
-                    invoice.total_amount = total_amount
-                    invoice.save(update_fields=["total_amount"])
-                created_invoices.append((invoice, items_created))
-            except Exception as e:
-                import_warnings.append(
-                    f"Błąd krytyczny przy przetwarzaniu faktury: {str(e)}"
-                )
-                continue
-        return created_invoices, import_warnings
-
-    def create_invoice_items_from_collected_data(
-        self, invoice, user, items_data, original_items=None
-    ):
-        if original_items is None:
-            original_items = []
-        items_created = 0
-
-        def parse_decimal(value_str):
-            if not value_str:
-                return Decimal("0.00")
-            try:
-                return Decimal(value_str.replace(",", ".").replace(" ", ""))
-            except (InvalidOperation, ValueError):
-                return Decimal("0.00")
-
-        for idx, item_data in enumerate(items_data):
-            try:
-                quantity = parse_decimal(item_data["quantity"])
-                unit_price = parse_decimal(item_data["unit_price"])
-                total_price = parse_decimal(item_data["total_price"])
-                if total_price == 0 and quantity > 0 and unit_price > 0:
-                    total_price = quantity * unit_price
-                if unit_price == 0 and total_price > 0 and quantity > 0:
-                    unit_price = total_price / quantity
-                if quantity == 0:
-                    quantity = Decimal("1.00")
-                if total_price == 0:
-                    total_price = unit_price
-                new_item = InvoiceItem.objects.create(
-                    user=user,
-                    invoice=invoice,
-                    name=item_data["name"] or "Usługa",
-                    quantity=quantity,
-                    unit=item_data["unit"] or "szt.",
-                    unit_price=unit_price,
-                    total_price=total_price,
-                )
-                if original_items and idx < len(original_items):
-                    new_item.corrected_item = original_items[idx]
-                    new_item.save()
-                items_created += 1
-            except Exception as e:
-                continue
-        return items_created
-
     def generate_pdf_view(self, request, object_id):
         queryset = self.get_queryset(request)
         try:
@@ -1128,397 +729,35 @@ class MonthlySettlementAdmin(admin.ModelAdmin):
         )
         if request.method == "POST" and request.FILES.get("xml_file"):
             xml_file = request.FILES["xml_file"]
-            try:
-                if xml_file.size > 50 * 1024 * 1024:
-                    messages.error(
-                        request, "Plik jest za duży (maksymalny rozmiar to 50MB)."
-                    )
-                    return render(
-                        request,
-                        "admin/ksiegowosc/monthlysettlement/import_jpk_ewp.html",
-                        context,
-                    )
-                if not xml_file.name.lower().endswith(".xml"):
-                    messages.error(
-                        request,
-                        "Nieprawidłowe rozszerzenie pliku. Wymagany jest plik .xml.",
-                    )
-                    return render(
-                        request,
-                        "admin/ksiegowosc/monthlysettlement/import_jpk_ewp.html",
-                        context,
-                    )
-                with transaction.atomic():
-                    created_count, updated_count, warnings = self.parse_jpk_ewp_file(
-                        xml_file, request.user
-                    )
-                if created_count or updated_count:
-                    messages.success(
-                        request,
-                        f"Import zakończony pomyślnie. Utworzono: {created_count}, zaktualizowano: {updated_count} rozliczeń.",
-                    )
-                else:
-                    messages.info(
-                        request, "Nie znaleziono nowych danych do importu w pliku."
-                    )
-                for warning in warnings:
-                    messages.add_message(request, messages.WARNING, warning)
-                return redirect("admin:ksiegowosc_monthlysettlement_changelist")
-            except ValueError as e:
-                messages.error(request, str(e))
-            except Exception as e:
+            if xml_file.size > 50 * 1024 * 1024:
+                messages.error(
+                    request, "Plik jest za duży (maksymalny rozmiar to 50MB)."
+                )
+            elif not xml_file.name.lower().endswith(".xml"):
                 messages.error(
                     request,
-                    f"Wystąpił nieoczekiwany błąd podczas przetwarzania pliku: {str(e)}",
+                    "Nieprawidłowe rozszerzenie pliku. Wymagany jest plik .xml.",
+                )
+            else:
+                job = enqueue_import(request.user, "ewp", xml_file)
+                messages.info(
+                    request,
+                    "Plik został przyjęty. Import trwa w tle - postęp widać poniżej.",
+                )
+                return redirect(
+                    f"{reverse('admin:ksiegowosc_monthlysettlement_import_jpk_ewp')}?job={job.pk}"
                 )
+        context["import_job"] = _requested_import_job(request)
         return render(
             request, "admin/ksiegowosc/monthlysettlement/import_jpk_ewp.html", context
         )
 
-    def parse_jpk_ewp_file(self, xml_file, user):
-        try:
-            xml_content = xml_file.read()
-            if isinstance(xml_content, bytes):
-                try:
-                    xml_content = xml_content.decode("utf-8")
-                except UnicodeDecodeError:
-                    try:
-                        xml_content = xml_content.decode("windows-1250")
-                    except UnicodeDecodeError:
-                        xml_content = xml_content.decode("iso-8859-2")
-            if "JPK" not in xml_content:
-                raise ValueError("Plik nie wygląda na plik JPK.")
-            root = ET.fromstring(xml_content)
-            namespaces = {"tns": "http://jpk.mf.gov.pl/wzor/2022/02/01/02011/"}
-            ewp_wiersze = root.findall("tns:EWPWiersz", namespaces)
-            if not ewp_wiersze:
-                raise ValueError("Nie znaleziono żadnych wpisów w pliku JPK_EWP.")
-            monthly_revenues = {}
-            for wiersz in ewp_wiersze:
-                date_str = wiersz.find("tns:K_2", namespaces).text
-                date = datetime.strptime(date_str, "%Y-%m-%d").date()
-                year_month = (date.year, date.month)
-                revenue = Decimal(wiersz.find("tns:K_7", namespaces).text) + Decimal(
-                    wiersz.find("tns:K_11", namespaces).text
-                )
-                if year_month not in monthly_revenues:
-                    monthly_revenues[year_month] = Decimal("0.00")
-                monthly_revenues[year_month] += revenue
-            created_count = 0
-            updated_count = 0
-            for (year, month), total_revenue in monthly_revenues.items():
-                settlement, created = MonthlySettlement.objects.update_or_create(
-                    user=user,
-                    year=year,
-                    month=month,
-                    defaults={
-                        "total_revenue": total_revenue,
-                        "health_insurance_paid": 0,
-                        "social_insurance_paid": 0,
-                        "labor_fund_paid": 0,
-                        "income_tax_payable": 0,
-                    },
-                )
-                if created:
-                    created_count += 1
-                else:
-                    updated_count += 1
-            warnings = [
-                "Pamiętaj, aby uzupełnić informacje o zapłaconych składkach ZUS dla zaimportowanych miesięcy."
-            ]
-            return created_count, updated_count, warnings
-        except ET.ParseError as e:
-            raise ValueError(f"Błąd parsowania XML: {str(e)}")
-
     def dashboard_view(self, request):
         context = {
             "opts": self.model._meta,
             "title": "Dashboard - Podsumowanie działalności",
-            "current_year": datetime.now().year,
-            "current_month": datetime.now().month,
         }
-        current_year = datetime.now().year
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=365)
-        today = timezone.now().date()
-        current_yearly_settlement = YearlySettlement.objects.filter(
-            user=request.user, year=current_year
-        ).first()
-        current_year_summary = {
-            "total_revenue": Invoice.objects.filter(
-                user=request.user, issue_date__year=current_year
-            ).aggregate(total=Sum("total_amount"))["total"]
-            or Decimal("0"),
-            "total_social_insurance": MonthlySettlement.objects.filter(
-                user=request.user, year=current_year
-            ).aggregate(total=Sum("social_insurance_paid"))["total"]
-            or Decimal("0"),
-            "total_health_insurance": MonthlySettlement.objects.filter(
-                user=request.user, year=current_year
-            ).aggregate(total=Sum("health_insurance_paid"))["total"]
-            or Decimal("0"),
-            "total_labor_fund": MonthlySettlement.objects.filter(
-                user=request.user, year=current_year
-            ).aggregate(total=Sum("labor_fund_paid"))["total"]
-            or Decimal("0"),
-            "total_monthly_tax": MonthlySettlement.objects.filter(
-                user=request.user, year=current_year
-            ).aggregate(total=Sum("income_tax_payable"))["total"]
-            or Decimal("0"),
-        }
-        tax_base = (
-            current_year_summary["total_revenue"]
-            - current_year_summary["total_social_insurance"]
-        )
-        tax_base_after_health = tax_base - (
-            current_year_summary["total_health_insurance"] / 2
-        )
-        if tax_base_after_health < 0:
-            tax_base_after_health = Decimal("0")
-        company_info = CompanyInfo.objects.filter(user=request.user).first()
-        tax_rate = Decimal("14.0")
-        if company_info and company_info.lump_sum_rate:
-            tax_rate = Decimal(company_info.lump_sum_rate)
-        projected_yearly_tax = (tax_base_after_health * tax_rate / 100).quantize(
-            Decimal("0.01")
-        )
-        projected_difference = (
-            projected_yearly_tax - current_year_summary["total_monthly_tax"]
-        )
-        current_year_summary.update(
-            {
-                "tax_base": tax_base,
-                "tax_base_after_health": tax_base_after_health,
-                "projected_yearly_tax": projected_yearly_tax,
-                "projected_difference": projected_difference,
-                "tax_rate": tax_rate,
-            }
-        )
-        context["current_year_summary"] = current_year_summary
-        context["current_yearly_settlement"] = current_yearly_settlement
-        context["company_info"] = company_info
-        payment_stats = {
-            "total_outstanding": Invoice.objects.filter(user=request.user).aggregate(
-                total=Sum("total_amount")
-            )["total"]
-            or Decimal("0"),
-            "total_paid": Payment.objects.filter(
-                user=request.user, status="completed"
-            ).aggregate(total=Sum("amount"))["total"]
-            or Decimal("0"),
-            "overdue_count": Invoice.objects.filter(
-                user=request.user, payment_date__lt=today
-            )
-            .annotate(paid_sum=Sum("payments__amount"))
-            .exclude(paid_sum__gte=F("total_amount"))
-            .count(),
-        }
-        payment_stats["balance_due"] = (
-            payment_stats["total_outstanding"] - payment_stats["total_paid"]
-        )
-        previous_year = current_year - 1
-        previous_year_data = {
-            "total_revenue": Invoice.objects.filter(
-                user=request.user, issue_date__year=previous_year
-            ).aggregate(total=Sum("total_amount"))["total"]
-            or Decimal("0"),
-            "total_tax_paid": MonthlySettlement.objects.filter(
-                user=request.user, year=previous_year
-            ).aggregate(total=Sum("income_tax_payable"))["total"]
-            or Decimal("0"),
-        }
-        revenue_change = 0
-        tax_change = 0
-        if previous_year_data["total_revenue"] > 0:
-            revenue_change = (
-                (
-                    current_year_summary["total_revenue"]
-                    - previous_year_data["total_revenue"]
-                )
-                / previous_year_data["total_revenue"]
-                * 100
-            )
-        if previous_year_data["total_tax_paid"] > 0:
-            tax_change = (
-                (
-                    current_year_summary["total_monthly_tax"]
-                    - previous_year_data["total_tax_paid"]
-                )
-                / previous_year_data["total_tax_paid"]
-                * 100
-            )
-        context["previous_year_data"] = previous_year_data
-        context["revenue_change"] = revenue_change
-        context["tax_change"] = tax_change
-        start_of_year = datetime(current_year, 1, 1)
-        end_of_year = datetime(current_year, 12, 31)
-        days_in_year = (end_of_year - start_of_year).days + 1
-        days_passed = (datetime.now() - start_of_year).days + 1
-        year_progress = (days_passed / days_in_year) * 100
-        if days_passed > 0:
-            daily_revenue = current_year_summary["total_revenue"] / days_passed
-            projected_end_year_revenue = daily_revenue * days_in_year
-            daily_tax = current_year_summary["total_monthly_tax"] / days_passed
-            projected_end_year_tax = daily_tax * days_in_year
-        else:
-            projected_end_year_revenue = current_year_summary["total_revenue"]
-            projected_end_year_tax = current_year_summary["total_monthly_tax"]
-        context["year_progress"] = {
-            "percentage": round(year_progress, 1),
-            "days_passed": days_passed,
-            "days_total": days_in_year,
-            "projected_end_year_revenue": projected_end_year_revenue,
-            "projected_end_year_tax": projected_end_year_tax,
-        }
-        monthly_tax_base, tax_base_labels = [], []
-        for month in range(1, 13):
-            monthly_revenue = Invoice.objects.filter(
-                user=request.user,
-                issue_date__year=current_year,
-                issue_date__month=month,
-            ).aggregate(total=Sum("total_amount"))["total"] or Decimal("0")
-            monthly_social = MonthlySettlement.objects.filter(
-                user=request.user, year=current_year, month=month
-            ).aggregate(total=Sum("social_insurance_paid"))["total"] or Decimal("0")
-            base = monthly_revenue - monthly_social
-            monthly_tax_base.append(float(base))
-            tax_base_labels.append(f"{month:02d}/{current_year}")
-        context["tax_base_chart"] = {
-            "labels": json.dumps(tax_base_labels),
-            "data": json.dumps(monthly_tax_base),
-        }
-        years_comparison, comparison_labels = [], []
-        for year in range(current_year - 2, current_year + 1):
-            yearly_revenue = Invoice.objects.filter(
-                user=request.user, issue_date__year=year
-            ).aggregate(total=Sum("total_amount"))["total"] or Decimal("0")
-            years_comparison.append(float(yearly_revenue))
-            comparison_labels.append(str(year))
-        context["years_comparison_chart"] = {
-            "labels": json.dumps(comparison_labels),
-            "data": json.dumps(years_comparison),
-        }
-        monthly_revenue_qs = (
-            Invoice.objects.filter(user=request.user, issue_date__gte=start_date)
-            .annotate(month=TruncMonth("issue_date"))
-            .values("month")
-            .annotate(total=Sum("total_amount"))
-            .order_by("month")
-        )
-        revenue_labels, revenue_data = [], []
-        for item in monthly_revenue_qs:
-            revenue_labels.append(item["month"].strftime("%Y-%m"))
-            revenue_data.append(float(item["total"] or 0))
-        context["revenue_chart"] = {
-            "labels": json.dumps(revenue_labels),
-            "data": json.dumps(revenue_data),
-        }
-        monthly_payments = (
-            Payment.objects.filter(
-                user=request.user, payment_date__gte=start_date, status="completed"
-            )
-            .annotate(month=TruncMonth("payment_date"))
-            .values("month")
-            .annotate(total=Sum("amount"))
-            .order_by("month")
-        )
-        payments_labels, payments_data = [], []
-        for item in monthly_payments:
-            payments_labels.append(item["month"].strftime("%Y-%m"))
-            payments_data.append(float(item["total"] or 0))
-        payment_status_stats = {
-            "paid": Invoice.objects.filter(user=request.user)
-            .annotate(paid_sum=Sum("payments__amount"))
-            .filter(paid_sum__gte=F("total_amount"))
-            .distinct()
-            .count(),
-            "partial": Invoice.objects.filter(user=request.user)
-            .annotate(paid_sum=Sum("payments__amount"))
-            .filter(paid_sum__gt=0, paid_sum__lt=F("total_amount"))
-            .distinct()
-            .count(),
-            "overdue": Invoice.objects.filter(user=request.user, payment_date__lt=today)
-            .annotate(paid_sum=Sum("payments__amount"))
-            .exclude(paid_sum__gte=F("total_amount"))
-            .count(),
-            "unpaid": Invoice.objects.filter(user=request.user)
-            .filter(payments__isnull=True)
-            .count(),
-        }
-        context["recent_invoices"] = Invoice.objects.filter(user=request.user).order_by(
-            "-issue_date"
-        )[:5]
-        pending_settlements = [
-            m
-            for m in range(1, 13)
-            if not MonthlySettlement.objects.filter(
-                user=request.user, year=current_year, month=m
-            ).exists()
-            and m <= datetime.now().month
-        ]
-        context["pending_settlements"] = pending_settlements
-        reminders = []
-        if datetime.now().month == 12:
-            reminders.append(
-                {
-                    "type": "warning",
-                    "icon": "fas fa-calendar-alt",
-                    "title": "Zbliża się koniec roku podatkowego",
-                    "message": "Pamiętaj o przygotowaniu rozliczenia rocznego do 31 stycznia.",
-                    "action_url": "admin:ksiegowosc_yearlysettlement_calculate",
-                    "action_text": "Sprawdź rozliczenie",
-                }
-            )
-        if (
-            datetime.now().month <= 3
-            and not YearlySettlement.objects.filter(
-                user=request.user, year=previous_year
-            ).exists()
-        ):
-            reminders.append(
-                {
-                    "type": "danger",
-                    "icon": "fas fa-exclamation-triangle",
-                    "title": f"Brak rozliczenia rocznego za {previous_year}",
-                    "message": f"Termin składania rozliczenia rocznego za {previous_year} mija 31 stycznia {current_year}.",
-                    "action_url": "admin:ksiegowosc_yearlysettlement_calculate",
-                    "action_text": "Oblicz teraz",
-                }
-            )
-        if abs(projected_difference) > 1000:
-            if projected_difference > 0:
-                reminders.append(
-                    {
-                        "type": "warning",
-                        "icon": "fas fa-money-bill-wave",
-                        "title": "Prognozowana dopłata podatku",
-                        "message": f"Na koniec roku możesz mieć dopłatę około {projected_difference:.0f} PLN.",
-                        "action_url": "admin:ksiegowosc_monthlysettlement_calculate",
-                        "action_text": "Sprawdź rozliczenia",
-                    }
-                )
-            else:
-                reminders.append(
-                    {
-                        "type": "success",
-                        "icon": "fas fa-coins",
-                        "title": "Prognozowany zwrot podatku",
-                        "message": f"Na koniec roku możesz mieć zwrot około {abs(projected_difference):.0f} PLN.",
-                        "action_url": "admin:ksiegowosc_yearlysettlement_calculate",
-                        "action_text": "Zobacz szczegóły",
-                    }
-                )
-        (
-            context["payment_stats"],
-            context["payments_chart"],
-            context["payment_status_stats"],
-            context["reminders"],
-        ) = (
-            payment_stats,
-            {"labels": json.dumps(payments_labels), "data": json.dumps(payments_data)},
-            payment_status_stats,
-            reminders,
-        )
+        context.update(build_dashboard(request.user).as_context())
         return render(request, "admin/enhanced_dashboard.html", context)
 
     def calculate_view(self, request):
@@ -1558,9 +797,9 @@ class MonthlySettlementAdmin(admin.ModelAdmin):
                     ),
                     Decimal(request.POST.get("labor_fund_paid", "0").replace(",", ".")),
                 )
-                total_revenue = Invoice.objects.filter(
-                    user=request.user, issue_date__year=year, issue_date__month=month
-                ).aggregate(total=Sum("total_amount"))["total"] or Decimal("0.00")
+                total_revenue = rollup_totals(request.user, year=year, month=month)[
+                    "revenue"
+                ]
                 tax_base_after_health = max(
                     Decimal("0.00"), (total_revenue - social) - (health / 2)
                 )
@@ -1910,8 +1149,8 @@ class PurchaseInvoiceAdmin(admin.ModelAdmin):
     )
 
     list_filter = ("category", "is_paid", "issue_date", "supplier", "user")
-    search_fields = ("invoice_number", "supplier__name", "description")
-    readonly_fields = ("created_at", "updated_at")
+    search_fields = ("invoice_number", "supplier__name", "description", "ksef_number")
+    readonly_fields = ("created_at", "updated_at", "ksef_number")
     exclude = ("user",)
     autocomplete_fields = ["supplier"]
 
@@ -1960,3 +1199,103 @@ class ExpenseCategoryAdmin(admin.ModelAdmin):
         if not hasattr(obj, "user") or not obj.user:
             obj.user = request.user
         super().save_model(request, obj, form, change)
+
+
+# ==== IMPORTY JPK ====
+
+
+@admin.register(JpkImportJob)
+class JpkImportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "original_name",
+        "kind",
+        "status",
+        "rows_parsed",
+        "created_count",
+        "skipped_count",
+        "warnings_count",
+        "created_at",
+        "finished_at",
+    )
+    list_filter = ("status", "kind")
+    search_fields = ("original_name", "error")
+    exclude = ("file", "warnings")
+    readonly_fields = (
+        "user",
+        "kind",
+        "original_name",
+        "status",
+        "rows_parsed",
+        "created_count",
+        "updated_count",
+        "skipped_count",
+        "warnings_count",
+        "warnings_report",
+        "error",
+        "locked_by",
+        "started_at",
+        "finished_at",
+    )
+
+    def has_add_permission(self, request):
+        # Importy powstają przez wgranie pliku na stronie importu faktur lub rozliczeń
+        return False
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(user=request.user)
+
+    def get_urls(self):
+        urls = super().get_urls()
+        my_urls = [
+            path(
+                "<int:object_id>/progress/",
+                self.admin_site.admin_view(self.progress_view),
+                name="ksiegowosc_jpkimportjob_progress",
+            ),
+            path(
+                "<int:object_id>/warnings/",
+                self.admin_site.admin_view(self.warnings_view),
+                name="ksiegowosc_jpkimportjob_warnings",
+            ),
+        ]
+        return my_urls + urls
+
+    def _user_job(self, request, object_id):
+        return self.get_queryset(request).filter(pk=object_id).first()
+
+    def progress_view(self, request, object_id):
+        job = self._user_job(request, object_id)
+        if job is None:
+            return JsonResponse({"error": "Nie znaleziono importu"}, status=404)
+        return JsonResponse(job_progress(job))
+
+    def warnings_view(self, request, object_id):
+        job = self._user_job(request, object_id)
+        if job is None or not job.is_finished:
+            return HttpResponse("Raport nie jest jeszcze dostępny", status=404)
+        lines = [
+            f"Import: {job.original_name} ({job.get_kind_display()})",
+            f"Status: {job.get_status_display()}",
+            f"Odczytane rekordy: {job.rows_parsed}, utworzono: {job.created_count}, "
+            f"zaktualizowano: {job.updated_count}, pominięto: {job.skipped_count}",
+        ]
+        if job.error:
+            lines.append(f"Błąd: {job.error}")
+        lines += ["", f"Ostrzeżenia ({job.warnings_count}):", job.warnings]
+        response = HttpResponse("\n".join(lines), content_type="text/plain; charset=utf-8")
+        response["Content-Disposition"] = (
+            f'attachment; filename="import_jpk_{job.pk}_ostrzezenia.txt"'
+        )
+        return response
+
+    @admin.display(description="Raport ostrzeżeń")
+    def warnings_report(self, obj):
+        if not obj.is_finished:
+            return "-"
+        return format_html(
+            '<a href="{}">Pobierz raport</a>',
+            reverse("admin:ksiegowosc_jpkimportjob_warnings", args=[obj.pk]),
+        )
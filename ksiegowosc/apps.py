@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class KsiegowoscConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ksiegowosc'
+
+    def ready(self):
+        # Podsumowania miesięczne aktualizowane przy zapisie faktur i płatności
+        from . import rollup_signals  # noqa: F401
@@ -0,0 +1,334 @@
+# ksiegowosc/dashboard.py
+
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db.models import Count
+
+from .models import (
+    CompanyInfo,
+    Invoice,
+    MonthlyRollup,
+    MonthlySettlement,
+    YearlySettlement,
+)
+
+ZERO = Decimal("0")
+
+
+@dataclass
+class Chart:
+    labels: list = field(default_factory=list)
+    data: list = field(default_factory=list)
+
+    def as_json(self):
+        return {"labels": json.dumps(self.labels), "data": json.dumps(self.data)}
+
+
+@dataclass
+class DashboardData:
+    """Dane dashboardu rozliczeń (`MonthlySettlementAdmin.dashboard_view`)."""
+
+    current_year: int
+    current_month: int
+    company_info: CompanyInfo | None
+    current_yearly_settlement: YearlySettlement | None
+    current_year_summary: dict
+    previous_year_data: dict
+    revenue_change: Decimal | int
+    tax_change: Decimal | int
+    year_progress: dict
+    payment_stats: dict
+    payment_status_stats: dict
+    pending_settlements: list
+    recent_invoices: list
+    reminders: list
+    tax_base_chart: Chart
+    years_comparison_chart: Chart
+    revenue_chart: Chart
+    payments_chart: Chart
+
+    def as_context(self):
+        """Zmienne szablonu `admin/enhanced_dashboard.html`."""
+        return {
+            "current_year": self.current_year,
+            "current_month": self.current_month,
+            "company_info": self.company_info,
+            "current_yearly_settlement": self.current_yearly_settlement,
+            "current_year_summary": self.current_year_summary,
+            "previous_year_data": self.previous_year_data,
+            "revenue_change": self.revenue_change,
+            "tax_change": self.tax_change,
+            "year_progress": self.year_progress,
+            "payment_stats": self.payment_stats,
+            "payment_status_stats": self.payment_status_stats,
+            "pending_settlements": self.pending_settlements,
+            "recent_invoices": self.recent_invoices,
+            "reminders": self.reminders,
+            "tax_base_chart": self.tax_base_chart.as_json(),
+            "years_comparison_chart": self.years_comparison_chart.as_json(),
+            "revenue_chart": self.revenue_chart.as_json(),
+            "payments_chart": self.payments_chart.as_json(),
+        }
+
+
+def _percent_change(current, previous):
+    if previous > 0:
+        return (current - previous) / previous * 100
+    return 0
+
+
+def _monthly_rollups(user):
+    """Podsumowania miesięczne użytkownika według (rok, miesiąc), rosnąco."""
+    rows = (
+        MonthlyRollup.objects.filter(user=user)
+        .values("year", "month", "revenue", "invoice_count", "paid_amount", "payment_count")
+        .order_by("year", "month")
+    )
+    return {(row["year"], row["month"]): row for row in rows}
+
+
+def _payment_status_counts(user):
+    """Liczby faktur według zapisanego statusu płatności."""
+    counts = dict.fromkeys(("paid", "partial", "overdue", "unpaid"), 0)
+    counts.update(
+        Invoice.objects.filter(user=user)
+        .values_list("payment_status")
+        .annotate(count=Count("pk"))
+        .order_by()
+    )
+    return counts
+
+
+def _reminders(now, previous_year, has_previous_yearly_settlement, projected_difference):
+    reminders = []
+    if now.month == 12:
+        reminders.append(
+            {
+                "type": "warning",
+                "icon": "fas fa-calendar-alt",
+                "title": "Zbliża się koniec roku podatkowego",
+                "message": "Pamiętaj o przygotowaniu rozliczenia rocznego do 31 stycznia.",
+                "action_url": "admin:ksiegowosc_yearlysettlement_calculate",
+                "action_text": "Sprawdź rozliczenie",
+            }
+        )
+    if now.month <= 3 and not has_previous_yearly_settlement:
+        reminders.append(
+            {
+                "type": "danger",
+                "icon": "fas fa-exclamation-triangle",
+                "title": f"Brak rozliczenia rocznego za {previous_year}",
+                "message": f"Termin składania rozliczenia rocznego za {previous_year} mija 31 stycznia {now.year}.",
+                "action_url": "admin:ksiegowosc_yearlysettlement_calculate",
+                "action_text": "Oblicz teraz",
+            }
+        )
+    if abs(projected_difference) > 1000:
+        if projected_difference > 0:
+            reminders.append(
+                {
+                    "type": "warning",
+                    "icon": "fas fa-money-bill-wave",
+                    "title": "Prognozowana dopłata podatku",
+                    "message": f"Na koniec roku możesz mieć dopłatę około {projected_difference:.0f} PLN.",
+                    "action_url": "admin:ksiegowosc_monthlysettlement_calculate",
+                    "action_text": "Sprawdź rozliczenia",
+                }
+            )
+        else:
+            reminders.append(
+                {
+                    "type": "success",
+                    "icon": "fas fa-coins",
+                    "title": "Prognozowany zwrot podatku",
+                    "message": f"Na koniec roku możesz mieć zwrot około {abs(projected_difference):.0f} PLN.",
+                    "action_url": "admin:ksiegowosc_yearlysettlement_calculate",
+                    "action_text": "Zobacz szczegóły",
+                }
+            )
+    return reminders
+
+
+def build_dashboard(user, now=None):
+    """
+    Zbiera dane dashboardu w stałej liczbie zapytań: przychody i wpłaty są
+    czytane z podsumowań miesięcznych (`MonthlyRollup`), a sumy roczne,
+    wykresy i prognozy liczone w Pythonie.
+    """
+    now = now or datetime.now()
+    current_year = now.year
+    previous_year = current_year - 1
+    recent_since = (now - timedelta(days=365)).date()
+    # Wykresy obejmują pełne miesiące od miesiąca sprzed roku
+    recent_month = (recent_since.year, recent_since.month)
+
+    rollups = _monthly_rollups(user)
+    settlements = list(
+        MonthlySettlement.objects.filter(
+            user=user, year__in=[previous_year, current_year]
+        ).values(
+            "year",
+            "month",
+            "social_insurance_paid",
+            "health_insurance_paid",
+            "labor_fund_paid",
+            "income_tax_payable",
+        )
+    )
+    yearly_settlements = {
+        settlement.year: settlement
+        for settlement in YearlySettlement.objects.filter(
+            user=user, year__in=[previous_year, current_year]
+        )
+    }
+    company_info = CompanyInfo.objects.filter(user=user).first()
+
+    def year_revenue(year):
+        return sum((row["revenue"] for (y, _m), row in rollups.items() if y == year), ZERO)
+
+    def settlement_sum(year, field_name, month=None):
+        return sum(
+            (
+                row[field_name] or ZERO
+                for row in settlements
+                if row["year"] == year and (month is None or row["month"] == month)
+            ),
+            ZERO,
+        )
+
+    current_year_summary = {
+        "total_revenue": year_revenue(current_year),
+        "total_social_insurance": settlement_sum(current_year, "social_insurance_paid"),
+        "total_health_insurance": settlement_sum(current_year, "health_insurance_paid"),
+        "total_labor_fund": settlement_sum(current_year, "labor_fund_paid"),
+        "total_monthly_tax": settlement_sum(current_year, "income_tax_payable"),
+    }
+    tax_base = (
+        current_year_summary["total_revenue"]
+        - current_year_summary["total_social_insurance"]
+    )
+    tax_base_after_health = tax_base - (
+        current_year_summary["total_health_insurance"] / 2
+    )
+    if tax_base_after_health < 0:
+        tax_base_after_health = Decimal("0")
+    tax_rate = Decimal("14.0")
+    if company_info and company_info.lump_sum_rate:
+        tax_rate = Decimal(company_info.lump_sum_rate)
+    projected_yearly_tax = (tax_base_after_health * tax_rate / 100).quantize(
+        Decimal("0.01")
+    )
+    projected_difference = projected_yearly_tax - current_year_summary["total_monthly_tax"]
+    current_year_summary.update(
+        {
+            "tax_base": tax_base,
+            "tax_base_after_health": tax_base_after_health,
+            "projected_yearly_tax": projected_yearly_tax,
+            "projected_difference": projected_difference,
+            "tax_rate": tax_rate,
+        }
+    )
+
+    previous_year_data = {
+        "total_revenue": year_revenue(previous_year),
+        "total_tax_paid": settlement_sum(previous_year, "income_tax_payable"),
+    }
+
+    start_of_year = datetime(current_year, 1, 1)
+    days_in_year = (datetime(current_year, 12, 31) - start_of_year).days + 1
+    days_passed = (now - start_of_year).days + 1
+    if days_passed > 0:
+        projected_end_year_revenue = (
+            current_year_summary["total_revenue"] / days_passed * days_in_year
+        )
+        projected_end_year_tax = (
+            current_year_summary["total_monthly_tax"] / days_passed * days_in_year
+        )
+    else:
+        projected_end_year_revenue = current_year_summary["total_revenue"]
+        projected_end_year_tax = current_year_summary["total_monthly_tax"]
+    year_progress = {
+        "percentage": round(days_passed / days_in_year * 100, 1),
+        "days_passed": days_passed,
+        "days_total": days_in_year,
+        "projected_end_year_revenue": projected_end_year_revenue,
+        "projected_end_year_tax": projected_end_year_tax,
+    }
+
+    tax_base_chart = Chart()
+    for month in range(1, 13):
+        month_revenue = rollups.get((current_year, month), {}).get("revenue", ZERO)
+        month_social = settlement_sum(current_year, "social_insurance_paid", month)
+        tax_base_chart.labels.append(f"{month:02d}/{current_year}")
+        tax_base_chart.data.append(float(month_revenue - month_social))
+
+    years_comparison_chart = Chart()
+    for year in range(current_year - 2, current_year + 1):
+        years_comparison_chart.labels.append(str(year))
+        years_comparison_chart.data.append(float(year_revenue(year)))
+
+    revenue_chart = Chart()
+    payments_chart = Chart()
+    for (year, month), row in rollups.items():
+        if (year, month) < recent_month:
+            continue
+        if row["invoice_count"]:
+            revenue_chart.labels.append(f"{year}-{month:02d}")
+            revenue_chart.data.append(float(row["revenue"]))
+        if row["payment_count"]:
+            payments_chart.labels.append(f"{year}-{month:02d}")
+            payments_chart.data.append(float(row["paid_amount"]))
+
+    total_paid = sum((row["paid_amount"] for row in rollups.values()), ZERO)
+    status_counts = _payment_status_counts(user)
+    payment_stats = {
+        "total_outstanding": sum((row["revenue"] for row in rollups.values()), ZERO),
+        "total_paid": total_paid,
+        # Jak filtr "Przeterminowane" w panelu - także częściowo opłacone po terminie
+        "overdue_count": Invoice.objects.filter(user=user, payment_date__lt=now.date())
+        .exclude(payment_status="paid")
+        .count(),
+    }
+    payment_stats["balance_due"] = payment_stats["total_outstanding"] - total_paid
+    payment_status_stats = {
+        status: status_counts[status] for status in ("paid", "partial", "overdue", "unpaid")
+    }
+
+    settled_months = {row["month"] for row in settlements if row["year"] == current_year}
+    pending_settlements = [
+        month for month in range(1, now.month + 1) if month not in settled_months
+    ]
+
+    return DashboardData(
+        current_year=current_year,
+        current_month=now.month,
+        company_info=company_info,
+        current_yearly_settlement=yearly_settlements.get(current_year),
+        current_year_summary=current_year_summary,
+        previous_year_data=previous_year_data,
+        revenue_change=_percent_change(
+            current_year_summary["total_revenue"], previous_year_data["total_revenue"]
+        ),
+        tax_change=_percent_change(
+            current_year_summary["total_monthly_tax"], previous_year_data["total_tax_paid"]
+        ),
+        year_progress=year_progress,
+        payment_stats=payment_stats,
+        payment_status_stats=payment_status_stats,
+        pending_settlements=pending_settlements,
+        recent_invoices=list(
+            Invoice.objects.filter(user=user)
+            .select_related("contractor")
+            .order_by("-issue_date")[:5]
+        ),
+        reminders=_reminders(
+            now, previous_year, previous_year in yearly_settlements, projected_difference
+        ),
+        tax_base_chart=tax_base_chart,
+        years_comparison_chart=years_comparison_chart,
+        revenue_chart=revenue_chart,
+        payments_chart=payments_chart,
+    )
@@ -0,0 +1,119 @@
+# ksiegowosc/import_jobs.py
+
+import logging
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .jpk import JpkEwpImport, JpkFaImport
+from .models import JpkImportJob
+
+logger = logging.getLogger(__name__)
+
+IMPORTERS = {"fa": JpkFaImport, "ewp": JpkEwpImport}
+# Import bez postępu dłużej niż tyle uznajemy za przerwany (np. restart workera)
+STALE_AFTER = timedelta(minutes=15)
+COUNTER_FIELDS = ["rows_parsed", "created_count", "updated_count", "skipped_count", "warnings_count"]
+
+
+def enqueue_import(user, kind, uploaded_file):
+    """Zapisuje wgrany plik na dysku i dodaje import do kolejki."""
+    job = JpkImportJob(user=user, kind=kind, original_name=uploaded_file.name[:255])
+    job.file.save(uploaded_file.name, uploaded_file, save=False)
+    job.save()
+    return job
+
+
+def claim_import_job(worker_id):
+    """Pobiera najstarszy import z kolejki (warunkowy UPDATE - bezpieczne dla wielu workerów)."""
+    # update() nie ustawia auto_now - bez updated_at import długo czekający
+    # w kolejce od razu wyglądałby na przerwany
+    now = timezone.now()
+    for pk in JpkImportJob.objects.filter(status="queued").order_by("created_at").values_list(
+        "pk", flat=True
+    )[:10]:
+        claimed = JpkImportJob.objects.filter(pk=pk, status="queued").update(
+            status="running", locked_by=worker_id, started_at=now, updated_at=now
+        )
+        if claimed:
+            return JpkImportJob.objects.get(pk=pk)
+    return None
+
+
+def release_stale_import_jobs():
+    """
+    Oznacza jako nieudane importy przerwane w trakcie. Zapisane już paczki
+    zostają w bazie; ponowny import tego samego pliku pominie istniejące faktury.
+    """
+    threshold = timezone.now() - STALE_AFTER
+    count = JpkImportJob.objects.filter(
+        Q(started_at__isnull=True) | Q(started_at__lt=threshold),
+        status="running",
+        updated_at__lt=threshold,
+    ).update(
+        status="failed",
+        error="Import został przerwany (brak postępu). Zapisane paczki pozostały w bazie.",
+        finished_at=timezone.now(),
+    )
+    if count:
+        logger.warning(f"⚠ Oznaczono {count} przerwanych importów JPK jako nieudane")
+    return count
+
+
+def _copy_counters(job, importer):
+    job.rows_parsed = importer.parsed
+    job.created_count = importer.created
+    job.updated_count = getattr(importer, "updated", 0)
+    job.skipped_count = importer.skipped
+    job.warnings_count = len(importer.warnings)
+
+
+def _save_progress(job, importer):
+    _copy_counters(job, importer)
+    job.save(update_fields=COUNTER_FIELDS + ["updated_at"])
+
+
+def run_import_job(job):
+    """Wykonuje import; zapisuje postęp po każdej paczce i raport ostrzeżeń na końcu."""
+    importer = None
+    try:
+        importer = IMPORTERS[job.kind](
+            job.user, progress=lambda imp: _save_progress(job, imp)
+        )
+        with job.file.open("rb") as source:
+            importer.run(source)
+        job.status = "done"
+        logger.info(
+            f"✓ Import JPK {job.pk} zakończony: utworzono {importer.created}, "
+            f"pominięto {importer.skipped}"
+        )
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        logger.error(f"❌ Import JPK {job.pk} nie powiódł się: {e}")
+
+    if importer is not None:
+        _copy_counters(job, importer)
+        job.warnings = "\n".join(importer.warnings)
+    job.finished_at = timezone.now()
+    job.save()
+    if job.file:
+        job.file.delete(save=True)
+    return job
+
+
+def job_progress(job):
+    """Stan importu dla strony, która odpytuje postęp."""
+    return {
+        "id": job.pk,
+        "status": job.status,
+        "status_display": job.get_status_display(),
+        "finished": job.is_finished,
+        "rows_parsed": job.rows_parsed,
+        "created": job.created_count,
+        "updated": job.updated_count,
+        "skipped": job.skipped_count,
+        "warnings": job.warnings_count,
+        "error": job.error,
+    }
@@ -0,0 +1,693 @@
+# ksiegowosc/jpk.py
+
+import codecs
+import io
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from lxml import etree
+
+from .models import Contractor, Invoice, InvoiceItem, MonthlySettlement
+from .rollups import month_of, refresh_rollups
+
+_XML_DECLARATION_ENCODING = re.compile(rb"""^\s*<\?xml[^>]*encoding\s*=\s*["']([A-Za-z0-9._-]+)["']""")
+# Ile bajtów z początku pliku czytamy, żeby ustalić kodowanie
+ENCODING_SNIFF_SIZE = 4096
+
+CENT = Decimal("0.01")
+# Największa kwota mieszcząca się w polach DecimalField(max_digits=10, decimal_places=2)
+MAX_AMOUNT = Decimal("99999999.99")
+
+# Pola nagłówka faktury i pozycji: nazwa w JPK_FA(3) i nazwy zastępcze ze starszych plików
+INVOICE_FIELDS = {
+    "invoice_number": ("P_2A", "2A", "NrFaktury"),
+    "buyer_nip": ("P_5B", "5B", "NIP"),
+    "buyer_name": ("P_3A", "3A", "Nazwa"),
+    "issue_date": ("P_1", "1", "DataWystawienia"),
+    "sale_date": ("P_6", "6", "DataSprzedazy"),
+    "total_amount": ("P_15", "WartoscBrutto"),
+    "invoice_type": ("RodzajFaktury",),
+    "correction_reason": ("PrzyczynaKorekty",),
+    "corrected_invoice_number": ("NrFaKorygowanej",),
+}
+ITEM_FIELDS = {
+    "invoice_number": ("P_2B", "2B"),
+    "name": ("P_7", "7"),
+    "unit": ("P_8A", "8A"),
+    "quantity": ("P_8B", "8B"),
+    "unit_price": ("P_9B", "9B"),
+    "total_price": ("P_11A", "11A"),
+}
+EWP_FIELDS = {
+    "number": ("K_1",),
+    "date": ("K_2",),
+    "revenue": ("K_7",),
+    "revenue_other": ("K_11",),
+}
+
+
+def _localname(element):
+    # Komentarze i instrukcje przetwarzania nie mają nazwy znacznika
+    return etree.QName(element).localname if isinstance(element.tag, str) else None
+
+
+def detect_encoding(head):
+    """
+    Kodowanie pliku JPK. Deklaracja XML (lub BOM) wystarcza parserowi, więc
+    zwracamy None; bez deklaracji plik, który nie jest poprawnym UTF-8,
+    traktujemy jak windows-1250 (eksport ze starszych programów księgowych).
+    """
+    if head.startswith((codecs.BOM_UTF8, codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return None
+    if _XML_DECLARATION_ENCODING.match(head):
+        return None
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head)
+    except UnicodeDecodeError:
+        return "windows-1250"
+    return None
+
+
+def _values(element, fields):
+    texts = {}
+    for child in element:
+        tag = child.tag
+        if isinstance(tag, str) and child.text:
+            texts.setdefault(tag.rpartition("}")[2], child.text)
+    values = {}
+    for key, names in fields.items():
+        value = None
+        for name in names:
+            text = texts.get(name)
+            if text is not None:
+                text = text.strip()
+                if text:
+                    value = text
+                    break
+        values[key] = value
+    return values
+
+
+def _iter_root_children(source, names):
+    """
+    Czyta plik JPK strumieniowo (`lxml.etree.iterparse`) i zwraca kolejno
+    bezpośrednie dzieci korzenia o podanych nazwach jako pary (nazwa, dane).
+    Każdy przetworzony element jest od razu usuwany z drzewa, więc zużycie
+    pamięci nie zależy od wielkości pliku.
+    """
+    head = source.read(ENCODING_SNIFF_SIZE)
+    source.seek(0)
+    if isinstance(head, str):
+        raise ValueError("Plik JPK należy przekazać w trybie binarnym")
+    encoding = detect_encoding(head)
+
+    # Filtr znaczników po stronie libxml2 - Python widzi tylko potrzebne elementy
+    context = etree.iterparse(
+        source,
+        events=("end",),
+        tag=[f"{{*}}{name}" for name in names],
+        encoding=encoding,
+        huge_tree=True,
+        resolve_entities=False,
+        no_network=True,
+    )
+    root = None
+    try:
+        for _event, element in context:
+            parent = element.getparent()
+            if parent is None or parent.getparent() is not None:
+                continue
+            if root is None:
+                root = parent
+                if not (_localname(root) or "").startswith("JPK"):
+                    raise ValueError("Plik nie wygląda na plik JPK.")
+            name = _localname(element)
+            yield name, _values(element, names[name])
+            element.clear()
+            while element.getprevious() is not None:
+                del root[0]
+    except etree.XMLSyntaxError as e:
+        raise ValueError(f"Błąd parsowania XML: {str(e)}")
+    finally:
+        del context
+
+
+def iter_jpk_fa(source):
+    """Faktury i ich wiersze z pliku JPK_FA: pary ("faktura", dane) i ("wiersz", dane)."""
+    kinds = {"Faktura": "faktura", "FakturaWiersz": "wiersz"}
+    for name, data in _iter_root_children(
+        source, {"Faktura": INVOICE_FIELDS, "FakturaWiersz": ITEM_FIELDS}
+    ):
+        yield kinds[name], data
+
+
+def iter_jpk_ewp(source):
+    """Wiersze ewidencji przychodów (`EWPWiersz`) z pliku JPK_EWP."""
+    for _name, data in _iter_root_children(source, {"EWPWiersz": EWP_FIELDS}):
+        yield data
+
+
+def parse_date(date_str):
+    if not date_str:
+        return datetime.now().date()
+    try:
+        return datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        try:
+            return datetime.strptime(date_str, "%d-%m-%Y").date()
+        except ValueError:
+            return datetime.now().date()
+
+
+def parse_decimal(value_str):
+    if not value_str:
+        return Decimal("0.00")
+    try:
+        return Decimal(value_str.replace(",", ".").replace(" ", ""))
+    except (InvalidOperation, ValueError):
+        return Decimal("0.00")
+
+
+class JpkFaImport:
+    """
+    Import faktur sprzedaży z pliku JPK_FA w jednym przebiegu.
+
+    Istniejące numery faktur i kontrahenci użytkownika są wczytywani raz, na
+    początku. Faktury, nowi kontrahenci i pozycje trafiają do bazy paczkami
+    (`bulk_create` po `CHUNK_SIZE` rekordów), a kwoty są liczone w Pythonie -
+    bez `InvoiceItem.save()`, który przelicza fakturę po każdej pozycji.
+    Wiersze (`FakturaWiersz` - według schematu zawsze po wszystkich
+    fakturach) są dopinane do faktur po numerze.
+
+    Każda paczka jest zapisywana we własnej transakcji; po każdej wywoływany
+    jest `progress(import_)` (jeśli podano).
+    """
+
+    CHUNK_SIZE = 500
+
+    def __init__(self, user, progress=None):
+        self.user = user
+        self.progress = progress
+        self.parsed = 0
+        self.created = 0
+        self.skipped = 0
+        self.corrections = 0
+        self.warnings = []
+        self._temp_counter = 0
+        # numer faktury -> stan zaimportowanej faktury
+        self._invoices = {}
+        self._invoice_buffer = []
+        self._item_buffer = []
+        # Miesiące podsumowań do przeliczenia - bulk_create pomija sygnały
+        self._months = set()
+        # numer -> pk faktur, które były w bazie przed importem
+        self._existing = dict(
+            Invoice.objects.filter(user=user).values_list("invoice_number", "pk")
+        )
+        self._contractors_by_nip = {}
+        self._contractors_by_name = {}
+        for contractor in Contractor.objects.filter(user=user).only("pk", "name", "tax_id"):
+            if contractor.tax_id:
+                self._contractors_by_nip[contractor.tax_id] = contractor
+            else:
+                self._contractors_by_name.setdefault(contractor.name, contractor)
+
+    def run(self, source):
+        found = False
+        for kind, data in iter_jpk_fa(source):
+            self.parsed += 1
+            if kind == "faktura":
+                found = True
+                self.add_invoice(data)
+            else:
+                self.add_item(data)
+        if not found:
+            raise ValueError("Nie znaleziono elementów 'Faktura' w pliku JPK")
+        self.finish()
+        return self
+
+    def add_invoice(self, data):
+        try:
+            self._add_invoice(data)
+        except Exception as e:
+            self.warnings.append(f"Błąd krytyczny przy przetwarzaniu faktury: {str(e)}")
+        if len(self._invoice_buffer) >= self.CHUNK_SIZE:
+            self._flush_invoices()
+
+    def _add_invoice(self, data):
+        invoice_number = data["invoice_number"]
+        buyer_nip = data["buyer_nip"]
+        buyer_name = data["buyer_name"]
+        notes_from_jpk = ""
+        if not invoice_number:
+            self._temp_counter += 1
+            invoice_number = f"TEMP_JPK_{timezone.now().strftime('%Y%m%d%H%M%S')}_{self._temp_counter}"
+            notes_from_jpk = "Numer faktury został wygenerowany automatycznie podczas importu JPK."
+            self.warnings.append(
+                f"Faktura bez numeru: nadano tymczasowy numer '{invoice_number}'."
+            )
+        if invoice_number in self._existing or invoice_number in self._invoices:
+            self.skipped += 1
+            self.warnings.append(
+                f"Pominięto: Faktura o numerze '{invoice_number}' już istnieje w systemie."
+            )
+            return
+        if buyer_nip:
+            contractor = self._contractors_by_nip.get(buyer_nip)
+            if contractor is None:
+                contractor = Contractor(
+                    user=self.user, tax_id=buyer_nip, name=buyer_name or "Brak nazwy w JPK"
+                )
+                self._contractors_by_nip[buyer_nip] = contractor
+        else:
+            if not buyer_name:
+                self.skipped += 1
+                self.warnings.append(
+                    f"Pominięto fakturę (prawdopodobnie '{invoice_number}'): brak NIP i nazwy kontrahenta."
+                )
+                return
+            contractor = self._contractors_by_name.get(buyer_name)
+            if contractor is None:
+                contractor = Contractor(user=self.user, name=buyer_name, tax_id=None)
+                self._contractors_by_name[buyer_name] = contractor
+                self.warnings.append(
+                    f"Utworzono nowego kontrahenta '{buyer_name}' bez numeru NIP."
+                )
+        issue_date = parse_date(data["issue_date"])
+        sale_date = parse_date(data["sale_date"]) if data["sale_date"] else issue_date
+        total_amount = parse_decimal(data["total_amount"])
+        if abs(total_amount) > MAX_AMOUNT:
+            raise ValueError(f"kwota {total_amount} faktury '{invoice_number}' jest poza zakresem")
+        is_correction = False
+        correction_reason = None
+        corrected_invoice_id = None
+        if "KOREKTA" in (data["invoice_type"] or "").upper():
+            is_correction = True
+            correction_reason = data["correction_reason"] or "Korekta faktury"
+            corrected_invoice_number = data["corrected_invoice_number"]
+            if corrected_invoice_number:
+                corrected_invoice_id = self._invoice_pk(corrected_invoice_number)
+                if corrected_invoice_id is None:
+                    correction_reason += f" (Faktura korygowana {corrected_invoice_number} nie istnieje w systemie)"
+                    self.warnings.append(
+                        f"Korekta '{invoice_number}': nie znaleziono w bazie faktury korygowanej {corrected_invoice_number}."
+                    )
+        invoice = Invoice(
+            user=self.user,
+            invoice_number=invoice_number,
+            issue_date=issue_date,
+            sale_date=sale_date,
+            # bulk_create pomija Invoice.save(), który ustawia domyślny termin płatności
+            payment_date=issue_date + timedelta(days=14),
+            contractor=contractor,
+            total_amount=total_amount,
+            is_correction=is_correction,
+            correction_reason=correction_reason,
+            corrected_invoice_id=corrected_invoice_id,
+            payment_method="przelew",
+            notes=notes_from_jpk,
+        )
+        # bulk_create pomija też wyliczenie statusu płatności w save()
+        invoice.payment_status = invoice.compute_payment_status()
+        self._invoice_buffer.append(invoice)
+        self._invoices[invoice_number] = {
+            "pk": None,
+            "total_amount": total_amount,
+            "payment_date": invoice.payment_date,
+            "has_total": bool(data["total_amount"]),
+            "items_total": Decimal("0.00"),
+            "items": 0,
+            "corrected_invoice_id": corrected_invoice_id,
+        }
+        self.created += 1
+        if is_correction:
+            self.corrections += 1
+
+    def _invoice_pk(self, invoice_number):
+        pk = self._existing.get(invoice_number)
+        if pk is None and invoice_number in self._invoices:
+            if self._invoices[invoice_number]["pk"] is None:
+                self._flush_invoices()
+            pk = self._invoices[invoice_number]["pk"]
+        return pk
+
+    def _flush_invoices(self):
+        if not self._invoice_buffer:
+            return
+        new_contractors = {
+            id(invoice.contractor): invoice.contractor
+            for invoice in self._invoice_buffer
+            if invoice.contractor.pk is None
+        }
+        with transaction.atomic():
+            if new_contractors:
+                Contractor.objects.bulk_create(new_contractors.values())
+            Invoice.objects.bulk_create(self._invoice_buffer)
+        for invoice in self._invoice_buffer:
+            self._invoices[invoice.invoice_number]["pk"] = invoice.pk
+            self._months.update((month_of(invoice.issue_date), month_of(invoice.payment_date)))
+        self._invoice_buffer = []
+        self._report_progress()
+
+    def add_item(self, data):
+        # Wiersze faktur pominiętych (lub spoza pliku) są ignorowane
+        state = self._invoices.get(data["invoice_number"])
+        if state is None:
+            return
+        try:
+            quantity = parse_decimal(data["quantity"] or "1.00")
+            unit_price = parse_decimal(data["unit_price"] or "0.00")
+            total_price = parse_decimal(data["total_price"] or "0.00")
+            if total_price == 0 and quantity > 0 and unit_price > 0:
+                total_price = quantity * unit_price
+            if unit_price == 0 and total_price > 0 and quantity > 0:
+                unit_price = total_price / quantity
+            if quantity == 0:
+                quantity = Decimal("1.00")
+            quantity = quantity.quantize(CENT, ROUND_HALF_UP)
+            unit_price = unit_price.quantize(CENT, ROUND_HALF_UP)
+            # Tak samo jak InvoiceItem.save(): wartość = ilość x cena
+            total_price = (quantity * unit_price).quantize(CENT, ROUND_HALF_UP)
+            if max(abs(quantity), abs(unit_price), abs(total_price)) > MAX_AMOUNT:
+                return
+        except (InvalidOperation, ValueError):
+            return
+        item = InvoiceItem(
+            user=self.user,
+            invoice_id=state["pk"],
+            name=(data["name"] or "Usługa")[:255],
+            quantity=quantity,
+            unit=(data["unit"] or "szt.")[:10],
+            unit_price=unit_price,
+            total_price=total_price,
+        )
+        self._item_buffer.append((item, state, state["items"]))
+        state["items"] += 1
+        state["items_total"] += total_price
+        if len(self._item_buffer) >= self.CHUNK_SIZE:
+            self._flush_items()
+
+    def _flush_items(self):
+        if not self._item_buffer:
+            return
+        with transaction.atomic():
+            self._save_items()
+        self._item_buffer = []
+        self._report_progress()
+
+    def _save_items(self):
+        # Pliki z wierszami zaraz po fakturze (np. z naszego eksportu) - faktury
+        # z bieżącej paczki trafiają do bazy razem z pozycjami
+        self._flush_invoices()
+        for item, state, _index in self._item_buffer:
+            item.invoice_id = state["pk"]
+        InvoiceItem.objects.bulk_create([item for item, _state, _index in self._item_buffer])
+
+        # Pozycje korekty wskazują pozycje faktury korygowanej o tym samym indeksie
+        corrections = [
+            (item, state["corrected_invoice_id"], index)
+            for item, state, index in self._item_buffer
+            if state["corrected_invoice_id"]
+        ]
+        if corrections:
+            original_item_ids = {}
+            for invoice_id, pk in (
+                InvoiceItem.objects.filter(
+                    invoice_id__in={invoice_id for _item, invoice_id, _index in corrections}
+                )
+                .order_by("pk")
+                .values_list("invoice_id", "pk")
+            ):
+                original_item_ids.setdefault(invoice_id, []).append(pk)
+            linked = []
+            for item, invoice_id, index in corrections:
+                ids = original_item_ids.get(invoice_id, [])
+                if index < len(ids):
+                    item.corrected_item_id = ids[index]
+                    linked.append(item)
+            if linked:
+                InvoiceItem.objects.bulk_update(linked, ["corrected_item"])
+
+    def _report_progress(self):
+        if self.progress is not None:
+            self.progress(self)
+
+    def finish(self):
+        """Zapisuje resztę paczek, dodaje pozycje zastępcze i poprawia kwoty brutto."""
+        self._flush_invoices()
+        self._flush_items()
+        fallback_items = []
+        updated_totals = []
+        for state in self._invoices.values():
+            total_amount = state["total_amount"]
+            if state["items"] == 0 and total_amount > 0:
+                fallback_items.append(
+                    InvoiceItem(
+                        user=self.user,
+                        invoice_id=state["pk"],
+                        name="Usługi (import z JPK)",
+                        quantity=Decimal("1.00"),
+                        unit="szt.",
+                        unit_price=total_amount,
+                        total_price=total_amount,
+                    )
+                )
+                state["items"] = 1
+            elif state["items"] and not state["has_total"]:
+                # Brak P_15 w pliku - kwota faktury to suma jej pozycji
+                invoice = Invoice(
+                    pk=state["pk"],
+                    total_amount=state["items_total"],
+                    payment_date=state["payment_date"],
+                )
+                invoice.payment_status = invoice.compute_payment_status()
+                updated_totals.append(invoice)
+        with transaction.atomic():
+            if fallback_items:
+                InvoiceItem.objects.bulk_create(fallback_items, batch_size=self.CHUNK_SIZE)
+            if updated_totals:
+                Invoice.objects.bulk_update(
+                    updated_totals,
+                    ["total_amount", "payment_status"],
+                    batch_size=self.CHUNK_SIZE,
+                )
+        # Przeliczenie podsumowań bywa długie - postęp pokazuje, że import żyje
+        self._report_progress()
+        refresh_rollups(self.user.pk, self._months)
+        self._report_progress()
+
+
+def import_jpk_fa(source, user, progress=None):
+    """Importuje faktury z pliku JPK_FA (otwartego binarnie) dla użytkownika."""
+    return JpkFaImport(user, progress=progress).run(source)
+
+
+class JpkEwpImport:
+    """
+    Import przychodów z pliku JPK_EWP: wiersze ewidencji (`EWPWiersz`) są
+    czytane strumieniowo i sumowane w miesięczne rozliczenia.
+    """
+
+    def __init__(self, user, progress=None):
+        self.user = user
+        self.progress = progress
+        self.parsed = 0
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.warnings = []
+
+    def run(self, source):
+        monthly_revenues = {}
+        for row in iter_jpk_ewp(source):
+            self.parsed += 1
+            try:
+                date = datetime.strptime(row["date"], "%Y-%m-%d").date()
+                revenue = Decimal(row["revenue"]) + Decimal(row["revenue_other"])
+            except (TypeError, ValueError, InvalidOperation):
+                self.skipped += 1
+                self.warnings.append(
+                    f"Pominięto wiersz ewidencji nr {row['number'] or self.parsed}: "
+                    "brak lub błędna data (K_2) albo kwota przychodu (K_7, K_11)."
+                )
+                continue
+            year_month = (date.year, date.month)
+            monthly_revenues[year_month] = (
+                monthly_revenues.get(year_month, Decimal("0.00")) + revenue
+            )
+            if self.progress is not None and self.parsed % 1000 == 0:
+                self.progress(self)
+        if not self.parsed:
+            raise ValueError("Nie znaleziono żadnych wpisów w pliku JPK_EWP.")
+        if self.progress is not None:
+            self.progress(self)
+
+        with transaction.atomic():
+            for (year, month), total_revenue in monthly_revenues.items():
+                settlement, created = MonthlySettlement.objects.update_or_create(
+                    user=self.user,
+                    year=year,
+                    month=month,
+                    defaults={
+                        "total_revenue": total_revenue,
+                        "health_insurance_paid": 0,
+                        "social_insurance_paid": 0,
+                        "labor_fund_paid": 0,
+                        "income_tax_payable": 0,
+                    },
+                )
+                if created:
+                    self.created += 1
+                else:
+                    self.updated += 1
+        self.warnings.append(
+            "Pamiętaj, aby uzupełnić informacje o zapłaconych składkach ZUS dla zaimportowanych miesięcy."
+        )
+        if self.progress is not None:
+            self.progress(self)
+        return self
+
+
+def import_jpk_ewp(source, user, progress=None):
+    """Importuje miesięczne przychody z pliku JPK_EWP (otwartego binarnie)."""
+    return JpkEwpImport(user, progress=progress).run(source)
+
+
+JPK_FA_NAMESPACES = {
+    "tns": "http://jpk.mf.gov.pl/wzor/2022/02/17/02171/",
+    "etd": "http://crd.gov.pl/xml/schematy/dziedzinowe/mf/2022/01/05/eD/DefinicjeTypy/",
+}
+EXPORT_CHUNK_SIZE = 500
+
+
+def _nip(value):
+    return (value or "").replace("-", "")
+
+
+class _JpkWriter:
+    """Przyrostowy zapis XML (`lxml.etree.xmlfile`) z wcięciami jak w `ET.indent`."""
+
+    def __init__(self, xf):
+        self.xf = xf
+        self.depth = 0
+
+    def _indent(self):
+        self.xf.write("\n" + "\t" * self.depth)
+
+    def field(self, tag, text, namespace="tns", **attrib):
+        self._indent()
+        with self.xf.element(f"{{{JPK_FA_NAMESPACES[namespace]}}}{tag}", attrib):
+            if text:
+                self.xf.write(text)
+
+    @contextmanager
+    def element(self, tag, namespace="tns", **attrib):
+        self._indent()
+        with self.xf.element(f"{{{JPK_FA_NAMESPACES[namespace]}}}{tag}", attrib):
+            self.depth += 1
+            yield
+            self.depth -= 1
+            self._indent()
+
+
+def _write_header(writer, queryset, company_info):
+    dates = queryset.aggregate(min_date=Min("issue_date"), max_date=Max("issue_date"))
+    with writer.element("Naglowek"):
+        writer.field(
+            "KodFormularza", "JPK_FA", kodSystemowy="JPK_FA (4)", wersjaSchemy="1-0"
+        )
+        writer.field("WariantFormularza", "4")
+        writer.field("DataWytworzeniaJPK", datetime.now().isoformat())
+        if dates["min_date"] and dates["max_date"]:
+            writer.field("DataOd", dates["min_date"].strftime("%Y-%m-%d"))
+            writer.field("DataDo", dates["max_date"].strftime("%Y-%m-%d"))
+        writer.field("NazwaSystemu", "Fakturownia App")
+        writer.field("CelZlozenia", "1")
+        writer.field("KodUrzędu", company_info.kod_urzedu or "")
+    with writer.element("Podmiot1"):
+        with writer.element("IdentyfikatorPodmiotu"):
+            writer.field("NIP", _nip(company_info.tax_id))
+            writer.field("PelnaNazwa", company_info.company_name)
+        with writer.element("AdresPodmiotu"):
+            writer.field("KodKraju", "PL", "etd")
+            writer.field("Wojewodztwo", company_info.voivodeship or "", "etd")
+            writer.field("Ulica", company_info.street or "", "etd")
+            writer.field("Miejscowosc", company_info.city or "", "etd")
+            writer.field("KodPocztowy", company_info.zip_code or "", "etd")
+
+
+def _write_invoice(writer, invoice, company_info):
+    """Element `Faktura` i wiersze `FakturaWiersz` jednej faktury."""
+    contractor = invoice.contractor
+    with writer.element("Faktura", typ="G"):
+        writer.field("KodWaluty", "PLN")
+        writer.field("P_1", invoice.issue_date.strftime("%Y-%m-%d"))
+        writer.field("P_2A", invoice.invoice_number)
+        writer.field("P_3A", contractor.name)
+        writer.field("P_3B", f"{contractor.street}, {contractor.zip_code} {contractor.city}")
+        writer.field("P_3C", company_info.company_name)
+        writer.field("P_3D", company_info.get_full_address())
+        writer.field("P_4B", _nip(company_info.tax_id))
+        writer.field("P_5B", _nip(contractor.tax_id))
+        writer.field("P_6", invoice.sale_date.strftime("%Y-%m-%d"))
+        writer.field("P_13_7", str(invoice.total_amount))
+        writer.field("P_15", str(invoice.total_amount))
+        if invoice.is_correction:
+            writer.field("RodzajFaktury", "KOREKTA")
+            writer.field("PrzyczynaKorekty", invoice.correction_reason)
+            if invoice.corrected_invoice:
+                writer.field("NrFaKorygowanej", invoice.corrected_invoice.invoice_number)
+        else:
+            writer.field("RodzajFaktury", "VAT")
+
+    for item in invoice.items.all():
+        with writer.element("FakturaWiersz"):
+            writer.field("P_2B", invoice.invoice_number)
+            writer.field("P_7", item.name)
+            writer.field("P_8A", str(item.quantity))
+            writer.field("P_8B", item.unit)
+            writer.field("P_9A", str(item.unit_price))
+            writer.field("P_11", str(item.total_price))
+            writer.field("P_12", "zw")
+
+
+def stream_jpk_fa(queryset, company_info, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Generuje plik JPK_FA kawałkami (do `StreamingHttpResponse`). Faktury są
+    czytane z bazy paczkami (`iterator(chunk_size)`) razem z kontrahentem,
+    fakturą korygowaną i pozycjami, a XML jest zapisywany przyrostowo
+    (`lxml.etree.xmlfile`) - w pamięci jest tylko bieżąca paczka.
+    """
+    invoices = (
+        queryset.select_related("contractor", "corrected_invoice")
+        .prefetch_related("items")
+        .iterator(chunk_size=chunk_size)
+    )
+    buffer = io.BytesIO()
+
+    def drain():
+        xf.flush()
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    with etree.xmlfile(buffer, encoding="utf-8") as xf:
+        xf.write_declaration()
+        with xf.element(f"{{{JPK_FA_NAMESPACES['tns']}}}JPK", nsmap=JPK_FA_NAMESPACES):
+            writer = _JpkWriter(xf)
+            writer.depth = 1
+            _write_header(writer, queryset, company_info)
+            yield drain()
+
+            for count, invoice in enumerate(invoices, start=1):
+                _write_invoice(writer, invoice, company_info)
+                if count % chunk_size == 0:
+                    yield drain()
+            xf.write("\n")
+    yield buffer.getvalue()
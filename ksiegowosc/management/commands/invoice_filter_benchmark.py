@@ -0,0 +1,127 @@
+# ksiegowosc/management/commands/invoice_filter_benchmark.py
+
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib import admin
+from django.contrib.auth.models import Permission, User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from ksiegowosc.models import Contractor, Invoice, Payment
+from ksiegowosc.payment_status import recalculate_payment_statuses
+
+USERNAME = "filter_benchmark"
+FILTER_VALUES = [None, "paid", "partial", "overdue", "unpaid"]
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    index = min(int(round(percent / 100 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mierzy czas listy faktur w panelu (changelist) dla każdej wartości filtra '
+        'statusu płatności na danych testowych jednej firmy'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoices', type=int, default=20000, help='Liczba faktur (domyślnie 20000)')
+        parser.add_argument('--repeat', type=int, default=10, help='Powtórzenia dla każdego filtra (domyślnie 10)')
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Nie usuwaj użytkownika i faktur testowych po zakończeniu',
+        )
+
+    def handle(self, *args, **options):
+        user = self._create_data(options['invoices'])
+        try:
+            self._run(user, options['repeat'])
+        finally:
+            if not options['keep']:
+                self._delete_data()
+
+    @staticmethod
+    def _delete_data():
+        users = User.objects.filter(username=USERNAME)
+        # Faktury trzeba usunąć przed kontrahentami (on_delete=PROTECT)
+        Invoice.objects.filter(user__in=users).delete()
+        users.delete()
+
+    def _create_data(self, invoice_count):
+        self._delete_data()
+        random.seed(0)
+        user = User.objects.create(username=USERNAME, is_staff=True)
+        user.user_permissions.add(
+            *Permission.objects.filter(content_type__app_label="ksiegowosc", codename="view_invoice")
+        )
+        contractors = Contractor.objects.bulk_create(
+            [Contractor(user=user, name=f"Kontrahent {i}", tax_id=f"{1110000000 + i}") for i in range(50)]
+        )
+        today = date.today()
+        invoices = []
+        for n in range(invoice_count):
+            issue_date = today - timedelta(days=random.randint(0, 1500))
+            invoices.append(
+                Invoice(
+                    user=user,
+                    contractor=random.choice(contractors),
+                    invoice_number=f"BENCH/{n + 1}",
+                    issue_date=issue_date,
+                    sale_date=issue_date,
+                    payment_date=issue_date + timedelta(days=14),
+                    total_amount=Decimal(random.choice(["100.00", "250.50", "1230.00"])),
+                )
+            )
+        Invoice.objects.bulk_create(invoices, batch_size=1000)
+
+        # Część faktur opłacona w całości, część częściowo, część z anulowaną wpłatą
+        payments = []
+        for invoice in invoices:
+            roll = random.random()
+            if roll < 0.5:
+                payments.append(Payment(user=user, invoice=invoice, amount=invoice.total_amount,
+                                        payment_date=invoice.issue_date + timedelta(days=5)))
+            elif roll < 0.7:
+                payments.append(Payment(user=user, invoice=invoice, amount=invoice.total_amount / 2,
+                                        payment_date=invoice.issue_date + timedelta(days=5)))
+            elif roll < 0.8:
+                payments.append(Payment(user=user, invoice=invoice, amount=invoice.total_amount,
+                                        payment_date=invoice.issue_date + timedelta(days=5),
+                                        status="cancelled"))
+        Payment.objects.bulk_create(payments, batch_size=1000)
+        recalculate_payment_statuses(Invoice.objects.filter(user=user))
+        return user
+
+    def _run(self, user, repeat):
+        model_admin = admin.site._registry[Invoice]
+        factory = RequestFactory()
+        self.stdout.write(
+            f"Lista faktur: {Invoice.objects.filter(user=user).count()} faktur, "
+            f"{repeat} powtórzeń na filtr"
+        )
+        for value in FILTER_VALUES:
+            params = {"payment_status": value} if value else {}
+            timings = []
+            for _ in range(repeat):
+                request = factory.get("/admin/ksiegowosc/invoice/", params)
+                request.user = user
+                start = time.perf_counter()
+                with CaptureQueriesContext(connection) as queries:
+                    response = model_admin.changelist_view(request)
+                    response.render()
+                timings.append((time.perf_counter() - start) * 1000)
+            result_count = response.context_data["cl"].result_count
+            self.stdout.write(
+                f"  {value or 'bez filtra':<10} wyników {result_count:>6}  "
+                f"p50 {_percentile(timings, 50):7.1f} ms  p95 {_percentile(timings, 95):7.1f} ms  "
+                f"średnio {statistics.mean(timings):7.1f} ms  zapytań {len(queries)}"
+            )
@@ -0,0 +1,55 @@
+# ksiegowosc/management/commands/jpk_import_worker.py
+
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ksiegowosc.import_jobs import claim_import_job, release_stale_import_jobs, run_import_job
+
+
+class Command(BaseCommand):
+    help = 'Wykonuje w tle importy plików JPK_FA i JPK_EWP wgrane w panelu (zadania JpkImportJob)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Przerwa (w sekundach) gdy kolejka jest pusta',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Wykonaj oczekujące importy i zakończ',
+        )
+
+    def handle(self, *args, **options):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stdout.write(self.style.SUCCESS(f"Worker importu JPK uruchomiony ({worker_id})"))
+        processed = 0
+        try:
+            while True:
+                close_old_connections()
+                release_stale_import_jobs()
+                job = claim_import_job(worker_id)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                job = run_import_job(job)
+                processed += 1
+                self.stdout.write(
+                    f"Import {job.pk} ({job.original_name}): {job.get_status_display()}, "
+                    f"utworzono {job.created_count}, pominięto {job.skipped_count}"
+                )
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Zatrzymano workera'))
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Worker importu JPK zakończył pracę (importy: {processed})")
+        )
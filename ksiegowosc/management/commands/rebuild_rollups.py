@@ -0,0 +1,29 @@
+# ksiegowosc/management/commands/rebuild_rollups.py
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from ksiegowosc.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Przelicza od zera miesięczne podsumowania przychodów, wpłat i kosztów (MonthlyRollup)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Nazwa użytkownika - przelicz tylko jego podsumowania',
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"Nie znaleziono użytkownika {options['user']}")
+
+        months = rebuild_rollups(user)
+        self.stdout.write(
+            self.style.SUCCESS(f"Przebudowano podsumowania miesięczne: {months} miesięcy")
+        )
@@ -0,0 +1,34 @@
+# ksiegowosc/management/commands/update_payment_statuses.py
+
+from django.core.management.base import BaseCommand
+
+from ksiegowosc.payment_status import mark_overdue_invoices, recalculate_payment_statuses
+from ksiegowosc.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Oznacza nieopłacone faktury po terminie płatności jako przeterminowane '
+        '(do uruchamiania raz na dobę, np. z crona)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recalculate',
+            action='store_true',
+            help='Przelicz od zera zapłacone kwoty i statusy wszystkich faktur z tabeli płatności',
+        )
+
+    def handle(self, *args, **options):
+        if options['recalculate']:
+            count = recalculate_payment_statuses()
+            rebuild_rollups()
+            self.stdout.write(
+                self.style.SUCCESS(f"Przeliczono zapłacone kwoty i statusy {count} faktur")
+            )
+            return
+
+        count = mark_overdue_invoices()
+        self.stdout.write(
+            self.style.SUCCESS(f"Oznaczono jako przeterminowane: {count} faktur")
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ksiegowosc', '0016_invoice_ksef_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='ksef_send_duration_ms',
+            field=models.PositiveIntegerField(blank=True, help_text='Dla sesji wsadowej: średni czas na fakturę (czas sesji / liczba faktur)', null=True, verbose_name='Czas wysyłki do KSeF (ms)'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ksiegowosc', '0017_invoice_ksef_send_duration_ms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='companyinfo',
+            name='ksef_access_token',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='accessToken KSeF (zaszyfrowany)'),
+        ),
+        migrations.AddField(
+            model_name='companyinfo',
+            name='ksef_access_token_valid_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='accessToken ważny do'),
+        ),
+        migrations.AddField(
+            model_name='companyinfo',
+            name='ksef_refresh_token',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='refreshToken KSeF (zaszyfrowany)'),
+        ),
+        migrations.AddField(
+            model_name='companyinfo',
+            name='ksef_refresh_token_valid_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='refreshToken ważny do'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ksiegowosc', '0018_companyinfo_ksef_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='companyinfo',
+            name='ksef_purchases_synced_until',
+            field=models.DateTimeField(blank=True, help_text='Data trwałego zapisu w KSeF ostatniej pobranej faktury zakupu', null=True, verbose_name='Faktury zakupu z KSeF pobrane do'),
+        ),
+        migrations.AddField(
+            model_name='purchaseinvoice',
+            name='ksef_number',
+            field=models.CharField(blank=True, db_index=True, help_text='Uzupełniany przy pobraniu faktury z KSeF', max_length=100, null=True, verbose_name='Numer KSeF'),
+        ),
+    ]
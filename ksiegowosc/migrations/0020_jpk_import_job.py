@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:29
+
+import django.db.models.deletion
+import ksiegowosc.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ksiegowosc', '0019_ksef_purchase_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JpkImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('fa', 'JPK_FA (faktury)'), ('ewp', 'JPK_EWP (rozliczenia)')], max_length=3, verbose_name='Rodzaj pliku')),
+                ('file', models.FileField(blank=True, help_text='Usuwany po zakończeniu importu', storage=ksiegowosc.models.jpk_import_storage, upload_to='%Y/%m/', verbose_name='Plik')),
+                ('original_name', models.CharField(max_length=255, verbose_name='Nazwa pliku')),
+                ('status', models.CharField(choices=[('queued', 'W kolejce'), ('running', 'W trakcie importu'), ('done', 'Zakończony'), ('failed', 'Błąd')], default='queued', max_length=10, verbose_name='Status')),
+                ('rows_parsed', models.PositiveIntegerField(default=0, verbose_name='Odczytane rekordy')),
+                ('created_count', models.PositiveIntegerField(default=0, verbose_name='Utworzono')),
+                ('updated_count', models.PositiveIntegerField(default=0, verbose_name='Zaktualizowano')),
+                ('skipped_count', models.PositiveIntegerField(default=0, verbose_name='Pominięto')),
+                ('warnings_count', models.PositiveIntegerField(default=0, verbose_name='Ostrzeżenia')),
+                ('warnings', models.TextField(blank=True, verbose_name='Ostrzeżenia (raport)')),
+                ('error', models.TextField(blank=True, verbose_name='Błąd')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='Pobrane przez')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Rozpoczęto')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Zakończono')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Użytkownik')),
+            ],
+            options={
+                'verbose_name': 'Import JPK',
+                'verbose_name_plural': 'Importy JPK',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='ksiegowosc__status_dd965f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ksiegowosc', '0020_jpk_import_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField(verbose_name='Rok')),
+                ('month', models.IntegerField(verbose_name='Miesiąc')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Przychód')),
+                ('invoice_count', models.PositiveIntegerField(default=0, verbose_name='Liczba faktur')),
+                ('paid_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Wpłaty zrealizowane')),
+                ('payment_count', models.PositiveIntegerField(default=0, verbose_name='Liczba wpłat')),
+                ('open_amount', models.DecimalField(decimal_places=2, default=0, help_text='Niezapłacona część faktur z terminem płatności w tym miesiącu', max_digits=14, verbose_name='Do zapłaty')),
+                ('open_count', models.PositiveIntegerField(default=0, verbose_name='Nieopłacone faktury')),
+                ('cost_net', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Koszty netto')),
+                ('cost_vat', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='VAT z faktur zakupu')),
+                ('cost_total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Koszty brutto')),
+                ('purchase_count', models.PositiveIntegerField(default=0, verbose_name='Liczba faktur zakupu')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Użytkownik')),
+            ],
+            options={
+                'verbose_name': 'Podsumowanie miesięczne',
+                'verbose_name_plural': 'Podsumowania miesięczne',
+                'ordering': ['-year', '-month'],
+                'unique_together': {('user', 'year', 'month')},
+            },
+        ),
+    ]
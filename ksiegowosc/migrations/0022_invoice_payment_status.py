@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:46
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def fill_payment_status(apps, schema_editor):
+    """Uzupełnia zapłacone kwoty i statusy istniejących faktur."""
+    Invoice = apps.get_model("ksiegowosc", "Invoice")
+    Payment = apps.get_model("ksiegowosc", "Payment")
+    paid = (
+        Payment.objects.filter(invoice=OuterRef("pk"), status="completed")
+        .values("invoice")
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    Invoice.objects.update(
+        paid_amount=Coalesce(
+            Subquery(paid),
+            Value(Decimal("0.00")),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+    )
+    Invoice.objects.update(
+        payment_status=Case(
+            When(paid_amount__gte=F("total_amount"), then=Value("paid")),
+            When(paid_amount__gt=0, then=Value("partial")),
+            When(payment_date__lt=timezone.now().date(), then=Value("overdue")),
+            default=Value("unpaid"),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ksiegowosc', '0021_monthly_rollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='paid_amount',
+            field=models.DecimalField(decimal_places=2, default=0.0, editable=False, help_text='Suma zrealizowanych wpłat - aktualizowana przy zapisie płatności', max_digits=10, verbose_name='Zapłacono'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='payment_status',
+            field=models.CharField(choices=[('paid', 'Opłacona'), ('partial', 'Częściowo opłacona'), ('overdue', 'Przeterminowana'), ('unpaid', 'Nieopłacona')], default='unpaid', editable=False, max_length=10, verbose_name='Status płatności'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['user', 'payment_status'], name='ksiegowosc__user_id_3d5de3_idx'),
+        ),
+        migrations.RunPython(fill_payment_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ksiegowosc', '0022_invoice_payment_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['user', 'payment_date'], name='ksiegowosc__user_id_903d24_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['user', 'issue_date'], name='ksiegowosc__user_id_5f9755_idx'),
+        ),
+    ]
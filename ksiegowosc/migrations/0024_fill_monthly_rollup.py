@@ -0,0 +1,76 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+AMOUNT_FIELDS = ["revenue", "paid_amount", "open_amount", "cost_net", "cost_vat", "cost_total"]
+COUNT_FIELDS = ["invoice_count", "payment_count", "open_count", "purchase_count"]
+
+
+def fill_monthly_rollups(apps, schema_editor):
+    """Buduje podsumowania miesięczne z istniejących faktur, wpłat i kosztów."""
+    Invoice = apps.get_model("ksiegowosc", "Invoice")
+    Payment = apps.get_model("ksiegowosc", "Payment")
+    PurchaseInvoice = apps.get_model("ksiegowosc", "PurchaseInvoice")
+    MonthlyRollup = apps.get_model("ksiegowosc", "MonthlyRollup")
+
+    rows = defaultdict(dict)
+
+    def add(queryset, date_field, **aggregates):
+        grouped = (
+            queryset.annotate(year=ExtractYear(date_field), month=ExtractMonth(date_field))
+            .values("user_id", "year", "month")
+            .order_by()
+            .annotate(**aggregates)
+        )
+        for row in grouped:
+            if row["year"] is None:
+                continue
+            key = (row["user_id"], row["year"], row["month"])
+            rows[key].update((name, row[name]) for name in aggregates)
+
+    add(Invoice.objects.all(), "issue_date", revenue=Sum("total_amount"), invoice_count=Count("pk"))
+    add(
+        Payment.objects.filter(status="completed"),
+        "payment_date",
+        paid_amount=Sum("amount"),
+        payment_count=Count("pk"),
+    )
+    add(
+        Invoice.objects.filter(paid_amount__lt=F("total_amount")),
+        "payment_date",
+        open_amount=Sum(F("total_amount") - F("paid_amount")),
+        open_count=Count("pk"),
+    )
+    add(
+        PurchaseInvoice.objects.all(),
+        "issue_date",
+        cost_net=Sum("net_amount"),
+        cost_vat=Sum("vat_amount"),
+        cost_total=Sum("total_amount"),
+        purchase_count=Count("pk"),
+    )
+
+    def rollup(user_id, year, month, values):
+        fields = {name: values.get(name) or Decimal("0") for name in AMOUNT_FIELDS}
+        fields.update((name, values.get(name) or 0) for name in COUNT_FIELDS)
+        return MonthlyRollup(user_id=user_id, year=year, month=month, **fields)
+
+    MonthlyRollup.objects.all().delete()
+    MonthlyRollup.objects.bulk_create(
+        [rollup(*key, values) for key, values in sorted(rows.items())],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ksiegowosc', '0023_invoice_date_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_monthly_rollups, migrations.RunPython.noop),
+    ]
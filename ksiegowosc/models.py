@@ -1,16 +1,18 @@
 # ksiegowosc/models.py
 
 import re
-from datetime import timedelta
+from datetime import datetime, timedelta
 from decimal import Decimal
 
 import requests
 from bs4 import BeautifulSoup
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Sum
 from django.utils import timezone
 
+from .totals import totals_deferred, update_totals
+
 KODY_URZEDOW_SKARBOWYCH = [
     ("0202", "Urząd Skarbowy w Bolesławcu"),
     ("0203", "Urząd Skarbowy w Dzierżoniowie"),
@@ -606,6 +608,26 @@ class CompanyInfo(models.Model):
                   'DEMO (przedprodukcyjne) lub Produkcja (faktyczne faktury)'
     )
 
+    # Tokeny JWT z KSeF (zaszyfrowane) - pozwalają pominąć pełne uwierzytelnienie
+    ksef_access_token = models.TextField(
+        blank=True, default='', editable=False, verbose_name='accessToken KSeF (zaszyfrowany)'
+    )
+    ksef_access_token_valid_until = models.DateTimeField(
+        blank=True, null=True, editable=False, verbose_name='accessToken ważny do'
+    )
+    ksef_refresh_token = models.TextField(
+        blank=True, default='', editable=False, verbose_name='refreshToken KSeF (zaszyfrowany)'
+    )
+    ksef_refresh_token_valid_until = models.DateTimeField(
+        blank=True, null=True, editable=False, verbose_name='refreshToken ważny do'
+    )
+    ksef_purchases_synced_until = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='Faktury zakupu z KSeF pobrane do',
+        help_text='Data trwałego zapisu w KSeF ostatniej pobranej faktury zakupu',
+    )
+
 
     class Meta:
         verbose_name = "Dane Firmy"
@@ -659,11 +681,22 @@ class Contractor(models.Model):
         return self.name
 
 
+def _as_date(value):
+    """Data z wartości DateField, która przed zapisem może być jeszcze datetime."""
+    if isinstance(value, datetime):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value
+
+
 class Invoice(models.Model):
     PAYMENT_STATUS_CHOICES = [
-        ("unpaid", "Niezapłacona"),
-        ("paid", "Zapłacona"),
+        ("paid", "Opłacona"),
+        ("partial", "Częściowo opłacona"),
+        ("overdue", "Przeterminowana"),
+        ("unpaid", "Nieopłacona"),
     ]
+    # Pola, od których zależy status płatności
+    PAYMENT_STATUS_FIELDS = {"total_amount", "paid_amount", "payment_date"}
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Użytkownik")
     invoice_number = models.CharField(max_length=50, verbose_name="Numer faktury")
     issue_date = models.DateField(default=timezone.now, verbose_name="Data wystawienia")
@@ -677,6 +710,21 @@ class Invoice(models.Model):
     total_amount = models.DecimalField(
         max_digits=10, decimal_places=2, default=0.00, verbose_name="Kwota całkowita"
     )
+    paid_amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0.00,
+        editable=False,
+        verbose_name="Zapłacono",
+        help_text="Suma zrealizowanych wpłat - aktualizowana przy zapisie płatności",
+    )
+    payment_status = models.CharField(
+        max_length=10,
+        choices=PAYMENT_STATUS_CHOICES,
+        default="unpaid",
+        editable=False,
+        verbose_name="Status płatności",
+    )
     payment_method = models.CharField(
         max_length=50,
         choices=[("przelew", "Przelew"), ("gotówka", "Gotówka")],
@@ -727,6 +775,12 @@ class Invoice(models.Model):
     ksef_processing_description = models.TextField(
         blank=True, null=True, verbose_name="Opis statusu KSeF"
     )
+    ksef_send_duration_ms = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        verbose_name="Czas wysyłki do KSeF (ms)",
+        help_text="Dla sesji wsadowej: średni czas na fakturę (czas sesji / liczba faktur)",
+    )
 
     ksef_upo = models.BinaryField(
         null=True,
@@ -740,13 +794,28 @@ class Invoice(models.Model):
         verbose_name_plural = "Faktury"
         ordering = ["-issue_date"]
         unique_together = ("user", "invoice_number")
+        indexes = [
+            models.Index(fields=["user", "payment_status"]),
+            models.Index(fields=["user", "payment_date"]),
+            models.Index(fields=["user", "issue_date"]),
+        ]
 
     def __str__(self):
         return f"Faktura {self.invoice_number} dla {self.contractor.name}"
 
     def save(self, *args, **kwargs):
+        # Domyślna data wystawienia (timezone.now) to datetime - termin płatności
+        # liczony z niej też byłby datetime i nie dałby się porównać z datą
+        self.issue_date = _as_date(self.issue_date)
         if not self.payment_date:
             self.payment_date = self.issue_date + timedelta(days=14)
+        self.payment_date = _as_date(self.payment_date)
+        self.payment_status = self.compute_payment_status()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and not self.PAYMENT_STATUS_FIELDS.isdisjoint(
+            update_fields
+        ):
+            kwargs["update_fields"] = {*update_fields, "payment_status"}
         super().save(*args, **kwargs)
 
     def update_total_amount(self):
@@ -754,19 +823,43 @@ class Invoice(models.Model):
         self.total_amount = total
         self.save(update_fields=["total_amount"])
 
+    def update_paid_amount(self):
+        """Przelicza sumę zrealizowanych wpłat i status płatności."""
+        with transaction.atomic():
+            # Blokada wiersza faktury - równoległe wpłaty przeliczają sumę po kolei
+            Invoice.objects.select_for_update().filter(pk=self.pk).exists()
+            self.paid_amount = self.payments.filter(status="completed").aggregate(
+                total=Sum("amount")
+            )["total"] or Decimal("0.00")
+            self.save(update_fields=["paid_amount"])
+
+    def compute_payment_status(self, today=None):
+        """Status płatności wynikający z kwot i terminu (zapisywany w `payment_status`)."""
+        # Domyślne wartości pól kwot są typu float - porównujemy jako Decimal
+        paid_amount = Decimal(str(self.paid_amount))
+        total_amount = Decimal(str(self.total_amount))
+        if total_amount == 0 and paid_amount == 0:
+            # Nowa faktura bez pozycji - nie ma czego opłacić, ale nie jest opłacona
+            return "unpaid"
+        if total_amount - paid_amount <= 0:
+            return "paid"
+        if paid_amount > 0:
+            return "partial"
+        if self.payment_date and self.payment_date < (today or timezone.now().date()):
+            return "overdue"
+        return "unpaid"
+
     @property
     def total_paid(self):
-        return self.payments.filter(status="completed").aggregate(total=Sum("amount"))[
-            "total"
-        ] or Decimal("0.00")
+        return self.paid_amount
 
     @property
     def balance_due(self):
-        return self.total_amount - self.total_paid
+        return Decimal(str(self.total_amount)) - Decimal(str(self.paid_amount))
 
     @property
     def is_fully_paid(self):
-        return self.balance_due <= Decimal("0.00")
+        return self.payment_status == "paid"
 
     @property
     def is_overdue(self):
@@ -776,26 +869,23 @@ class Invoice(models.Model):
             and self.payment_date < timezone.now().date()
         )
 
-    @property
-    def payment_status(self):
-        if self.is_fully_paid:
-            return "paid"
-        elif self.total_paid > 0:
-            return "partial"
-        elif self.is_overdue:
-            return "overdue"
-        else:
-            return "unpaid"
-
     @property
     def payment_status_display(self):
-        status_map = {
-            "paid": "Opłacona",
-            "partial": "Częściowo opłacona",
-            "overdue": "Przeterminowana",
-            "unpaid": "Nieopłacona",
-        }
-        return status_map.get(self.payment_status, "Nieokreślony")
+        return self.get_payment_status_display()
+
+
+class InvoiceItemManager(models.Manager):
+    """
+    `bulk_create` pomija `save()`, więc kwot faktur nie przelicza - chyba że
+    działa w bloku `deferred_totals`: wtedy każda faktura jest przeliczana raz.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if totals_deferred():
+            for item in {item.invoice_id: item for item in objs}.values():
+                item.update_invoice_totals()
+        return objs
 
 
 class InvoiceItem(models.Model):
@@ -830,6 +920,8 @@ class InvoiceItem(models.Model):
         verbose_name="Korygowana pozycja",
     )
 
+    objects = InvoiceItemManager()
+
     class Meta:
         verbose_name = "Pozycja na fakturze"
         verbose_name_plural = "Pozycje na fakturze"
@@ -837,12 +929,16 @@ class InvoiceItem(models.Model):
     def save(self, *args, **kwargs):
         self.total_price = self.quantity * self.unit_price
         super().save(*args, **kwargs)
-        self.invoice.update_total_amount()
+        self.update_invoice_totals()
 
     def delete(self, *args, **kwargs):
         invoice = self.invoice
         super().delete(*args, **kwargs)
-        invoice.update_total_amount()
+        update_totals(invoice, invoice.update_total_amount)
+
+    def update_invoice_totals(self):
+        invoice = self.invoice
+        update_totals(invoice, invoice.update_total_amount)
 
     def __str__(self):
         return self.name
@@ -1130,7 +1226,25 @@ class Payment(models.Model):
     def save(self, *args, **kwargs):
         if not hasattr(self, "user") or not self.user:
             self.user = self.invoice.user
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            previous_invoice_id = None
+            if not self._state.adding:
+                previous_invoice_id = (
+                    Payment.objects.filter(pk=self.pk)
+                    .values_list("invoice_id", flat=True)
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            self.invoice.update_paid_amount()
+            if previous_invoice_id and previous_invoice_id != self.invoice_id:
+                Invoice.objects.get(pk=previous_invoice_id).update_paid_amount()
+
+    def delete(self, *args, **kwargs):
+        invoice = self.invoice
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            invoice.update_paid_amount()
+        return result
 
 
 class ExpenseCategory(models.Model):
@@ -1244,6 +1358,14 @@ class PurchaseInvoice(models.Model):
         null=True,
         verbose_name="Plik faktury",
     )
+    ksef_number = models.CharField(
+        max_length=100,
+        blank=True,
+        null=True,
+        db_index=True,
+        verbose_name="Numer KSeF",
+        help_text="Uzupełniany przy pobraniu faktury z KSeF",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -1327,6 +1449,8 @@ class PurchaseInvoiceItem(models.Model):
         max_length=50, choices=EXPENSE_CATEGORIES, verbose_name="Kategoria", blank=True
     )
 
+    objects = InvoiceItemManager()
+
     class Meta:
         verbose_name = "Pozycja faktury zakupu"
         verbose_name_plural = "Pozycje faktur zakupu"
@@ -1356,6 +1480,12 @@ class PurchaseInvoiceItem(models.Model):
 
     @staticmethod
     def update_invoice_totals_for_invoice(invoice):
+        update_totals(
+            invoice, lambda: PurchaseInvoiceItem.recalculate_invoice_totals(invoice)
+        )
+
+    @staticmethod
+    def recalculate_invoice_totals(invoice):
         totals = invoice.items.aggregate(
             net_total=Sum("net_value"),
             vat_total=Sum("vat_value"),
@@ -1389,3 +1519,129 @@ class ExpenseReport(models.Model):
 
     def __str__(self):
         return f"Koszty {self.period_start} - {self.period_end}"
+
+
+def jpk_import_storage():
+    """
+    Magazyn wgranych plików JPK czekających na import. Pliki zawierają dane
+    kontrahentów, więc leżą poza MEDIA_ROOT (serwowanym publicznie przez nginx).
+    """
+    from django.conf import settings
+    from django.core.files.storage import FileSystemStorage
+
+    location = getattr(
+        settings, "JPK_IMPORT_ROOT", settings.BASE_DIR / "private" / "jpk_imports"
+    )
+    return FileSystemStorage(location=location)
+
+
+class JpkImportJob(models.Model):
+    """
+    Import pliku JPK_FA lub JPK_EWP wykonywany w tle przez polecenie
+    `manage.py jpk_import_worker`. Postęp jest zapisywany w trakcie importu.
+    """
+
+    KIND_CHOICES = [
+        ("fa", "JPK_FA (faktury)"),
+        ("ewp", "JPK_EWP (rozliczenia)"),
+    ]
+    STATUS_CHOICES = [
+        ("queued", "W kolejce"),
+        ("running", "W trakcie importu"),
+        ("done", "Zakończony"),
+        ("failed", "Błąd"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Użytkownik")
+    kind = models.CharField(max_length=3, choices=KIND_CHOICES, verbose_name="Rodzaj pliku")
+    file = models.FileField(
+        upload_to="%Y/%m/",
+        storage=jpk_import_storage,
+        blank=True,
+        verbose_name="Plik",
+        help_text="Usuwany po zakończeniu importu",
+    )
+    original_name = models.CharField(max_length=255, verbose_name="Nazwa pliku")
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default="queued", verbose_name="Status"
+    )
+    rows_parsed = models.PositiveIntegerField(default=0, verbose_name="Odczytane rekordy")
+    created_count = models.PositiveIntegerField(default=0, verbose_name="Utworzono")
+    updated_count = models.PositiveIntegerField(default=0, verbose_name="Zaktualizowano")
+    skipped_count = models.PositiveIntegerField(default=0, verbose_name="Pominięto")
+    warnings_count = models.PositiveIntegerField(default=0, verbose_name="Ostrzeżenia")
+    warnings = models.TextField(blank=True, verbose_name="Ostrzeżenia (raport)")
+    error = models.TextField(blank=True, verbose_name="Błąd")
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="Pobrane przez")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name="Rozpoczęto")
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name="Zakończono")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Import JPK"
+        verbose_name_plural = "Importy JPK"
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"Import {self.get_kind_display()} - {self.original_name}"
+
+    @property
+    def is_finished(self):
+        return self.status in ("done", "failed")
+
+
+class MonthlyRollup(models.Model):
+    """
+    Miesięczne sumy użytkownika, z których czytają raporty i dashboard.
+    Aktualizowane sygnałami przy zapisie faktur, płatności i faktur zakupu
+    (`ksiegowosc/rollups.py`); przebudowa od zera: `manage.py rebuild_rollups`.
+
+    Przychód jest liczony według daty wystawienia faktury, wpłaty według daty
+    płatności, a nieopłacone faktury (`open_*`) według terminu płatności.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Użytkownik")
+    year = models.IntegerField(verbose_name="Rok")
+    month = models.IntegerField(verbose_name="Miesiąc")
+    revenue = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name="Przychód"
+    )
+    invoice_count = models.PositiveIntegerField(default=0, verbose_name="Liczba faktur")
+    paid_amount = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name="Wpłaty zrealizowane"
+    )
+    payment_count = models.PositiveIntegerField(default=0, verbose_name="Liczba wpłat")
+    open_amount = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="Do zapłaty",
+        help_text="Niezapłacona część faktur z terminem płatności w tym miesiącu",
+    )
+    open_count = models.PositiveIntegerField(
+        default=0, verbose_name="Nieopłacone faktury"
+    )
+    cost_net = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name="Koszty netto"
+    )
+    cost_vat = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name="VAT z faktur zakupu"
+    )
+    cost_total = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name="Koszty brutto"
+    )
+    purchase_count = models.PositiveIntegerField(
+        default=0, verbose_name="Liczba faktur zakupu"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Podsumowanie miesięczne"
+        verbose_name_plural = "Podsumowania miesięczne"
+        unique_together = ("user", "year", "month")
+        ordering = ["-year", "-month"]
+
+    def __str__(self):
+        return f"Podsumowanie {self.month}/{self.year}"
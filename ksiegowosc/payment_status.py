@@ -0,0 +1,65 @@
+# ksiegowosc/payment_status.py
+
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Invoice, Payment
+
+logger = logging.getLogger(__name__)
+
+
+def completed_paid():
+    """Suma zrealizowanych wpłat faktury (0 gdy brak wpłat) - do adnotacji i UPDATE."""
+    paid = (
+        Payment.objects.filter(invoice=OuterRef("pk"), status="completed")
+        .values("invoice")
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    return Coalesce(
+        Subquery(paid),
+        Value(Decimal("0.00")),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def payment_status_expression(today):
+    """Odpowiednik `Invoice.compute_payment_status` w SQL."""
+    return Case(
+        When(total_amount=0, paid_amount=0, then=Value("unpaid")),
+        When(paid_amount__gte=F("total_amount"), then=Value("paid")),
+        When(paid_amount__gt=0, then=Value("partial")),
+        When(payment_date__lt=today, then=Value("overdue")),
+        default=Value("unpaid"),
+    )
+
+
+def mark_overdue_invoices(today=None):
+    """Oznacza nieopłacone faktury po terminie jako przeterminowane (zadanie nocne)."""
+    today = today or timezone.now().date()
+    count = (
+        Invoice.objects.filter(payment_status="unpaid", payment_date__lt=today)
+        .exclude(total_amount=0)
+        .update(payment_status="overdue")
+    )
+    if count:
+        logger.info(f"✓ Oznaczono {count} faktur jako przeterminowane")
+    return count
+
+
+def recalculate_payment_statuses(queryset=None, today=None):
+    """
+    Przelicza od zera zapłacone kwoty i statusy faktur z tabeli płatności
+    (np. po imporcie lub zmianach z pominięciem `Payment.save()`).
+    """
+    queryset = Invoice.objects.all() if queryset is None else queryset
+    today = today or timezone.now().date()
+    with transaction.atomic():
+        count = queryset.update(paid_amount=completed_paid())
+        queryset.update(payment_status=payment_status_expression(today))
+    return count
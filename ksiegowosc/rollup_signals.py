@@ -0,0 +1,108 @@
+# ksiegowosc/rollup_signals.py
+
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Invoice, Payment, PurchaseInvoice
+from .rollups import month_of, refresh_month
+
+# Pola, od których zależą podsumowania - np. zapis samych pól KSeF ich nie zmienia
+TRACKED_VALUES = {
+    Invoice: ["user_id", "issue_date", "payment_date", "total_amount", "paid_amount"],
+    Payment: ["user_id", "invoice_id", "payment_date", "amount", "status"],
+    PurchaseInvoice: ["user_id", "issue_date", "net_amount", "vat_amount", "total_amount"],
+}
+# Nazwy tych pól w postaci przyjmowanej przez save(update_fields=...)
+TRACKED_FIELDS = {
+    sender: set(attnames) | {name[:-3] for name in attnames if name.endswith("_id")}
+    for sender, attnames in TRACKED_VALUES.items()
+}
+# Pola wyznaczające miesiąc - bez nich w update_fields nie trzeba czytać poprzedniej wersji
+MONTH_FIELDS = {
+    Invoice: {"user", "user_id", "issue_date", "payment_date"},
+    Payment: {"user", "user_id", "invoice", "invoice_id", "payment_date"},
+    PurchaseInvoice: {"user", "user_id", "issue_date"},
+}
+
+# Miesiące do przeliczenia po zatwierdzeniu transakcji, w obrębie wątku
+_pending = threading.local()
+
+
+def _months(instance):
+    if isinstance(instance, Invoice):
+        return [month_of(instance.issue_date), month_of(instance.payment_date)]
+    if isinstance(instance, Payment):
+        months = [month_of(instance.payment_date)]
+        try:
+            # Wpłata zmienia też nieopłaconą kwotę w miesiącu terminu płatności faktury
+            months.append(month_of(instance.invoice.payment_date))
+        except Invoice.DoesNotExist:
+            pass
+        return months
+    return [month_of(instance.issue_date)]
+
+
+def _flush():
+    pending = getattr(_pending, "months", None)
+    _pending.months = set()
+    for user_id, year, month in sorted(pending or ()):
+        refresh_month(user_id, year, month)
+
+
+def _schedule(user_id, months):
+    """
+    Odkłada przeliczenie miesięcy do zatwierdzenia transakcji. Wiele zapisów
+    w jednej transakcji przelicza każdy miesiąc raz - pierwsze wywołanie
+    `_flush` opróżnia zbiór, kolejne nic nie robią.
+    """
+    if not hasattr(_pending, "months"):
+        _pending.months = set()
+    _pending.months.update((user_id, *month) for month in months if month)
+    # robust: błąd przeliczenia nie psuje zatwierdzonego już zapisu (naprawi go rebuild_rollups)
+    transaction.on_commit(_flush, robust=True)
+
+
+def _is_tracked(fields, update_fields):
+    return update_fields is None or not fields.isdisjoint(update_fields)
+
+
+@receiver(pre_save, sender=Invoice)
+@receiver(pre_save, sender=Payment)
+@receiver(pre_save, sender=PurchaseInvoice)
+def remember_previous_version(sender, instance, update_fields=None, **kwargs):
+    """
+    Zapamiętuje poprzednią wersję rekordu: jej miesiące (np. przed przesunięciem
+    daty wystawienia) i wartości pól, po których poznamy, czy zapis coś zmienił.
+    """
+    if instance._state.adding or not _is_tracked(MONTH_FIELDS[sender], update_fields):
+        return
+    instance._rollup_previous = sender.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=PurchaseInvoice)
+def refresh_rollups_on_save(sender, instance, update_fields=None, **kwargs):
+    previous = instance.__dict__.pop("_rollup_previous", None)
+    if not _is_tracked(TRACKED_FIELDS[sender], update_fields):
+        return
+    months = _months(instance)
+    if previous is not None:
+        attnames = TRACKED_VALUES[sender]
+        if all(getattr(previous, name) == getattr(instance, name) for name in attnames):
+            return
+        if previous.user_id != instance.user_id:
+            _schedule(previous.user_id, _months(previous))
+        else:
+            months += _months(previous)
+    _schedule(instance.user_id, months)
+
+
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=PurchaseInvoice)
+def refresh_rollups_on_delete(sender, instance, **kwargs):
+    _schedule(instance.user_id, _months(instance))
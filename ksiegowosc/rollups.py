@@ -0,0 +1,165 @@
+# ksiegowosc/rollups.py
+
+import logging
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from .models import Invoice, MonthlyRollup, Payment, PurchaseInvoice
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal("0")
+AMOUNT_FIELDS = ["revenue", "paid_amount", "open_amount", "cost_net", "cost_vat", "cost_total"]
+COUNT_FIELDS = ["invoice_count", "payment_count", "open_count", "purchase_count"]
+
+
+def month_of(value):
+    """Klucz (rok, miesiąc) daty; None dla pustej daty."""
+    return (value.year, value.month) if value else None
+
+
+def month_bounds(year, month):
+    """Pierwszy dzień miesiąca i pierwszy dzień następnego."""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+def open_invoices(queryset):
+    """Faktury nie w pełni opłacone (według zapisanej sumy wpłat)."""
+    return queryset.filter(paid_amount__lt=F("total_amount"))
+
+
+def collect_rollups(invoices, due_invoices, payments, purchases):
+    """
+    Sumy miesięczne według (user_id, rok, miesiąc) - po jednym zapytaniu
+    grupującym na przychody, wpłaty, nieopłacone faktury i koszty.
+    """
+    rows = defaultdict(dict)
+
+    def add(queryset, date_field, **aggregates):
+        grouped = (
+            queryset.annotate(year=ExtractYear(date_field), month=ExtractMonth(date_field))
+            .values("user_id", "year", "month")
+            .order_by()
+            .annotate(**aggregates)
+        )
+        for row in grouped:
+            if row["year"] is None:
+                continue
+            key = (row["user_id"], row["year"], row["month"])
+            rows[key].update((name, row[name]) for name in aggregates)
+
+    add(invoices, "issue_date", revenue=Sum("total_amount"), invoice_count=Count("pk"))
+    add(
+        payments.filter(status="completed"),
+        "payment_date",
+        paid_amount=Sum("amount"),
+        payment_count=Count("pk"),
+    )
+    add(
+        open_invoices(due_invoices),
+        "payment_date",
+        open_amount=Sum(F("total_amount") - F("paid_amount")),
+        open_count=Count("pk"),
+    )
+    add(
+        purchases,
+        "issue_date",
+        cost_net=Sum("net_amount"),
+        cost_vat=Sum("vat_amount"),
+        cost_total=Sum("total_amount"),
+        purchase_count=Count("pk"),
+    )
+    return rows
+
+
+def rollup_values(values):
+    """Wartości pól MonthlyRollup z sum miesiąca (brakujące sumy to zero)."""
+    defaults = {name: values.get(name) or ZERO for name in AMOUNT_FIELDS}
+    defaults.update((name, values.get(name) or 0) for name in COUNT_FIELDS)
+    return defaults
+
+
+def refresh_month(user_id, year, month):
+    """
+    Przelicza podsumowanie jednego miesiąca użytkownika z faktur tego miesiąca.
+    Miesiąc bez żadnych dokumentów nie ma wiersza podsumowania.
+    """
+    start, end = month_bounds(year, month)
+    rows = collect_rollups(
+        Invoice.objects.filter(user_id=user_id, issue_date__gte=start, issue_date__lt=end),
+        Invoice.objects.filter(user_id=user_id, payment_date__gte=start, payment_date__lt=end),
+        Payment.objects.filter(user_id=user_id, payment_date__gte=start, payment_date__lt=end),
+        PurchaseInvoice.objects.filter(
+            user_id=user_id, issue_date__gte=start, issue_date__lt=end
+        ),
+    )
+    defaults = rollup_values(rows.get((user_id, year, month), {}))
+    if not any(defaults.values()):
+        MonthlyRollup.objects.filter(user_id=user_id, year=year, month=month).delete()
+        return None
+    rollup, _created = MonthlyRollup.objects.update_or_create(
+        user_id=user_id, year=year, month=month, defaults=defaults
+    )
+    return rollup
+
+
+def refresh_rollups(user_id, months):
+    """Przelicza podane miesiące (rok, miesiąc) użytkownika, każdy raz."""
+    for year, month in sorted({month for month in months if month}):
+        refresh_month(user_id, year, month)
+
+
+def rebuild_rollups(user=None):
+    """Buduje podsumowania od zera (dla jednego użytkownika lub wszystkich)."""
+    filters = {"user": user} if user is not None else {}
+    rows = collect_rollups(
+        Invoice.objects.filter(**filters),
+        Invoice.objects.filter(**filters),
+        Payment.objects.filter(**filters),
+        PurchaseInvoice.objects.filter(**filters),
+    )
+    with transaction.atomic():
+        MonthlyRollup.objects.filter(**filters).delete()
+        MonthlyRollup.objects.bulk_create(
+            [
+                MonthlyRollup(user_id=user_id, year=year, month=month, **rollup_values(values))
+                for (user_id, year, month), values in sorted(rows.items())
+            ],
+            batch_size=500,
+        )
+    logger.info(f"✓ Przebudowano podsumowania miesięczne ({len(rows)} miesięcy)")
+    return len(rows)
+
+
+def rollup_totals(user, **filters):
+    """Sumy podsumowań użytkownika (np. `year=2025` lub bez filtrów - całość)."""
+    totals = MonthlyRollup.objects.filter(user=user, **filters).aggregate(
+        **{name: Sum(name) for name in AMOUNT_FIELDS + COUNT_FIELDS}
+    )
+    return rollup_values(totals)
+
+
+def overdue_totals(user, today):
+    """
+    Liczba i kwota nieopłaconych faktur po terminie. Miesiące przed bieżącym
+    są brane z podsumowań, a bieżący (część przed `today`) z faktur.
+    """
+    totals = MonthlyRollup.objects.filter(
+        Q(year__lt=today.year) | Q(year=today.year, month__lt=today.month), user=user
+    ).aggregate(count=Sum("open_count"), amount=Sum("open_amount"))
+    current = open_invoices(
+        Invoice.objects.filter(
+            user=user, payment_date__gte=today.replace(day=1), payment_date__lt=today
+        )
+    ).aggregate(count=Count("pk"), amount=Sum(F("total_amount") - F("paid_amount")))
+    return {
+        "count": (totals["count"] or 0) + current["count"],
+        "amount": (totals["amount"] or ZERO) + (current["amount"] or ZERO),
+    }
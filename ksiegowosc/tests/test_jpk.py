@@ -0,0 +1,312 @@
+# ksiegowosc/tests/test_jpk.py
+
+from datetime import date
+from decimal import Decimal
+from io import BytesIO, StringIO
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from lxml import etree
+
+from ksiegowosc.jpk import (
+    detect_encoding,
+    import_jpk_ewp,
+    import_jpk_fa,
+    iter_jpk_ewp,
+    iter_jpk_fa,
+    stream_jpk_fa,
+)
+from ksiegowosc.models import (
+    CompanyInfo,
+    Contractor,
+    Invoice,
+    InvoiceItem,
+    MonthlyRollup,
+    MonthlySettlement,
+)
+
+JPK_FA_NS = "http://jpk.mf.gov.pl/wzor/2022/02/17/02171/"
+
+
+def jpk_fa(*elements, declaration='<?xml version="1.0" encoding="UTF-8"?>', doctype=""):
+    body = "".join(elements)
+    return (
+        f'{declaration}{doctype}<JPK xmlns="{JPK_FA_NS}">'
+        f"<Naglowek><KodFormularza>JPK_FA</KodFormularza></Naglowek>{body}</JPK>"
+    )
+
+
+def faktura(number, nip="5260000000", name="Klient sp. z o.o.", total="123.00",
+            issue_date="2025-03-10", extra=""):
+    fields = [("P_1", issue_date), ("P_2A", number), ("P_3A", name), ("P_5B", nip), ("P_15", total)]
+    return "<Faktura>" + "".join(
+        f"<{tag}>{value}</{tag}>" for tag, value in fields if value is not None
+    ) + f"{extra}</Faktura>"
+
+
+def wiersz(number, name="Usługa", quantity="1", unit_price="100.00", total=None):
+    total = total if total is not None else unit_price
+    return (
+        f"<FakturaWiersz><P_2B>{number}</P_2B><P_7>{name}</P_7><P_8A>szt.</P_8A>"
+        f"<P_8B>{quantity}</P_8B><P_9B>{unit_price}</P_9B><P_11A>{total}</P_11A></FakturaWiersz>"
+    )
+
+
+class JpkParsingTests(SimpleTestCase):
+    def test_invoices_and_rows_in_file_order(self):
+        source = BytesIO(jpk_fa(faktura("FV/1"), faktura("FV/2"), wiersz("FV/1")).encode())
+
+        rows = list(iter_jpk_fa(source))
+
+        self.assertEqual([kind for kind, _ in rows], ["faktura", "faktura", "wiersz"])
+        self.assertEqual(rows[0][1]["invoice_number"], "FV/1")
+        self.assertEqual(rows[0][1]["buyer_nip"], "5260000000")
+        self.assertEqual(rows[2][1]["quantity"], "1")
+        self.assertEqual(rows[2][1]["unit"], "szt.")
+
+    def test_file_without_declaration_in_windows_1250(self):
+        content = jpk_fa(faktura("FV/1", name="Żółta Łódź"), declaration="").encode("windows-1250")
+        self.assertEqual(detect_encoding(content), "windows-1250")
+
+        [(_, data)] = iter_jpk_fa(BytesIO(content))
+
+        self.assertEqual(data["buyer_name"], "Żółta Łódź")
+
+    def test_declared_encoding_is_left_to_parser(self):
+        content = jpk_fa(
+            faktura("FV/1", name="Żółta Łódź"),
+            declaration='<?xml version="1.0" encoding="windows-1250"?>',
+        ).encode("windows-1250")
+        self.assertIsNone(detect_encoding(content))
+
+        [(_, data)] = iter_jpk_fa(BytesIO(content))
+
+        self.assertEqual(data["buyer_name"], "Żółta Łódź")
+
+    def test_entities_are_not_expanded(self):
+        doctype = '<!DOCTYPE JPK [<!ENTITY plik SYSTEM "file:///etc/passwd">]>'
+        source = BytesIO(jpk_fa(faktura("FV/1", name="&plik;"), doctype=doctype).encode())
+
+        [(_, data)] = iter_jpk_fa(source)
+
+        self.assertNotIn("root:", data["buyer_name"] or "")
+
+    def test_only_direct_children_of_root_are_read(self):
+        nested = "<Zalacznik>" + faktura("FV/ZAL") + "</Zalacznik>"
+        source = BytesIO(jpk_fa(faktura("FV/1"), nested, faktura("FV/2")).encode())
+
+        numbers = [data["invoice_number"] for _, data in iter_jpk_fa(source)]
+
+        self.assertEqual(numbers, ["FV/1", "FV/2"])
+
+    def test_invalid_files(self):
+        with self.assertRaisesMessage(ValueError, "nie wygląda na plik JPK"):
+            list(iter_jpk_fa(BytesIO(b"<Faktury><Faktura><P_2A>1</P_2A></Faktura></Faktury>")))
+        with self.assertRaisesMessage(ValueError, "Błąd parsowania XML"):
+            list(iter_jpk_fa(BytesIO(jpk_fa(faktura("FV/1")).encode()[:-20])))
+        with self.assertRaisesMessage(ValueError, "trybie binarnym"):
+            list(iter_jpk_fa(StringIO(jpk_fa(faktura("FV/1")))))
+
+    def test_ewp_rows(self):
+        content = (
+            '<?xml version="1.0" encoding="UTF-8"?><JPK xmlns="http://jpk.mf.gov.pl/wzor/2022/02/01/02011/">'
+            "<EWPWiersz><K_1>1</K_1><K_2>2025-01-05</K_2><K_7>100.00</K_7><K_11>0</K_11></EWPWiersz>"
+            "<EWPWiersz><K_1>2</K_1><K_2>2025-01-20</K_2><K_7>50.00</K_7><K_11>5.00</K_11></EWPWiersz>"
+            "</JPK>"
+        )
+
+        rows = list(iter_jpk_ewp(BytesIO(content.encode())))
+
+        self.assertEqual(
+            [(row["date"], row["revenue"], row["revenue_other"]) for row in rows],
+            [("2025-01-05", "100.00", "0"), ("2025-01-20", "50.00", "5.00")],
+        )
+
+
+class JpkFaImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("jan")
+
+    def run_import(self, *elements):
+        return import_jpk_fa(BytesIO(jpk_fa(*elements).encode()), self.user)
+
+    def test_invoices_items_and_contractors(self):
+        known = Contractor.objects.create(user=self.user, name="Stały klient", tax_id="5260000000")
+
+        result = self.run_import(
+            faktura("FV/1", total="300.00"),
+            faktura("FV/2", nip="7770001111", name="Nowy klient"),
+            faktura("FV/3", nip=None, name="Klient bez NIP"),
+            wiersz("FV/1", quantity="2", unit_price="100.00", total="200.00"),
+            wiersz("FV/1", name="Dojazd", unit_price="100.00"),
+        )
+
+        self.assertEqual((result.created, result.skipped), (3, 0))
+        invoice = Invoice.objects.get(invoice_number="FV/1")
+        self.assertEqual(invoice.contractor, known)
+        self.assertEqual(invoice.total_amount, Decimal("300.00"))
+        self.assertEqual(invoice.payment_date, date(2025, 3, 24))
+        self.assertEqual(invoice.payment_status, "overdue")
+        self.assertEqual(
+            list(invoice.items.order_by("pk").values_list("name", "quantity", "total_price")),
+            [("Usługa", Decimal("2.00"), Decimal("200.00")), ("Dojazd", Decimal("1.00"), Decimal("100.00"))],
+        )
+        self.assertEqual(Invoice.objects.get(invoice_number="FV/2").contractor.name, "Nowy klient")
+        self.assertIsNone(Invoice.objects.get(invoice_number="FV/3").contractor.tax_id)
+        self.assertTrue(any("bez numeru NIP" in warning for warning in result.warnings))
+
+    def test_duplicates_are_skipped(self):
+        Invoice.objects.create(
+            user=self.user,
+            contractor=Contractor.objects.create(user=self.user, name="Klient"),
+            invoice_number="FV/1",
+        )
+
+        result = self.run_import(faktura("FV/1"), faktura("FV/2"), faktura("FV/2"))
+
+        self.assertEqual((result.created, result.skipped), (1, 2))
+        self.assertEqual(Invoice.objects.filter(invoice_number="FV/2").count(), 1)
+
+    def test_totals_from_items_and_fallback_item(self):
+        self.run_import(
+            faktura("FV/1", total=None),
+            faktura("FV/2", total="50.00"),
+            wiersz("FV/1", unit_price="40.00"),
+            wiersz("FV/1", unit_price="2.50"),
+        )
+
+        self.assertEqual(Invoice.objects.get(invoice_number="FV/1").total_amount, Decimal("42.50"))
+        [item] = InvoiceItem.objects.filter(invoice__invoice_number="FV/2")
+        self.assertEqual((item.name, item.total_price), ("Usługi (import z JPK)", Decimal("50.00")))
+
+    def test_correction_is_linked_to_original_items(self):
+        correction = (
+            "<RodzajFaktury>KOREKTA</RodzajFaktury><PrzyczynaKorekty>Rabat</PrzyczynaKorekty>"
+            "<NrFaKorygowanej>FV/1</NrFaKorygowanej>"
+        )
+
+        result = self.run_import(
+            faktura("FV/1", total="100.00"),
+            faktura("KOR/1", total="-10.00", extra=correction),
+            wiersz("FV/1"),
+            wiersz("KOR/1", quantity="1", unit_price="-10.00"),
+        )
+
+        self.assertEqual(result.corrections, 1)
+        original = Invoice.objects.get(invoice_number="FV/1")
+        correction_invoice = Invoice.objects.get(invoice_number="KOR/1")
+        self.assertTrue(correction_invoice.is_correction)
+        self.assertEqual(correction_invoice.corrected_invoice, original)
+        self.assertEqual(correction_invoice.items.get().corrected_item, original.items.get())
+
+    def test_import_uses_bulk_queries(self):
+        elements = [faktura(f"FV/{n}") for n in range(100)]
+        elements += [wiersz(f"FV/{n}") for n in range(100)]
+
+        with CaptureQueriesContext(connection) as context:
+            result = self.run_import(*elements)
+
+        self.assertEqual(result.created, 100)
+        # Zapis pojedynczych faktur i pozycji to ponad 200 zapytań
+        self.assertLess(len(context), 30)
+
+    def test_monthly_rollups_are_refreshed(self):
+        self.run_import(faktura("FV/1", total="100.00"), faktura("FV/2", total="23.00"))
+
+        rollup = MonthlyRollup.objects.get(user=self.user, year=2025, month=3)
+        self.assertEqual((rollup.revenue, rollup.invoice_count), (Decimal("123.00"), 2))
+
+
+class JpkEwpImportTests(TestCase):
+    def test_rows_are_summed_per_month(self):
+        user = User.objects.create_user("jan")
+        rows = "".join(
+            f"<EWPWiersz><K_1>{n}</K_1><K_2>{day}</K_2><K_7>{revenue}</K_7><K_11>0</K_11></EWPWiersz>"
+            for n, (day, revenue) in enumerate(
+                [("2025-01-05", "100.00"), ("2025-01-20", "50.00"), ("2025-02-01", "10.00"), ("", "1")],
+                start=1,
+            )
+        )
+        source = BytesIO(f'<?xml version="1.0"?><JPK>{rows}</JPK>'.encode())
+
+        result = import_jpk_ewp(source, user)
+
+        self.assertEqual((result.created, result.skipped), (2, 1))
+        self.assertEqual(
+            dict(
+                MonthlySettlement.objects.filter(user=user).values_list("month", "total_revenue")
+            ),
+            {1: Decimal("150.00"), 2: Decimal("10.00")},
+        )
+
+
+class JpkFaExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("jan")
+        self.company = CompanyInfo.objects.create(
+            user=self.user,
+            company_name="Firma Jan Kowalski",
+            tax_id="526-000-00-00",
+            street="ul. Testowa 1",
+            zip_code="00-001",
+            city="Warszawa",
+            bank_account_number="00000000000000000000000000",
+        )
+        self.contractor = Contractor.objects.create(
+            user=self.user, name="Klient", tax_id="777-000-11-11",
+            street="ul. Kupiecka 2", zip_code="00-002", city="Kraków",
+        )
+
+    def create_invoice(self, number, issue_date, **kwargs):
+        invoice = Invoice.objects.create(
+            user=self.user, contractor=self.contractor, invoice_number=number,
+            issue_date=issue_date, **kwargs
+        )
+        InvoiceItem.objects.create(
+            user=self.user, invoice=invoice, name="Usługa", quantity=Decimal("1"),
+            unit_price=Decimal("100.00"),
+        )
+        return invoice
+
+    def export(self, chunk_size=500):
+        chunks = list(stream_jpk_fa(Invoice.objects.order_by("pk"), self.company, chunk_size))
+        return chunks, etree.fromstring(b"".join(chunks))
+
+    def test_header_invoices_and_rows(self):
+        original = self.create_invoice("FV/1", date(2025, 3, 1))
+        self.create_invoice(
+            "KOR/1", date(2025, 3, 20), is_correction=True, correction_reason="Rabat",
+            corrected_invoice=original,
+        )
+
+        _, root = self.export()
+
+        ns = {"tns": JPK_FA_NS}
+        self.assertEqual(root.findtext("tns:Naglowek/tns:DataOd", namespaces=ns), "2025-03-01")
+        self.assertEqual(root.findtext("tns:Naglowek/tns:DataDo", namespaces=ns), "2025-03-20")
+        self.assertEqual(
+            root.findtext("tns:Podmiot1/tns:IdentyfikatorPodmiotu/tns:NIP", namespaces=ns), "5260000000"
+        )
+        invoices = root.findall("tns:Faktura", ns)
+        self.assertEqual([i.findtext("tns:P_2A", namespaces=ns) for i in invoices], ["FV/1", "KOR/1"])
+        self.assertEqual(invoices[0].findtext("tns:P_5B", namespaces=ns), "7770001111")
+        self.assertEqual(invoices[0].findtext("tns:P_15", namespaces=ns), "100.00")
+        self.assertEqual(invoices[1].findtext("tns:RodzajFaktury", namespaces=ns), "KOREKTA")
+        self.assertEqual(invoices[1].findtext("tns:NrFaKorygowanej", namespaces=ns), "FV/1")
+        rows = root.findall("tns:FakturaWiersz", ns)
+        self.assertEqual([r.findtext("tns:P_2B", namespaces=ns) for r in rows], ["FV/1", "KOR/1"])
+
+    def test_invoices_are_written_in_chunks(self):
+        for n in range(5):
+            self.create_invoice(f"FV/{n}", date(2025, 3, 1))
+
+        with CaptureQueriesContext(connection) as context:
+            chunks, root = self.export(chunk_size=2)
+
+        # Nagłówek, dwie pełne paczki i reszta z zamknięciem dokumentu
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(len(root.findall(f"{{{JPK_FA_NS}}}Faktura")), 5)
+        # Zakres dat, faktury z kontrahentami i po jednym zapytaniu o pozycje na paczkę
+        self.assertEqual(len(context), 2 + 3)
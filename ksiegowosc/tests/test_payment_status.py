@@ -0,0 +1,84 @@
+# ksiegowosc/tests/test_payment_status.py
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from ksiegowosc.models import Contractor, Invoice, InvoiceItem, Payment
+from ksiegowosc.payment_status import mark_overdue_invoices, recalculate_payment_statuses
+
+
+class InvoicePaymentStatusTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("jan")
+        self.contractor = Contractor.objects.create(user=self.user, name="Klient", tax_id="5260000000")
+
+    def create_invoice(self, number="FV/1", **kwargs):
+        return Invoice.objects.create(
+            user=self.user, contractor=self.contractor, invoice_number=number, **kwargs
+        )
+
+    def add_item(self, invoice, price="100.00"):
+        return InvoiceItem.objects.create(
+            user=self.user, invoice=invoice, name="Usługa", quantity=Decimal("1"), unit_price=Decimal(price)
+        )
+
+    def test_default_issue_date_gives_date_payment_deadline(self):
+        # issue_date domyślnie to timezone.now (datetime)
+        invoice = self.create_invoice()
+        self.add_item(invoice)
+
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.issue_date, timezone.localdate())
+        self.assertEqual(invoice.payment_date, timezone.localdate() + timedelta(days=14))
+        self.assertEqual(invoice.total_amount, Decimal("100.00"))
+        self.assertEqual(invoice.payment_status, "unpaid")
+
+    def test_new_invoice_without_items_is_not_paid(self):
+        invoice = self.create_invoice()
+
+        self.assertEqual(invoice.payment_status, "unpaid")
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.payment_status, "unpaid")
+
+    def test_status_follows_payments(self):
+        invoice = self.create_invoice(issue_date=date(2025, 1, 1), payment_date=date(2025, 1, 15))
+        self.add_item(invoice)
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.payment_status, "overdue")
+
+        Payment.objects.create(
+            invoice=invoice, amount=Decimal("40.00"), payment_date=date(2025, 1, 10), status="completed"
+        )
+        invoice.refresh_from_db()
+        self.assertEqual((invoice.paid_amount, invoice.payment_status), (Decimal("40.00"), "partial"))
+
+        Payment.objects.create(
+            invoice=invoice, amount=Decimal("60.00"), payment_date=date(2025, 1, 12), status="completed"
+        )
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.payment_status, "paid")
+
+    def test_sql_recalculation_matches_model(self):
+        empty = self.create_invoice("FV/1", issue_date=date(2025, 1, 1))
+        due = self.create_invoice("FV/2", issue_date=date(2025, 1, 1))
+        self.add_item(due)
+        Invoice.objects.update(payment_status="paid")
+
+        recalculate_payment_statuses()
+
+        statuses = dict(Invoice.objects.values_list("pk", "payment_status"))
+        self.assertEqual(statuses, {empty.pk: "unpaid", due.pk: "overdue"})
+
+    def test_mark_overdue_skips_empty_invoices(self):
+        empty = self.create_invoice("FV/1", issue_date=date(2025, 1, 1))
+        due = self.create_invoice("FV/2", issue_date=date(2025, 1, 1))
+        self.add_item(due)
+        Invoice.objects.update(payment_status="unpaid")
+
+        self.assertEqual(mark_overdue_invoices(), 1)
+        self.assertEqual(Invoice.objects.get(pk=empty.pk).payment_status, "unpaid")
+        self.assertEqual(Invoice.objects.get(pk=due.pk).payment_status, "overdue")
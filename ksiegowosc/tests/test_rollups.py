@@ -0,0 +1,156 @@
+# ksiegowosc/tests/test_rollups.py
+
+from datetime import date
+from decimal import Decimal
+from importlib import import_module
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from ksiegowosc.models import Contractor, Invoice, InvoiceItem, MonthlyRollup, Payment, PurchaseInvoice
+from ksiegowosc.rollups import overdue_totals, rebuild_rollups
+
+fill_monthly_rollups = import_module(
+    "ksiegowosc.migrations.0024_fill_monthly_rollup"
+).fill_monthly_rollups
+
+
+def snapshot(user=None):
+    rollups = MonthlyRollup.objects.order_by("user_id", "year", "month")
+    if user is not None:
+        rollups = rollups.filter(user=user)
+    return list(rollups.values_list(
+        "user_id", "year", "month", "revenue", "invoice_count", "paid_amount", "payment_count",
+        "open_amount", "open_count", "cost_total", "purchase_count",
+    ))
+
+
+class MonthlyRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("jan")
+        self.contractor = Contractor.objects.create(user=self.user, name="Klient", tax_id="5260000000")
+
+    def create_invoice(self, number, issue_date, price="100.00", payment_date=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice = Invoice.objects.create(
+                user=self.user, contractor=self.contractor, invoice_number=number,
+                issue_date=issue_date, payment_date=payment_date,
+            )
+            InvoiceItem.objects.create(
+                user=self.user, invoice=invoice, name="Usługa", quantity=Decimal("1"),
+                unit_price=Decimal(price),
+            )
+        return invoice
+
+    def pay(self, invoice, amount, payment_date):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Payment.objects.create(
+                invoice=invoice, amount=Decimal(amount), payment_date=payment_date, status="completed"
+            )
+
+    def rollup(self, year, month):
+        return MonthlyRollup.objects.filter(user=self.user, year=year, month=month).first()
+
+    def test_invoice_and_payment_update_their_months(self):
+        invoice = self.create_invoice("FV/1", date(2025, 1, 20), payment_date=date(2025, 2, 3))
+
+        january, february = self.rollup(2025, 1), self.rollup(2025, 2)
+        self.assertEqual((january.revenue, january.invoice_count), (Decimal("100.00"), 1))
+        self.assertEqual((february.open_amount, february.open_count), (Decimal("100.00"), 1))
+
+        self.pay(invoice, "100.00", date(2025, 3, 1))
+
+        # Faktura opłacona - w lutym nie zostaje nic do podsumowania
+        self.assertIsNone(self.rollup(2025, 2))
+        march = self.rollup(2025, 3)
+        self.assertEqual((march.paid_amount, march.payment_count), (Decimal("100.00"), 1))
+
+    def test_moving_and_deleting_invoice(self):
+        invoice = self.create_invoice("FV/1", date(2025, 1, 10), payment_date=date(2025, 1, 24))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice.issue_date = date(2025, 4, 10)
+            invoice.payment_date = date(2025, 4, 24)
+            invoice.save()
+        self.assertIsNone(self.rollup(2025, 1))
+        self.assertEqual(self.rollup(2025, 4).revenue, Decimal("100.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice.delete()
+        self.assertFalse(MonthlyRollup.objects.exists())
+
+    def test_untracked_fields_do_not_refresh(self):
+        invoice = self.create_invoice("FV/1", date(2025, 1, 10))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            invoice.ksef_status = "pending"
+            invoice.save(update_fields=["ksef_status"])
+            invoice.notes = "Uwagi"
+            invoice.save()
+
+        self.assertEqual(callbacks, [])
+
+    def test_many_saves_refresh_month_once(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            for n in range(3):
+                Invoice.objects.create(
+                    user=self.user, contractor=self.contractor, invoice_number=f"FV/{n}",
+                    issue_date=date(2025, 1, 10),
+                )
+        self.assertEqual(len(callbacks), 3)
+        first, *others = callbacks
+        first()
+        # Kolejne wywołania nie mają już nic do przeliczenia
+        with self.assertNumQueries(0):
+            for callback in others:
+                callback()
+
+        self.assertEqual(self.rollup(2025, 1).invoice_count, 3)
+
+    def test_purchases_are_counted_as_costs(self):
+        supplier = Contractor.objects.create(user=self.user, name="Dostawca", tax_id="7770001111")
+        with self.captureOnCommitCallbacks(execute=True):
+            PurchaseInvoice.objects.create(
+                user=self.user, invoice_number="FZ/1", supplier=supplier, issue_date=date(2025, 1, 5),
+                receipt_date=date(2025, 1, 6), service_date=date(2025, 1, 5),
+                net_amount=Decimal("100.00"), vat_amount=Decimal("23.00"), category="other",
+            )
+
+        rollup = self.rollup(2025, 1)
+        self.assertEqual((rollup.cost_total, rollup.purchase_count), (Decimal("123.00"), 1))
+
+    def test_rebuild_and_migration_match_incremental_rollups(self):
+        other = User.objects.create_user("anna")
+        first = self.create_invoice("FV/1", date(2024, 12, 15), payment_date=date(2025, 1, 5))
+        self.create_invoice("FV/2", date(2025, 1, 10), price="50.00")
+        self.pay(first, "30.00", date(2025, 1, 20))
+        Invoice.objects.create(
+            user=other,
+            contractor=Contractor.objects.create(user=other, name="Klient"),
+            invoice_number="FV/1",
+            issue_date=date(2025, 1, 1),
+        )
+        incremental = snapshot(self.user)
+
+        MonthlyRollup.objects.all().delete()
+        self.assertEqual(rebuild_rollups(self.user), len(incremental))
+        self.assertEqual(snapshot(self.user), incremental)
+        self.assertFalse(MonthlyRollup.objects.filter(user=other).exists())
+
+        rebuild_rollups()
+        rebuilt = snapshot()
+        MonthlyRollup.objects.all().delete()
+        fill_monthly_rollups(apps, None)
+        self.assertEqual(snapshot(), rebuilt)
+
+    def test_overdue_totals_combine_rollups_and_current_month(self):
+        self.create_invoice("FV/1", date(2025, 1, 1), payment_date=date(2025, 1, 15))
+        paid = self.create_invoice("FV/2", date(2025, 1, 1), payment_date=date(2025, 1, 15))
+        self.pay(paid, "100.00", date(2025, 1, 10))
+        self.create_invoice("FV/3", date(2025, 3, 1), price="40.00", payment_date=date(2025, 3, 5))
+        self.create_invoice("FV/4", date(2025, 3, 1), price="70.00", payment_date=date(2025, 3, 20))
+
+        totals = overdue_totals(self.user, date(2025, 3, 10))
+
+        self.assertEqual(totals, {"count": 2, "amount": Decimal("140.00")})
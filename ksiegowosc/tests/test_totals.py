@@ -0,0 +1,116 @@
+# ksiegowosc/tests/test_totals.py
+
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ksiegowosc.models import Contractor, Invoice, InvoiceItem, PurchaseInvoice, PurchaseInvoiceItem
+from ksiegowosc.totals import deferred_totals, totals_deferred
+
+
+def invoice_updates(context, table="ksiegowosc_invoice"):
+    return sum(query["sql"].startswith(f'UPDATE "{table}"') for query in context.captured_queries)
+
+
+class DeferredTotalsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("jan")
+        self.contractor = Contractor.objects.create(user=self.user, name="Klient", tax_id="5260000000")
+        self.invoice = Invoice.objects.create(
+            user=self.user, contractor=self.contractor, invoice_number="FV/1", issue_date=date(2025, 1, 1)
+        )
+
+    def item(self, price, invoice=None):
+        return InvoiceItem(
+            user=self.user, invoice=invoice or self.invoice, name="Usługa",
+            quantity=Decimal("1"), unit_price=Decimal(price), total_price=Decimal(price),
+        )
+
+    def total(self, invoice=None):
+        return Invoice.objects.get(pk=(invoice or self.invoice).pk).total_amount
+
+    def test_each_save_updates_total_outside_block(self):
+        with CaptureQueriesContext(connection) as context:
+            for price in ("10.00", "20.00", "30.00"):
+                self.item(price).save()
+
+        self.assertEqual(invoice_updates(context), 3)
+        self.assertEqual(self.total(), Decimal("60.00"))
+
+    def test_block_updates_each_invoice_once(self):
+        other = Invoice.objects.create(
+            user=self.user, contractor=self.contractor, invoice_number="FV/2", issue_date=date(2025, 1, 1)
+        )
+        with CaptureQueriesContext(connection) as context:
+            with deferred_totals():
+                for price in ("10.00", "20.00", "30.00"):
+                    self.item(price).save()
+                self.item("5.00", other).save()
+                self.assertEqual(self.total(), Decimal("0"))
+
+        self.assertEqual(invoice_updates(context), 2)
+        self.assertEqual((self.total(), self.total(other)), (Decimal("60.00"), Decimal("5.00")))
+
+    def test_deletes_and_bulk_create_in_block(self):
+        first, second = self.item("10.00"), self.item("20.00")
+        first.save()
+        second.save()
+
+        with deferred_totals():
+            first.delete()
+            InvoiceItem.objects.bulk_create([self.item("1.50"), self.item("2.50")])
+
+        self.assertEqual(self.total(), Decimal("24.00"))
+
+    def test_bulk_create_outside_block_keeps_total(self):
+        InvoiceItem.objects.bulk_create([self.item("10.00")])
+
+        self.assertEqual(self.total(), Decimal("0"))
+
+    def test_nested_block_recalculates_with_outer(self):
+        with deferred_totals():
+            with deferred_totals():
+                self.item("10.00").save()
+            self.assertTrue(totals_deferred())
+            self.assertEqual(self.total(), Decimal("0"))
+
+        self.assertFalse(totals_deferred())
+        self.assertEqual(self.total(), Decimal("10.00"))
+
+    def test_error_in_block_skips_recalculation_and_resets_state(self):
+        with self.assertRaises(RuntimeError):
+            with deferred_totals():
+                self.item("10.00").save()
+                raise RuntimeError("przerwany zapis")
+
+        self.assertFalse(totals_deferred())
+        self.assertEqual(self.total(), Decimal("0"))
+        self.item("5.00").save()
+        self.assertEqual(self.total(), Decimal("15.00"))
+
+    def test_purchase_invoice_items(self):
+        supplier = Contractor.objects.create(user=self.user, name="Dostawca", tax_id="7770001111")
+        purchase = PurchaseInvoice.objects.create(
+            user=self.user, invoice_number="FZ/1", supplier=supplier, issue_date=date(2025, 1, 5),
+            receipt_date=date(2025, 1, 6), service_date=date(2025, 1, 5),
+            net_amount=Decimal("0"), vat_amount=Decimal("0"), total_amount=Decimal("0"), category="other",
+        )
+
+        with CaptureQueriesContext(connection) as context:
+            with deferred_totals():
+                for price in ("100.00", "50.00"):
+                    PurchaseInvoiceItem(
+                        user=self.user, invoice=purchase, name="Towar", quantity=Decimal("1"),
+                        unit_price_net=Decimal(price), vat_rate="23",
+                    ).save()
+
+        self.assertEqual(invoice_updates(context, "ksiegowosc_purchaseinvoice"), 1)
+        purchase.refresh_from_db()
+        self.assertEqual(
+            (purchase.net_amount, purchase.vat_amount, purchase.total_amount),
+            (Decimal("150.00"), Decimal("34.50"), Decimal("184.50")),
+        )
@@ -0,0 +1,46 @@
+# ksiegowosc/totals.py
+
+import threading
+from contextlib import contextmanager
+
+# Faktury oczekujące na przeliczenie kwot w bieżącym bloku deferred_totals (w obrębie wątku)
+_state = threading.local()
+
+
+def totals_deferred():
+    return getattr(_state, "pending", None) is not None
+
+
+def update_totals(invoice, update):
+    """
+    Przelicza kwoty faktury wywołując `update()` - od razu albo, wewnątrz
+    bloku `deferred_totals`, raz dla każdej faktury przy wyjściu z bloku.
+    """
+    pending = getattr(_state, "pending", None)
+    if pending is None:
+        update()
+    else:
+        pending[(type(invoice), invoice.pk)] = update
+
+
+@contextmanager
+def deferred_totals():
+    """
+    Zapis i usuwanie pozycji faktur (sprzedaży i zakupu) wewnątrz bloku tylko
+    oznaczają fakturę do przeliczenia; kwoty są liczone raz na fakturę przy
+    wyjściu z bloku. Blok zagnieżdżony przelicza razem z zewnętrznym.
+
+        with transaction.atomic(), deferred_totals():
+            formset.save()
+    """
+    if totals_deferred():
+        yield
+        return
+    _state.pending = {}
+    try:
+        yield
+        pending = _state.pending
+    finally:
+        _state.pending = None
+    for update in pending.values():
+        update()
@@ -8,6 +8,7 @@ from .forms import InvoiceForm, InvoiceItemFormSet
 from django.db.models import Sum
 from datetime import datetime
 from .models import Invoice, CompanyInfo, MonthlySettlement, Contractor, InvoiceItem
+from .totals import deferred_totals
 import re
 import subprocess
 from io import BytesIO
@@ -50,9 +51,10 @@ def invoice_create(request):
                     invoice = form.save(commit=False)
                     invoice.save() # Zapisz, aby uzyskać ID
 
-                    # Przypisujemy fakturę do pozycji i zapisujemy je
+                    # Przypisujemy fakturę do pozycji i zapisujemy je (kwota liczona raz)
                     formset.instance = invoice
-                    formset.save()
+                    with deferred_totals():
+                        formset.save()
 
                     # Generujemy numer faktury po jej zapisaniu
                     invoice.invoice_number = f"F/{invoice.id}/{invoice.issue_date.strftime('%m/%Y')}"